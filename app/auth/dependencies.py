@@ -16,3 +16,18 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
     return payload
+
+
+def get_admin_user(user: dict = Depends(get_current_user)) -> dict:
+    """Valida que el usuario del token tenga el rol de administrador."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Permisos insuficientes")
+    return user
+
+
+def get_current_user_id(user: dict = Depends(get_current_user)) -> int:
+    """Obtiene el ID del usuario del token (``id`` o ``user_id``)."""
+    user_id = user.get("id", user.get("user_id"))
+    if user_id is None:
+        raise HTTPException(status_code=403, detail="El token no identifica al usuario")
+    return int(user_id)
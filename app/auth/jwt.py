@@ -1,4 +1,6 @@
 """Modulo de autenticación."""
+import hashlib
+import hmac
 from datetime import datetime, timezone
 from jose import JWTError, jwt
 from app.config.settings import settings
@@ -16,3 +18,16 @@ def decode_access_token(token: str) -> dict | None:
         return payload
     except JWTError:
         return None
+
+
+def sign_value(value: str) -> str:
+    """Firma un valor con HMAC-SHA256 usando la llave secreta de la aplicación."""
+    return hmac.new(SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_signature(value: str, signature: str) -> bool:
+    """Valida en tiempo constante la firma de un valor."""
+    # compare_digest solo acepta cadenas ASCII; una firma con otros caracteres no es válida
+    if not signature.isascii():
+        return False
+    return hmac.compare_digest(sign_value(value), signature)
@@ -0,0 +1,384 @@
+"""Prueba de carga de lazo cerrado sobre la aplicación ejecutándose en uvicorn.
+
+Cada usuario virtual repite escenarios ponderados (listado del tablero, carga de
+invitados, creación de solicitudes, autorización con generación del formato y
+envío de correo, y en portería la consulta por documento y la validación de pases) apenas
+recibe la respuesta anterior.
+La concurrencia sube por etapas y en cada una se reporta el throughput y la latencia.
+
+Uso (sobre una base cargada con ``app.benchmarks.seed``):
+
+    DB_HOST=sqlite python -m app.benchmarks.loadtest --stages 1 4 16 32 --stage-seconds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import socketserver
+import statistics
+import subprocess  # nosec B404
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import httpx
+from jose import jwt
+
+from app.auth.jwt import ALGORITHM, SECRET_KEY
+from app.models.entrances import RequestStatus
+
+ACCESS_TOKEN_EXPIRE_MINUTES = 240
+
+
+def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
+    """Crea un token JWT de la misma forma que ``create_jwt.py``."""
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (
+        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Responde el protocolo SMTP mínimo y descarta los mensajes."""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("latin-1").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 localhost")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Servidor SMTP local que cuenta los correos recibidos."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), _SMTPSinkHandler)
+        self.messages = 0
+
+    def start(self) -> int:
+        """Inicia el servidor en un hilo y retorna el puerto asignado."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, smtp_port: int) -> subprocess.Popen:
+    """Inicia uvicorn en un subproceso con el mismo entorno de base de datos."""
+    env = {
+        "FROM_EMAIL": "permisos@localhost",
+        "FROM_EMAIL_NAME": "Permisos de Ingreso",
+        **os.environ,
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+    }
+    return subprocess.Popen(  # nosec B603
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    """Espera a que el servidor responda."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/metrics")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {timeout}s")
+
+
+@dataclass
+class Fixtures:
+    """IDs existentes usados para armar las peticiones."""
+    branch_ids: list[int]
+    user_ids: list[int]
+    guest_ids: list[int]
+    document_ids: list[str]
+    pending_ids: list[int] = field(default_factory=list)
+    # Sede y documento de los invitados de solicitudes autorizadas
+    gate_entries: list[tuple[int, str]] = field(default_factory=list)
+    # Sede y pase de ingreso emitido para esas solicitudes
+    pass_tokens: list[tuple[int, str]] = field(default_factory=list)
+
+
+async def load_fixtures(client: httpx.AsyncClient) -> Fixtures:
+    """Obtiene por la API los IDs de sedes, empleados e invitados y pases de ingreso."""
+    branches = (await client.get("/api/branches/", params={"limit": 100})).json()["items"]
+    users = (await client.get("/api/users/", params={"limit": 100})).json()["items"]
+    guests = (await client.get("/api/users/guests", params={"limit": 100})).json()["items"]
+    if not (branches and users and guests):
+        raise RuntimeError("La base no tiene datos; ejecute app.benchmarks.seed primero")
+    fixtures = Fixtures(
+        branch_ids=[item["id"] for item in branches],
+        user_ids=[item["id"] for item in users],
+        guest_ids=[item["id"] for item in guests],
+        document_ids=[item["document_id"] for item in guests],
+    )
+    authorized = (await client.get("/api/entrances/requests", params={
+        "status": RequestStatus.authorized.value, "limit": 20,
+    })).json()["items"]
+    for item in authorized:
+        branch_id = item["branch"]["id"]
+        fixtures.gate_entries.extend((branch_id, guest["document_id"]) for guest in item["guests"])
+        passes = await client.get(f"/api/entrances/requests/{item['id']}/passes")
+        if passes.status_code == 200:
+            fixtures.pass_tokens.extend((branch_id, entry["token"]) for entry in passes.json())
+    return fixtures
+
+
+Scenario = Callable[[httpx.AsyncClient, random.Random, Fixtures], Awaitable[httpx.Response]]
+
+
+async def dashboard_listing(client, rng, fixtures):
+    """Tablero del autorizador: solicitudes pendientes."""
+    return await client.get("/api/entrances/requests", params={
+        "status": RequestStatus.auth_pending.value,
+        "authorizer_id": rng.choice(fixtures.user_ids),
+        "limit": 20,
+    })
+
+
+async def roster_upload(client, rng, fixtures):
+    """Carga de la lista de invitados de un contratista."""
+    return await client.post("/api/users/guests", json={"guests": [
+        {
+            "document_id": rng.choice(fixtures.document_ids),
+            "name": "Invitado Carga",
+            "company_id": 20, "eps_id": 1, "arl_id": 7, "city_id": 1,
+            "phone_number": "3001234567",
+            "email": "carga@contratista.com",
+        }
+        for _ in range(rng.randint(5, 30))
+    ]})
+
+
+async def request_creation(client, rng, fixtures):
+    """Creación de una solicitud de ingreso."""
+    entry = datetime.now(timezone.utc) + timedelta(days=rng.randint(0, 10), hours=1)
+    response = await client.post("/api/entrances/requests", json={
+        "branch_id": rng.choice(fixtures.branch_ids),
+        "guests_ids": rng.sample(fixtures.guest_ids, 3),
+        "entry_date": entry.isoformat(),
+        "departure_date": (entry + timedelta(hours=8)).isoformat(),
+        "reason": "Prueba de carga",
+        "creator_id": rng.choice(fixtures.user_ids),
+        "authorizer_id": rng.choice(fixtures.user_ids),
+        "security_id": rng.choice(fixtures.user_ids),
+        "materials": [{"model": "Router", "serial": "LOAD", "quantity": 1}],
+    })
+    if response.status_code == 201:
+        fixtures.pending_ids.append(response.json()["id"])
+    return response
+
+
+async def authorization(client, rng, fixtures):
+    """Autorización de una solicitud: genera el formato y envía el correo."""
+    if not fixtures.pending_ids:
+        return await request_creation(client, rng, fixtures)
+    request_id = fixtures.pending_ids.pop(rng.randrange(len(fixtures.pending_ids)))
+    return await client.put(
+        f"/api/entrances/requests/{request_id}",
+        headers={"If-Match": "*"},
+        json={"status": RequestStatus.authorized.value},
+    )
+
+
+async def gate_lookup(client, rng, fixtures):
+    """Consulta en portería de un documento en la sede; la mitad con ingreso autorizado."""
+    if fixtures.gate_entries and rng.random() < 0.5:
+        branch_id, document_id = rng.choice(fixtures.gate_entries)
+    else:
+        branch_id = rng.choice(fixtures.branch_ids)
+        document_id = rng.choice(fixtures.document_ids)
+    return await client.get(
+        "/api/entrances/checkin", params={"branch_id": branch_id, "document_id": document_id}
+    )
+
+
+async def pass_verification(client, rng, fixtures):
+    """Validación en portería de un pase de ingreso emitido."""
+    if not fixtures.pass_tokens:
+        return await gate_lookup(client, rng, fixtures)
+    branch_id, token = rng.choice(fixtures.pass_tokens)
+    return await client.post(
+        "/api/entrances/passes/verify", json={"token": token, "branch_id": branch_id}
+    )
+
+
+SCENARIOS: dict[str, tuple[Scenario, int]] = {
+    "dashboard_listing": (dashboard_listing, 40),
+    "gate_lookup": (gate_lookup, 20),
+    "pass_verification": (pass_verification, 10),
+    "request_creation": (request_creation, 15),
+    "roster_upload": (roster_upload, 10),
+    "authorization": (authorization, 5),
+}
+
+
+async def _virtual_user(client, rng, fixtures, deadline, samples):
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][1] for name in names]
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await SCENARIOS[name][0](client, rng, fixtures)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        samples[name].append(((time.perf_counter() - start) * 1000, ok))
+
+
+def _summary(latencies: list[float], errors: int, seconds: float) -> dict:
+    ordered = sorted(latencies) or [0.0]
+
+    def pct(value):
+        return round(ordered[min(int(value / 100 * len(ordered)), len(ordered) - 1)], 2)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / seconds, 2),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+    }
+
+
+async def run_stage(base_url, token, fixtures, concurrency, seconds, seed_value) -> dict:
+    """Ejecuta una etapa con ``concurrency`` usuarios virtuales."""
+    samples = defaultdict(list)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers={"Authorization": f"Bearer {token}"},
+        limits=limits, timeout=60
+    ) as client:
+        deadline = time.monotonic() + seconds
+        start = time.monotonic()
+        await asyncio.gather(*(
+            _virtual_user(client, random.Random(seed_value + idx), fixtures, deadline, samples)
+            for idx in range(concurrency)
+        ))
+        elapsed = time.monotonic() - start
+    all_samples = [sample for values in samples.values() for sample in values]
+    return {
+        "concurrency": concurrency,
+        "total": _summary(
+            [lat for lat, _ in all_samples], sum(not ok for _, ok in all_samples), elapsed
+        ),
+        "scenarios": {
+            name: _summary([lat for lat, _ in values], sum(not ok for _, ok in values), elapsed)
+            for name, values in sorted(samples.items())
+        },
+    }
+
+
+async def main_async(args) -> dict:
+    """Arranca los servicios locales, ejecuta las etapas y retorna el reporte."""
+    sink = SMTPSink()
+    smtp_port = sink.start()
+    server = None
+    base_url = args.url
+    if not base_url:
+        port = _free_port()
+        server = start_server(port, args.workers, smtp_port)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url)
+        token = create_access_token({"user_id": 1})
+        async with httpx.AsyncClient(
+            base_url=base_url, headers={"Authorization": f"Bearer {token}"}
+        ) as client:
+            fixtures = await load_fixtures(client)
+        stages = []
+        for concurrency in args.stages:
+            stage = await run_stage(
+                base_url, token, fixtures, concurrency, args.stage_seconds, args.seed
+            )
+            total = stage["total"]
+            print(
+                f"concurrencia={concurrency:4d} rps={total['throughput_rps']:8.2f} "
+                f"p50={total['p50_ms']:8.2f}ms p95={total['p95_ms']:8.2f}ms "
+                f"p99={total['p99_ms']:8.2f}ms errores={total['errors']}"
+            )
+            stages.append(stage)
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "workers": args.workers,
+            "database": os.getenv("DB_HOST", "localhost"),
+            "emails_received": sink.messages,
+            "stages": stages,
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        sink.shutdown()
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--stage-seconds", type=float, default=15)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="Usar un servidor ya iniciado en lugar de arrancar uno")
+    parser.add_argument("--output", default="bench_results")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output, f"loadtest_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Correos recibidos: {report['emails_received']}")
+    print(f"Resultados guardados en {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Mide la latencia y la cantidad de consultas por llamada de cada endpoint.
+
+Uso (sobre una base cargada con ``app.benchmarks.seed``):
+
+    python -m app.benchmarks.runner --iterations 50 --output bench_results
+    python -m app.benchmarks.runner --compare bench_results/a.json bench_results/b.json
+
+Los resultados se guardan en JSON con el commit actual para comparar ejecuciones.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess  # nosec B404
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from app.auth.dependencies import get_current_user
+from app.db.database import DATABASE_URL, SessionLocal
+from app.main import app
+from app.models.branches import Branch
+from app.models.entrances import EntranceRequest, RequestStatus
+from app.models.users import Guest, User
+from app.scripts.create_format import export_entrance_requests_to_excel
+
+TEMPLATE_PATH = "format_templates/PERMISO MOVISTAR.xlsx"
+
+
+class QueryCounter:
+    """Cuenta las sentencias ejecutadas por cualquier motor mientras está activo."""
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        if self.active:
+            self.count += 1
+
+    def measure(self, call: Callable) -> tuple[float, int]:
+        """Ejecuta ``call`` y retorna su duración y la cantidad de consultas."""
+        self.count = 0
+        self.active = True
+        start = time.perf_counter()
+        try:
+            call()
+        finally:
+            self.active = False
+        return time.perf_counter() - start, self.count
+
+
+@dataclass
+class Scenario:
+    """Llamada a medir; ``call`` recibe el generador aleatorio de la ejecución."""
+    name: str
+    call: Callable[[random.Random], None]
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    idx = min(int(round(percentile / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[idx]
+
+
+def _check(response) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.url}: {response.status_code} {response.text}")
+
+
+def build_scenarios(client: TestClient) -> list[Scenario]:
+    """Arma los escenarios a partir de los datos existentes en la base."""
+    db = SessionLocal()
+    try:
+        max_request = db.query(func.max(EntranceRequest.id)).scalar()
+        max_guest = db.query(func.max(Guest.id)).scalar()
+        max_branch = db.query(func.max(Branch.id)).scalar()
+        max_user = db.query(func.max(User.id)).scalar()
+        if not (max_request and max_guest and max_branch and max_user):
+            raise RuntimeError("La base no tiene datos; ejecute app.benchmarks.seed primero")
+        document_ids = [row[0] for row in db.query(Guest.document_id).limit(1000)]
+    finally:
+        db.close()
+
+    def get(url: str, **params):
+        return lambda rng: _check(client.get(url, params=params))
+
+    def entrance_payload(rng: random.Random) -> dict:
+        entry = datetime.now(timezone.utc) + timedelta(days=rng.randrange(1, 30))
+        return {
+            "branch_id": rng.randrange(1, max_branch + 1),
+            "guests_ids": rng.sample(range(1, max_guest + 1), 3),
+            "entry_date": entry.isoformat(),
+            "departure_date": (entry + timedelta(hours=8)).isoformat(),
+            "reason": "Prueba de rendimiento",
+            "creator_id": rng.randrange(1, max_user + 1),
+            "authorizer_id": rng.randrange(1, max_user + 1),
+            "security_id": rng.randrange(1, max_user + 1),
+            "materials": [{"model": "Router", "serial": "BENCH", "quantity": 1}],
+        }
+
+    def export(rng: random.Random):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = SessionLocal()
+            try:
+                export_entrance_requests_to_excel(
+                    db, rng.randrange(1, max_request + 1), TEMPLATE_PATH,
+                    os.path.join(tmp_dir, "output.xlsx")
+                )
+            finally:
+                db.close()
+
+    def monthly_report(rng: random.Random):
+        month = f"2024-{rng.randrange(1, 13):02d}"
+        _check(client.get("/api/reports/requests", params={
+            "start": f"{month}-01", "end": f"{month}-28", "group_by": ["department", "status"],
+        }))
+
+    return [
+        Scenario("GET /api/branches/", get("/api/branches/", limit=100)),
+        Scenario("GET /api/branches/?search", get("/api/branches/", search="sede 01")),
+        Scenario("GET /api/places/departments", get("/api/places/departments")),
+        Scenario("GET /api/places/municipalities", get("/api/places/municipalities", limit=100)),
+        Scenario("GET /api/places/cities", get("/api/places/cities", name="municipio")),
+        Scenario("GET /api/users/companies", get("/api/users/companies", is_eps=True)),
+        Scenario("GET /api/users/", get("/api/users/", limit=100)),
+        Scenario(
+            "GET /api/users/guests?document_id",
+            lambda rng: _check(client.get(
+                "/api/users/guests", params={"document_id": rng.choice(document_ids)}
+            )),
+        ),
+        Scenario(
+            "POST /api/users/guests",
+            lambda rng: _check(client.post("/api/users/guests", json={"guests": [
+                {
+                    "document_id": rng.choice(document_ids),
+                    "name": "Invitado Benchmark",
+                    "company_id": 20, "eps_id": 1, "arl_id": 7, "city_id": 1,
+                    "phone_number": "3001234567",
+                    "email": "benchmark@contratista.com",
+                }
+                for _ in range(20)
+            ]})),
+        ),
+        Scenario(
+            "GET /api/entrances/requests",
+            get("/api/entrances/requests", limit=100),
+        ),
+        Scenario(
+            "GET /api/entrances/requests?status&authorizer_id",
+            lambda rng: _check(client.get("/api/entrances/requests", params={
+                "status": RequestStatus.auth_pending.value,
+                "authorizer_id": rng.randrange(1, max_user + 1),
+            })),
+        ),
+        Scenario(
+            "GET /api/entrances/inbox/authorizer",
+            lambda rng: _check(client.get("/api/entrances/inbox/authorizer")),
+        ),
+        Scenario(
+            "GET /api/entrances/inbox/counts",
+            lambda rng: _check(client.get("/api/entrances/inbox/counts")),
+        ),
+        Scenario(
+            "GET /api/entrances/requests/{id}",
+            lambda rng: _check(
+                client.get(f"/api/entrances/requests/{rng.randrange(1, max_request + 1)}")
+            ),
+        ),
+        Scenario(
+            "POST /api/entrances/requests",
+            lambda rng: _check(
+                client.post("/api/entrances/requests", json=entrance_payload(rng))
+            ),
+        ),
+        Scenario(
+            "PUT /api/entrances/requests/{id}",
+            lambda rng: _check(client.put(
+                f"/api/entrances/requests/{rng.randrange(1, max_request + 1)}",
+                # "*" omite la comparación de versión para medir solo la actualización
+                headers={"If-Match": "*"},
+                json={"reason": "Actualizada por benchmark"},
+            )),
+        ),
+        Scenario(
+            "GET /api/entrances/checkin",
+            lambda rng: _check(client.get("/api/entrances/checkin", params={
+                "branch_id": rng.randrange(1, max_branch + 1),
+                "document_id": rng.choice(document_ids),
+            })),
+        ),
+        Scenario(
+            "GET /api/entrances/sync",
+            lambda rng: _check(client.get("/api/entrances/sync", params={
+                "branch_id": rng.randrange(1, max_branch + 1), "days": 7,
+            })),
+        ),
+        Scenario(
+            "GET /api/entrances/occupancy",
+            lambda rng: _check(client.get("/api/entrances/occupancy", params={
+                "start": (datetime(2024, 1, 1) + timedelta(days=rng.randrange(700))).isoformat(),
+                "days": 31,
+            })),
+        ),
+        Scenario("GET /api/reports/requests", monthly_report),
+        Scenario(
+            "GET /api/reports/departments/monthly",
+            lambda rng: _check(client.get("/api/reports/departments/monthly", params={
+                "month": f"2024-{rng.randrange(1, 13):02d}",
+            })),
+        ),
+        Scenario("export_entrance_requests_to_excel", export),
+    ]
+
+
+def run(iterations: int = 50, warmup: int = 3, seed_value: int = 7, only: str | None = None):
+    """Ejecuta los escenarios y retorna los resultados por escenario."""
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "benchmark", "id": 1}
+    client = TestClient(app)
+    counter = QueryCounter()
+    results = {}
+    for scenario in build_scenarios(client):
+        if only and only not in scenario.name:
+            continue
+        rng = random.Random(seed_value)
+        try:
+            for _ in range(warmup):
+                scenario.call(rng)
+            durations, queries = [], []
+            for _ in range(iterations):
+                duration, count = counter.measure(lambda: scenario.call(rng))
+                durations.append(duration * 1000)
+                queries.append(count)
+        except Exception as e:  # pylint: disable=broad-except
+            # Un escenario que falla no detiene la ejecución de los demás
+            results[scenario.name] = {"error": str(e)[:500]}
+            print(f"{scenario.name:55} ERROR {str(e)[:200]}")
+            continue
+        results[scenario.name] = {
+            "iterations": iterations,
+            "p50_ms": round(_percentile(durations, 50), 3),
+            "p95_ms": round(_percentile(durations, 95), 3),
+            "p99_ms": round(_percentile(durations, 99), 3),
+            "mean_ms": round(statistics.fmean(durations), 3),
+            "queries_per_call": round(statistics.fmean(queries), 2),
+        }
+        print(
+            f"{scenario.name:55} p50={results[scenario.name]['p50_ms']:9.2f}ms "
+            f"p95={results[scenario.name]['p95_ms']:9.2f}ms "
+            f"p99={results[scenario.name]['p99_ms']:9.2f}ms "
+            f"q={results[scenario.name]['queries_per_call']}"
+        )
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(  # nosec B603 B607
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(results: dict, output_dir: str) -> str:
+    """Guarda los resultados en ``output_dir`` y retorna la ruta del archivo."""
+    commit = _git_commit()
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now(timezone.utc)
+    path = os.path.join(output_dir, f"{timestamp.strftime('%Y%m%dT%H%M%S')}_{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": timestamp.isoformat(),
+            "database": DATABASE_URL.split("@")[-1],
+            "results": results,
+        }, f, indent=2)
+    return path
+
+
+def compare(base_path: str, new_path: str) -> None:
+    """Imprime la variación de p50, p95 y consultas entre dos ejecuciones."""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{base['commit']} -> {new['commit']}")
+    for name, result in new["results"].items():
+        previous = base["results"].get(name)
+        if previous is None or "error" in previous or "error" in result:
+            print(f"{name:55} (sin comparación)")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "queries_per_call"):
+            before, after = previous[key], result[key]
+            change = (after - before) / before * 100 if before else 0.0
+            deltas.append(f"{key}={before}->{after} ({change:+.1f}%)")
+        print(f"{name:55} " + " ".join(deltas))
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", help="Ejecutar solo los escenarios que contengan este texto")
+    parser.add_argument("--output", default="bench_results", help="Directorio de resultados")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(iterations=args.iterations, warmup=args.warmup, only=args.only)
+    print(f"Resultados guardados en {save(results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
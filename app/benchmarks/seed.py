@@ -0,0 +1,340 @@
+"""Carga determinística de datos sintéticos para las pruebas de rendimiento.
+
+Uso:
+
+    python -m app.benchmarks.seed --database-url sqlite:///bench.db --scale 0.01
+
+La carga borra todos los datos de la base. Sin ``--database-url`` se usa la base configurada
+en ``Settings`` y, como en cualquier base (también SQLite) que no tenga "bench" en el nombre,
+hay que confirmarlo con ``--i-know-this-deletes-data``.
+
+Con ``--scale 1`` se cargan 5.000 sedes, 500.000 invitados y 2.000.000 de
+solicitudes de ingreso con sus invitados y materiales. La misma semilla produce
+siempre los mismos datos, de modo que los resultados son comparables entre commits.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.engine import Engine, make_url
+
+from app.config.settings import settings
+from app.db.database import Base
+from app.models.branches import Branch, BranchTypes
+from app.models.entrances import (
+    BranchMove,
+    EntranceRequest,
+    EntranceRequestGuest,
+    Material,
+    MonthlySummary,
+    PassRevocation,
+    PendingCounter,
+    RequestStatus,
+    RequestSummary
+)
+from app.models.idempotency import IdempotencyKey
+from app.models.places import City, Department, Municipality
+from app.models.users import Company, Guest, Position, Unit, User
+from app.scripts.rebuild_counters import rebuild_pending_counters, rebuild_request_summary
+
+CHUNK_SIZE = 10_000
+
+# Departamentos de Colombia con su código DANE y su capital
+DANE_DEPARTMENTS = [
+    ("05", "Antioquia", "05001", "Medellín"),
+    ("08", "Atlántico", "08001", "Barranquilla"),
+    ("11", "Bogotá D.C.", "11001", "Bogotá D.C."),
+    ("13", "Bolívar", "13001", "Cartagena de Indias"),
+    ("15", "Boyacá", "15001", "Tunja"),
+    ("17", "Caldas", "17001", "Manizales"),
+    ("18", "Caquetá", "18001", "Florencia"),
+    ("19", "Cauca", "19001", "Popayán"),
+    ("20", "Cesar", "20001", "Valledupar"),
+    ("23", "Córdoba", "23001", "Montería"),
+    ("25", "Cundinamarca", "25899", "Zipaquirá"),
+    ("27", "Chocó", "27001", "Quibdó"),
+    ("41", "Huila", "41001", "Neiva"),
+    ("44", "La Guajira", "44001", "Riohacha"),
+    ("47", "Magdalena", "47001", "Santa Marta"),
+    ("50", "Meta", "50001", "Villavicencio"),
+    ("52", "Nariño", "52001", "Pasto"),
+    ("54", "Norte de Santander", "54001", "Cúcuta"),
+    ("63", "Quindío", "63001", "Armenia"),
+    ("66", "Risaralda", "66001", "Pereira"),
+    ("68", "Santander", "68001", "Bucaramanga"),
+    ("70", "Sucre", "70001", "Sincelejo"),
+    ("73", "Tolima", "73001", "Ibagué"),
+    ("76", "Valle del Cauca", "76001", "Cali"),
+    ("81", "Arauca", "81001", "Arauca"),
+    ("85", "Casanare", "85001", "Yopal"),
+    ("86", "Putumayo", "86001", "Mocoa"),
+    ("88", "San Andrés y Providencia", "88001", "San Andrés"),
+    ("91", "Amazonas", "91001", "Leticia"),
+    ("94", "Guainía", "94001", "Inírida"),
+    ("95", "Guaviare", "95001", "San José del Guaviare"),
+    ("97", "Vaupés", "97001", "Mitú"),
+    ("99", "Vichada", "99001", "Puerto Carreño"),
+]
+MUNICIPALITIES_PER_DEPARTMENT = 34
+EPS = ["Sura EPS", "Sanitas", "Nueva EPS", "Compensar", "Salud Total", "Famisanar"]
+ARL = ["ARL Sura", "Positiva", "Colmena", "AXA Colpatria", "Bolívar ARL"]
+FIRST_NAMES = [
+    "Juan", "María", "Carlos", "Ana", "Luis", "Laura", "Andrés", "Diana", "Jorge", "Paula"
+]
+LAST_NAMES = ["Rodríguez", "Gómez", "López", "Martínez", "García", "Pérez", "Sánchez", "Ramírez"]
+MATERIALS = ["Router", "Switch", "Antena", "Rectificador", "Batería", "Tarjeta", "Fibra óptica"]
+# Proporción aproximada de estados en producción
+STATUS_WEIGHTS = [
+    (RequestStatus.authorized, 70),
+    (RequestStatus.refused, 5),
+    (RequestStatus.auth_pending, 15),
+    (RequestStatus.security_pending, 10),
+]
+BASE_DATE = datetime(2024, 1, 1, 6, 0)
+
+
+def _bulk_insert(conn, model, rows) -> int:
+    """Inserta filas en bloques de ``CHUNK_SIZE``."""
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            conn.execute(insert(model), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(model), chunk)
+        total += len(chunk)
+    return total
+
+
+def _person_name(rng: random.Random) -> str:
+    return (
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    )
+
+
+def _phone(rng: random.Random) -> str:
+    return f"3{rng.randrange(10 ** 9):09d}"
+
+
+def is_disposable(database_url: str) -> bool:
+    """Indica si la base se puede borrar sin confirmación: solo si tiene "bench" en el nombre."""
+    # SQLite no basta: la base local de desarrollo y la de los tests también lo son
+    return "bench" in (make_url(database_url).database or "").lower()
+
+
+def seed(
+    engine: Engine,
+    scale: float = 1.0,
+    seed_value: int = 42,
+    branches: int = 5_000,
+    guests: int = 500_000,
+    requests: int = 2_000_000,
+    users: int = 2_000,
+) -> dict:
+    """Crea las tablas, borra los datos existentes y carga los datos sintéticos.
+
+    Retorna la cantidad de filas insertadas por tabla.
+    """
+    rng = random.Random(seed_value)
+    n_branches = max(int(branches * scale), 1)
+    n_guests = max(int(guests * scale), 1)
+    n_requests = max(int(requests * scale), 1)
+    n_users = max(int(users * scale), 3)
+
+    Base.metadata.create_all(bind=engine)
+    counts = {}
+    with engine.begin() as conn:
+        for model in (
+            IdempotencyKey, PendingCounter, RequestSummary, MonthlySummary, Material,
+            EntranceRequestGuest, BranchMove, PassRevocation, EntranceRequest, Guest, User,
+            Position, Unit, Company, Branch, City, Municipality, Department,
+        ):
+            conn.execute(delete(model))
+
+        # Departamentos y municipios DANE
+        counts["departments"] = _bulk_insert(conn, Department, (
+            {"id": idx, "name": name, "cod_dane": code}
+            for idx, (code, name, _, _) in enumerate(DANE_DEPARTMENTS, start=1)
+        ))
+        municipalities = []
+        for dep_id, (code, _, capital_code, capital) in enumerate(DANE_DEPARTMENTS, start=1):
+            municipalities.append((dep_id, capital_code, capital))
+            for number in range(1, MUNICIPALITIES_PER_DEPARTMENT):
+                municipalities.append(
+                    (dep_id, f"{code}{900 + number:03d}", f"Municipio {code}-{number}")
+                )
+        counts["municipalities"] = _bulk_insert(conn, Municipality, (
+            {"id": idx, "name": name, "cod_dane": cod_dane, "department_id": dep_id}
+            for idx, (dep_id, cod_dane, name) in enumerate(municipalities, start=1)
+        ))
+        counts["cities"] = _bulk_insert(conn, City, (
+            {"id": idx, "name": name, "municipality_id": idx}
+            for idx, (_, _, name) in enumerate(municipalities, start=1)
+        ))
+
+        # Sedes
+        branch_types = list(BranchTypes)
+        branch_rows = []
+        for idx in range(1, n_branches + 1):
+            mun_id = rng.randrange(1, len(municipalities) + 1)
+            branch_rows.append({
+                "id": idx,
+                "code": f"S{idx:05d}",
+                "name": f"Sede {idx:05d}",
+                "address": f"Calle {rng.randrange(1, 200)} # {rng.randrange(1, 100)}-{idx % 100}",
+                "type": branch_types[idx % len(branch_types)],
+                "department_id": municipalities[mun_id - 1][0],
+                "municipality_id": mun_id,
+                "is_j10": idx % 10 == 0,
+            })
+        counts["branches"] = _bulk_insert(conn, Branch, branch_rows)
+
+        # Empresas, EPS y ARL
+        companies = (
+            [{"name": name, "is_eps": True, "is_arl": False} for name in EPS]
+            + [{"name": name, "is_eps": False, "is_arl": True} for name in ARL]
+            + [
+                {"name": f"Contratista {idx:03d} SAS", "is_eps": False, "is_arl": False}
+                for idx in range(1, 201)
+            ]
+        )
+        counts["companies"] = _bulk_insert(conn, Company, (
+            {"id": idx, "nit": f"900{idx:06d}", **company}
+            for idx, company in enumerate(companies, start=1)
+        ))
+        eps_ids = range(1, len(EPS) + 1)
+        arl_ids = range(len(EPS) + 1, len(EPS) + len(ARL) + 1)
+        contractor_ids = range(len(EPS) + len(ARL) + 1, len(companies) + 1)
+
+        # Empleados que crean, autorizan y revisan solicitudes
+        counts["units"] = _bulk_insert(conn, Unit, (
+            {"id": idx, "name": f"Dependencia {idx}"} for idx in range(1, 21)
+        ))
+        counts["positions"] = _bulk_insert(conn, Position, (
+            {"id": idx, "name": f"Cargo {idx}"} for idx in range(1, 11)
+        ))
+        counts["users"] = _bulk_insert(conn, User, (
+            {
+                "id": idx,
+                "name": _person_name(rng),
+                "unit_id": rng.randrange(1, 21),
+                "position_id": rng.randrange(1, 11),
+                "phone_number": _phone(rng),
+                "email": f"empleado{idx}@telefonica.com",
+            }
+            for idx in range(1, n_users + 1)
+        ))
+
+        # Invitados
+        counts["guests"] = _bulk_insert(conn, Guest, (
+            {
+                "id": idx,
+                "document_id": f"{10_000_000 + idx}",
+                "name": _person_name(rng),
+                "eps_id": rng.choice(eps_ids),
+                "arl_id": rng.choice(arl_ids),
+                "company_id": rng.choice(contractor_ids),
+                "city_id": rng.randrange(1, len(municipalities) + 1),
+                "phone_number": _phone(rng),
+                "email": f"invitado{idx}@contratista.com",
+            }
+            for idx in range(1, n_guests + 1)
+        ))
+
+        # Solicitudes de ingreso con invitados y materiales
+        statuses = [status for status, _ in STATUS_WEIGHTS]
+        weights = [weight for _, weight in STATUS_WEIGHTS]
+        span_hours = 24 * 365 * 2
+        request_rows, guest_links, materials = [], [], []
+        counts["entrance_requests"] = 0
+        counts["entrance_requests_guests"] = 0
+        counts["entrance_materials"] = 0
+        link_id = material_id = 0
+        for idx in range(1, n_requests + 1):
+            entry = BASE_DATE + timedelta(hours=rng.randrange(span_hours))
+            departure = entry + timedelta(hours=rng.choice((4, 8, 10, 24, 72, 24 * 7)))
+            request_rows.append({
+                "id": idx,
+                "branch_id": rng.randrange(1, n_branches + 1),
+                "entry_date": entry,
+                "departure_date": departure,
+                "reason": f"Mantenimiento preventivo {idx}",
+                "status": rng.choices(statuses, weights)[0],
+                "creator_id": rng.randrange(1, n_users + 1),
+                "authorizer_id": rng.randrange(1, n_users + 1),
+                "security_id": rng.randrange(1, n_users + 1),
+                "is_installation": rng.random() < 0.2,
+                "is_uninstallation": rng.random() < 0.1,
+            })
+            for guest_id in rng.sample(range(1, n_guests + 1), min(rng.randint(1, 5), n_guests)):
+                link_id += 1
+                guest_links.append({
+                    "id": link_id,
+                    "entrance_request_id": idx,
+                    "guest_id": guest_id,
+                    "entry_date": entry,
+                    "departure_date": departure,
+                })
+            for _ in range(rng.choice((0, 0, 1, 2, 3))):
+                material_id += 1
+                materials.append({
+                    "id": material_id,
+                    "entrance_request_id": idx,
+                    "model": rng.choice(MATERIALS),
+                    "serial": f"SN{material_id:010d}",
+                    "description": "Equipo de red",
+                    "quantity": rng.randint(1, 4),
+                })
+            if len(request_rows) >= CHUNK_SIZE:
+                counts["entrance_requests"] += _bulk_insert(conn, EntranceRequest, request_rows)
+                counts["entrance_requests_guests"] += _bulk_insert(
+                    conn, EntranceRequestGuest, guest_links
+                )
+                counts["entrance_materials"] += _bulk_insert(conn, Material, materials)
+                request_rows, guest_links, materials = [], [], []
+        counts["entrance_requests"] += _bulk_insert(conn, EntranceRequest, request_rows)
+        counts["entrance_requests_guests"] += _bulk_insert(
+            conn, EntranceRequestGuest, guest_links
+        )
+        counts["entrance_materials"] += _bulk_insert(conn, Material, materials)
+        # La carga masiva no pasa por la sesión que mantiene los contadores y el resumen
+        counts["pending_counters"] = rebuild_pending_counters(conn)
+        counts["entrance_request_summary"] = rebuild_request_summary(conn)
+    return counts
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Factor sobre los volúmenes")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del generador")
+    parser.add_argument(
+        "--database-url", help="Base a cargar (por defecto la configurada en Settings)"
+    )
+    parser.add_argument(
+        "--i-know-this-deletes-data", action="store_true", dest="confirmed",
+        help='Permite borrar una base sin "bench" en el nombre',
+    )
+    args = parser.parse_args()
+
+    database_url = args.database_url or settings.DB_URL
+    if not args.confirmed and not is_disposable(database_url):
+        parser.error(
+            f"La carga borra todos los datos de {make_url(database_url)!r}; use una base de "
+            "benchmarks o confirme con --i-know-this-deletes-data"
+        )
+    engine = create_engine(database_url)
+    start = time.perf_counter()
+    counts = seed(engine, scale=args.scale, seed_value=args.seed)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Datos cargados en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
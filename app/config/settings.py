@@ -16,6 +16,69 @@ class Settings:
     FROM_EMAIL: str = os.getenv("FROM_EMAIL")
     FROM_EMAIL_NAME: str = os.getenv("FROM_EMAIL_NAME")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "default_secret_key")
+    METRICS_DIR: str | None = os.getenv("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "15"))
+    SLOW_REQUEST_THRESHOLD_MS: float = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000"))
+    SLOW_REQUEST_BUFFER_SIZE: int = int(os.getenv("SLOW_REQUEST_BUFFER_SIZE", "50"))
+    SLOW_REQUEST_MAX_STATEMENTS: int = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "500"))
+    SLOW_REQUEST_EXPLAIN: bool = os.getenv("SLOW_REQUEST_EXPLAIN", "false").lower() == "true"
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_SAMPLE_RATE: float = float(os.getenv("PROFILE_MAX_SAMPLE_RATE", "0.05"))
+    CHECKIN_INDEX_HORIZON_HOURS: int = int(os.getenv("CHECKIN_INDEX_HORIZON_HOURS", "24"))
+    CHECKIN_INDEX_TTL_SECONDS: int = int(os.getenv("CHECKIN_INDEX_TTL_SECONDS", "60"))
+    SYNC_OVERLAP_SECONDS: int = int(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+    SYNC_MAX_DAYS: int = int(os.getenv("SYNC_MAX_DAYS", "7"))
+    PASS_REVOCATION_TTL_SECONDS: int = int(os.getenv("PASS_REVOCATION_TTL_SECONDS", "60"))
+    EVENT_BROKER: str = os.getenv("EVENT_BROKER", "memory")
+    EVENT_BROKER_PATH: str = os.getenv("EVENT_BROKER_PATH", "events.db")
+    EVENT_POLL_INTERVAL: float = float(os.getenv("EVENT_POLL_INTERVAL", "0.5"))
+    EVENT_RETENTION_SECONDS: int = int(os.getenv("EVENT_RETENTION_SECONDS", "300"))
+    EVENT_QUEUE_SIZE: int = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+    TRANSITION_BATCH_MAX: int = int(os.getenv("TRANSITION_BATCH_MAX", "200"))
+    TRANSITION_RENDER_WORKERS: int = int(os.getenv("TRANSITION_RENDER_WORKERS", "4"))
+    RECURRENCE_MAX_OCCURRENCES: int = int(os.getenv("RECURRENCE_MAX_OCCURRENCES", "260"))
+    EVENT_HEARTBEAT_SECONDS: float = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+    GUEST_OVERLAP_POLICY: str = os.getenv("GUEST_OVERLAP_POLICY", "warn")
+    OCCUPANCY_MAX_DAYS: int = int(os.getenv("OCCUPANCY_MAX_DAYS", "31"))
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    ROSTER_CHUNK_SIZE: int = int(os.getenv("ROSTER_CHUNK_SIZE", "1000"))
+    ROSTER_MAX_ERRORS: int = int(os.getenv("ROSTER_MAX_ERRORS", "1000"))
+    ROSTER_MAX_BYTES: int = int(os.getenv("ROSTER_MAX_BYTES", str(20 * 1024 * 1024)))
+    FORMAT_RENDER_ENGINE: str = os.getenv("FORMAT_RENDER_ENGINE", "xml")
+    FORMAT_CACHE_BACKEND: str = os.getenv("FORMAT_CACHE_BACKEND", "local")
+    FORMAT_CACHE_DIR: str = os.getenv("FORMAT_CACHE_DIR", "format_cache")
+    FORMAT_CACHE_MAX_BYTES: int = int(os.getenv("FORMAT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    FORMAT_CACHE_MAX_AGE: int = int(os.getenv("FORMAT_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+    FORMAT_CACHE_S3_ENDPOINT: str = os.getenv("FORMAT_CACHE_S3_ENDPOINT", "")
+    FORMAT_CACHE_BUCKET: str = os.getenv("FORMAT_CACHE_BUCKET", "")
+    FORMAT_CACHE_PREFIX: str = os.getenv("FORMAT_CACHE_PREFIX", "formats/")
+    REQUEST_CACHE_BACKEND: str = os.getenv("REQUEST_CACHE_BACKEND", "memory")
+    REQUEST_CACHE_MAX_ENTRIES: int = int(os.getenv("REQUEST_CACHE_MAX_ENTRIES", "10000"))
+    REQUEST_CACHE_TTL: int = int(os.getenv("REQUEST_CACHE_TTL", "300"))
+    REQUEST_CACHE_REDIS_URL: str = os.getenv("REQUEST_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    REQUEST_CACHE_PREFIX: str = os.getenv("REQUEST_CACHE_PREFIX", "entrance_request:")
+    REQUEST_CACHE_LOCK_TIMEOUT: float = float(os.getenv("REQUEST_CACHE_LOCK_TIMEOUT", "5"))
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+    IDEMPOTENCY_PURGE_SECONDS: int = int(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "300"))
+    THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "40"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+    ADMISSION_HEAVY_SHARE: float = float(os.getenv("ADMISSION_HEAVY_SHARE", "0.25"))
+    ADMISSION_ROUTE_LIMITS: str = os.getenv("ADMISSION_ROUTE_LIMITS", "")
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")  # nosec B104
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "1"))
+    SERVER_RELOAD: bool = os.getenv("SERVER_RELOAD", "false").lower() == "true"
+    SERVER_MAX_REQUESTS: int = int(os.getenv("SERVER_MAX_REQUESTS", "10000"))
+    SERVER_MAX_REQUESTS_JITTER: int = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "1000"))
+    SERVER_GRACEFUL_TIMEOUT: int = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+    SERVER_SHUTDOWN_TIMEOUT: float = float(os.getenv("SERVER_SHUTDOWN_TIMEOUT", "90"))
 
     @property
     def DB_URL(self) -> str:
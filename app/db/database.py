@@ -9,10 +9,16 @@ DATABASE_URL = settings.DB_URL
 print(f"Conectando a la base de datos en: {DATABASE_URL}")
 
 # Crea el motor de la base de datos
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    # El control de admisión deriva su capacidad de este tamaño de pool
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
 
 # Crear SessionLocal para cada request
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
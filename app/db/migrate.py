@@ -1,8 +1,72 @@
-"""Script para migrar los modelos a la base de datos."""
+"""Script para migrar los modelos a la base de datos.
+
+``create_all`` solo crea las tablas que no existen; las columnas e índices que se agregan a
+modelos ya desplegados se crean con ``ALTER TABLE`` a partir de la definición del modelo.
+"""
+from sqlalchemy import inspect, text
+
 from app.db.database import Base, engine
 from app.models.branches import Branch  # noqa: F401
 from app.models.places import City, Department, Municipality  # noqa: F401
 from app.models.users import Guest  # noqa: F401
 from app.models.entrances import EntranceRequest  # noqa: F401
+from app.models.idempotency import IdempotencyKey  # noqa: F401
+from app.scripts.backfill_guest_windows import backfill_guest_windows
+
+
+def _add_column(connection, table, column) -> None:
+    """Agrega ``column`` a una tabla existente y llena las filas con su valor por defecto."""
+    dialect = connection.dialect
+    preparer = dialect.identifier_preparer
+    table_name, name = preparer.format_table(table), preparer.format_column(column)
+    column_type = column.type.compile(dialect=dialect)
+    default = column.server_default
+    if default is not None and isinstance(default.arg, str):
+        # Un valor constante permite crear la columna NOT NULL en una sola sentencia
+        null = "" if column.nullable else " NOT NULL"
+        connection.execute(text(
+            f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"
+            f" DEFAULT '{default.arg}'{null}"
+        ))
+        return
+    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+    if default is None:
+        return
+    # SQLite no acepta defaults no constantes en ADD COLUMN: se llenan las filas y, donde se
+    # puede, se agregan el default y la restricción después
+    value = default.arg.compile(dialect=dialect)
+    connection.execute(text(f"UPDATE {table_name} SET {name} = {value}"))
+    if dialect.name == "sqlite":
+        return
+    connection.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {name} SET DEFAULT {value}"))
+    if not column.nullable:
+        connection.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {name} SET NOT NULL"))
+
+
+def migrate(connection) -> list[str]:
+    """Crea las tablas nuevas y agrega las columnas e índices faltantes a las existentes."""
+    inspector = inspect(connection)
+    existing = {
+        table.name for table in Base.metadata.sorted_tables if inspector.has_table(table.name)
+    }
+    Base.metadata.create_all(bind=connection)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                _add_column(connection, table, column)
+                added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    if "entrance_requests_guests.entry_date" in added:
+        backfill_guest_windows(connection)
+    return added
+
 
-Base.metadata.create_all(bind=engine)
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        for name in migrate(conn):
+            print(f"Columna agregada: {name}")
@@ -1,9 +1,61 @@
+import logging
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
 from fastapi import FastAPI, Depends
 from fastapi.openapi.utils import get_openapi
-from app.routers import branches, users, places, entrances
-from app.auth.dependencies import get_current_user
+from sqlalchemy.exc import SQLAlchemyError
+from app.routers import admin, branches, users, places, entrances, metrics, reports
+from app.auth.dependencies import get_admin_user, get_current_user
+from app.config.settings import settings
+from app.db.database import SessionLocal, engine
+from app.utils.admission import AdmissionControlMiddleware
+from app.utils.checkin import checkin_index
+from app.utils.events import broker
+from app.utils.flight_recorder import FlightRecorderMiddleware
+from app.utils.metrics import REGISTRY, MetricsMiddleware, track_db_pool
+from app.utils.passes import pass_revocations
+from app.utils.profiling import ProfilingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Prepara los índices en memoria y el broker de eventos al iniciar la aplicación."""
+    # Hilos para las rutas síncronas; el control de admisión deriva su capacidad de este valor
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    db = SessionLocal()
+    try:
+        try:
+            checkin_index.build(db)
+        except SQLAlchemyError as e:
+            # Sin índice la portería consulta la base hasta la siguiente reconstrucción
+            db.rollback()
+            logger.warning(f"No fue posible construir el índice de portería: {e}")
+        try:
+            pass_revocations.load(db)
+        except SQLAlchemyError as e:
+            # Se reintenta al validar el siguiente pase
+            db.rollback()
+            logger.warning(f"No fue posible cargar las revocaciones de pases: {e}")
+    finally:
+        db.close()
+    broker.start()
+    yield
+    # Los workers del servidor terminan sin pasar por atexit; se publica la última instantánea
+    REGISTRY.flush()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(FlightRecorderMiddleware)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(MetricsMiddleware)
+track_db_pool(engine)
 
-app = FastAPI()
+app.include_router(metrics.router)
 
 app.include_router(
     branches.router,
@@ -29,6 +81,18 @@ app.include_router(
     tags=["Ingresos"],
     dependencies=[Depends(get_current_user)]
 )
+app.include_router(
+    reports.router,
+    prefix="/api/reports",
+    tags=["Reportes"],
+    dependencies=[Depends(get_current_user)]
+)
+app.include_router(
+    admin.router,
+    prefix="/api/admin",
+    tags=["Administración"],
+    dependencies=[Depends(get_admin_user)]
+)
 
 
 def custom_openapi():
@@ -1,17 +1,32 @@
 """Modelos de solicitud de ingreso."""
+from collections import Counter
+from datetime import datetime
 from enum import Enum as Enum_py
+from itertools import chain
+
 from sqlalchemy import (
     Boolean,
     CheckConstraint,
+    case,
     Column,
+    Date,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
-    String
+    String,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    update
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, relationship
 from app.db.database import Base
+from app.models.branches import Branch
 
 
 class RequestStatus(str, Enum_py):
@@ -37,6 +52,12 @@ class EntranceRequest(Base):
     security_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     is_installation = Column(Boolean, default=False)
     is_uninstallation = Column(Boolean, default=False)
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+        server_default=func.now()
+    )
+    # Versión para ETag y concurrencia optimista; sube con cada cambio de la solicitud
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     branch = relationship("Branch", backref="entrance_requests")
     creator = relationship("User", foreign_keys=[creator_id], backref="creator_requests")
@@ -45,8 +66,29 @@ class EntranceRequest(Base):
 
     __table_args__ = (
         CheckConstraint("departure_date >= entry_date", name="validate_dates"),
+        Index(
+            "ix_entrance_requests_branch_status_dates",
+            "branch_id", "status", "entry_date", "departure_date"
+        ),
+        Index("ix_entrance_requests_branch_updated", "branch_id", "updated_at"),
+        # Índices parciales para las bandejas de pendientes de cada usuario
+        Index(
+            "ix_entrance_requests_auth_pending",
+            "authorizer_id", "entry_date",
+            postgresql_where=status == RequestStatus.auth_pending,
+            sqlite_where=status == RequestStatus.auth_pending,
+        ),
+        Index(
+            "ix_entrance_requests_security_pending",
+            "security_id", "entry_date",
+            postgresql_where=status == RequestStatus.security_pending,
+            sqlite_where=status == RequestStatus.security_pending,
+        ),
     )
 
+    # Cada UPDATE del ORM se condiciona a la versión leída y la incrementa
+    __mapper_args__ = {"version_id_col": version}
+
     @property
     def guest_list(self):
         return [g.guest for g in self.guests]
@@ -57,10 +99,26 @@ class EntranceRequestGuest(Base):
     __tablename__ = "entrance_requests_guests"
 
     id = Column(Integer, primary_key=True, index=True)
-    entrance_request_id = Column(Integer, ForeignKey("entrance_requests.id"), nullable=False)
-    guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False)
+    entrance_request_id = Column(
+        Integer, ForeignKey("entrance_requests.id"), nullable=False, index=True
+    )
+    guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False, index=True)
+    # Copia de la ventana de la solicitud para buscar traslapes por invitado
+    entry_date = Column(DateTime, nullable=True)
+    departure_date = Column(DateTime, nullable=True)
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+        server_default=func.now()
+    )
 
     entrance_request = relationship("EntranceRequest", backref="guests")
+
+    __table_args__ = (
+        Index(
+            "ix_entrance_requests_guests_guest_window",
+            "guest_id", "departure_date", "entry_date"
+        ),
+    )
     guest = relationship("Guest", backref="entrance_requests")
 
 
@@ -74,5 +132,309 @@ class Material(Base):
     serial = Column(String, nullable=True, index=True)
     description = Column(String, nullable=True)
     quantity = Column(Integer, nullable=False, default=1)
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+        server_default=func.now()
+    )
 
     entrance_request = relationship("EntranceRequest", backref="materials")
+
+
+class BranchMove(Base):
+    """Modelo registro de las solicitudes trasladadas de sede, para avisar a la sede anterior."""
+    __tablename__ = "entrance_request_branch_moves"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entrance_request_id = Column(Integer, ForeignKey("entrance_requests.id"), nullable=False)
+    # Sede de la que salió la solicitud
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    moved_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_entrance_request_branch_moves_branch_moved", "branch_id", "moved_at"),
+    )
+
+
+class PassRevocation(Base):
+    """Modelo revocación de los pases emitidos para una solicitud hasta ``revoked_at``."""
+    __tablename__ = "pass_revocations"
+
+    entrance_request_id = Column(Integer, ForeignKey("entrance_requests.id"), primary_key=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
+    # Después de esta fecha ningún pase revocado sigue vigente
+    expires_at = Column(DateTime, nullable=False)
+
+
+class PendingCounter(Base):
+    """Modelo contador de solicitudes pendientes por usuario y rol."""
+    __tablename__ = "pending_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    role = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class RequestSummary(Base):
+    """Modelo resumen de solicitudes por sede, estado y día de ingreso."""
+    __tablename__ = "entrance_request_summary"
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    status = Column(Enum(RequestStatus), primary_key=True)
+    day = Column(Date, primary_key=True)
+    # Departamento de la sede, copiado para agrupar sin unir con las sedes
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Índice que cubre los reportes por rango de días
+        Index(
+            "ix_entrance_request_summary_day",
+            "day", "department_id", "branch_id", "status", "count"
+        ),
+    )
+
+
+class MonthlySummary(Base):
+    """Modelo resumen de solicitudes por departamento, estado y mes de ingreso."""
+    __tablename__ = "entrance_request_monthly_summary"
+
+    department_id = Column(Integer, ForeignKey("departments.id"), primary_key=True)
+    status = Column(Enum(RequestStatus), primary_key=True)
+    month = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Estado pendiente de cada rol y columna con el usuario responsable
+PENDING_ROLES = {
+    RequestStatus.auth_pending: ("authorizer", "authorizer_id"),
+    RequestStatus.security_pending: ("security", "security_id"),
+}
+PENDING_COLUMNS = ("status", "authorizer_id", "security_id")
+SUMMARY_COLUMNS = ("branch_id", "status", "entry_date")
+
+
+def pending_key(values: dict) -> tuple[int, str] | None:
+    """Retorna el usuario y el rol al que le cuenta la solicitud como pendiente."""
+    role = PENDING_ROLES.get(values["status"])
+    if role is None or values[role[1]] is None:
+        return None
+    return values[role[1]], role[0]
+
+
+def summary_key(values: dict) -> tuple | None:
+    """Retorna la sede, el estado y el día del resumen al que suma la solicitud."""
+    if values["status"] is None:
+        return None
+    return values["branch_id"], values["status"], values["entry_date"].date()
+
+
+def _current_values(entrance_request: EntranceRequest, columns=PENDING_COLUMNS) -> dict:
+    """Valores actuales de las columnas indicadas."""
+    return {name: getattr(entrance_request, name) for name in columns}
+
+
+def _previous_values(entrance_request: EntranceRequest, columns=PENDING_COLUMNS) -> dict:
+    """Valores confirmados de las columnas indicadas."""
+    attrs = inspect(entrance_request).attrs
+    values = {}
+    for name in columns:
+        history = attrs[name].history
+        values[name] = history.deleted[0] if history.deleted else getattr(entrance_request, name)
+    return values
+
+
+def _increment(connection, table, keys: dict, delta: int, values: dict | None = None) -> None:
+    """Suma ``delta`` a la columna ``count`` de la fila con la llave ``keys``."""
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    connection.execute(
+        dialect.insert(table)
+        .values(**keys, **(values or {}), count=delta)
+        .on_conflict_do_update(
+            index_elements=[table.c[name] for name in keys],
+            set_={"count": table.c.count + delta},
+        )
+    )
+
+
+def increment_pending_counter(connection, user_id: int, role: str, delta: int) -> None:
+    """Suma ``delta`` al contador del usuario en la transacción de ``connection``."""
+    _increment(connection, PendingCounter.__table__, {"user_id": user_id, "role": role}, delta)
+
+
+def increment_request_summary(connection, branch_id: int, status, day, delta: int) -> None:
+    """Suma ``delta`` a los resúmenes diario y mensual en la transacción de ``connection``."""
+    department_id = select(Branch.department_id).where(Branch.id == branch_id).scalar_subquery()
+    _increment(
+        connection,
+        RequestSummary.__table__,
+        {"branch_id": branch_id, "status": status, "day": day},
+        delta,
+        {"department_id": department_id},
+    )
+    _increment(
+        connection,
+        MonthlySummary.__table__,
+        {"department_id": department_id, "status": status, "month": day.replace(day=1)},
+        delta,
+    )
+
+
+def record_pass_revocation(
+    connection, entrance_request_id: int, revoked_at: datetime, expires_at: datetime
+) -> None:
+    """Guarda la revocación en la transacción de ``connection`` para los demás workers."""
+    table = PassRevocation.__table__
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(
+        entrance_request_id=entrance_request_id, revoked_at=revoked_at, expires_at=expires_at
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.entrance_request_id],
+        set_={
+            "revoked_at": statement.excluded.revoked_at,
+            # Se conserva el vencimiento mayor para no liberar pases de una ventana anterior
+            "expires_at": case(
+                (table.c.expires_at > statement.excluded.expires_at, table.c.expires_at),
+                else_=statement.excluded.expires_at,
+            ),
+        },
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def update_pending_counters(session, flush_context, instances):
+    """Mantiene los contadores de pendientes en la misma transacción de la solicitud."""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, EntranceRequest):
+            deltas[pending_key(_current_values(obj))] += 1
+    for obj in session.dirty:
+        if isinstance(obj, EntranceRequest) and session.is_modified(obj):
+            deltas[pending_key(_previous_values(obj))] -= 1
+            deltas[pending_key(_current_values(obj))] += 1
+    for obj in session.deleted:
+        if isinstance(obj, EntranceRequest):
+            deltas[pending_key(_previous_values(obj))] -= 1
+    for key, delta in deltas.items():
+        if key is not None and delta:
+            increment_pending_counter(session.connection(), *key, delta)
+
+
+@event.listens_for(Session, "after_flush")
+def update_request_summary(session, flush_context):
+    """Mantiene el resumen de solicitudes en la misma transacción de la solicitud.
+
+    Se ejecuta después del flush para que la sede ya exista al copiar su departamento; el
+    historial de los atributos todavía conserva los valores anteriores.
+    """
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, EntranceRequest):
+            deltas[summary_key(_current_values(obj, SUMMARY_COLUMNS))] += 1
+    for obj in session.dirty:
+        if isinstance(obj, EntranceRequest) and session.is_modified(obj):
+            deltas[summary_key(_previous_values(obj, SUMMARY_COLUMNS))] -= 1
+            deltas[summary_key(_current_values(obj, SUMMARY_COLUMNS))] += 1
+    for obj in session.deleted:
+        if isinstance(obj, EntranceRequest):
+            deltas[summary_key(_previous_values(obj, SUMMARY_COLUMNS))] -= 1
+    for key, delta in deltas.items():
+        if key is not None and delta:
+            increment_request_summary(session.connection(), *key, delta)
+
+
+@event.listens_for(Session, "before_flush")
+def record_branch_moves(session, flush_context, instances):
+    """Registra la sede anterior de las solicitudes que cambian de sede."""
+    now = datetime.now()
+    moves = []
+    for obj in session.dirty:
+        if not isinstance(obj, EntranceRequest):
+            continue
+        history = inspect(obj).attrs.branch_id.history
+        if history.deleted and history.deleted[0] != obj.branch_id:
+            moves.append(
+                {"entrance_request_id": obj.id, "branch_id": history.deleted[0], "moved_at": now}
+            )
+    if moves:
+        session.connection().execute(insert(BranchMove.__table__), moves)
+
+
+@event.listens_for(Session, "before_flush")
+def touch_entrance_requests(session, flush_context, instances):
+    """Actualiza ``updated_at`` y la versión de la solicitud cuando cambian sus invitados o
+    materiales."""
+    request_ids = {
+        obj.entrance_request_id
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, (EntranceRequestGuest, Material)) and obj.entrance_request_id
+    }
+    now = datetime.now()
+    for request_id in list(request_ids):
+        entrance_request = session.identity_map.get(
+            session.identity_key(EntranceRequest, request_id)
+        )
+        if entrance_request is None:
+            continue
+        request_ids.discard(request_id)
+        # Las solicitudes cargadas se actualizan con el ORM para respetar su versión leída
+        if entrance_request not in session.new and entrance_request not in session.deleted:
+            entrance_request.updated_at = now
+    if request_ids:
+        # Se usa la conexión para no disparar de nuevo el autoflush de la sesión
+        table = EntranceRequest.__table__
+        session.connection().execute(
+            update(table)
+            .where(table.c.id.in_(request_ids))
+            .values(updated_at=now, version=table.c.version + 1)
+        )
+
+
+def touch_guest_requests(connection, guest_ids) -> None:
+    """Sube ``updated_at`` y la versión de las solicitudes que embeben a los invitados.
+
+    Las solicitudes muestran los datos del invitado, así que su ETag y la sincronización deben
+    cambiar cuando se editan; se llama en la transacción que actualiza a los invitados.
+    """
+    guest_ids = list(set(guest_ids))
+    if not guest_ids:
+        return
+    table = EntranceRequest.__table__
+    links = EntranceRequestGuest.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id.in_(
+            select(links.c.entrance_request_id).where(links.c.guest_id.in_(guest_ids))
+        ))
+        .values(updated_at=datetime.now(), version=table.c.version + 1)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def sync_guest_windows(session, flush_context, instances):
+    """Copia la ventana de la solicitud a sus invitados cuando se agregan o cambian las fechas."""
+    # Solicitudes que se insertan en el mismo flush que sus invitados
+    new_requests = {
+        obj.id: obj for obj in session.new if isinstance(obj, EntranceRequest) and obj.id
+    }
+    for obj in session.new:
+        if isinstance(obj, EntranceRequestGuest) and obj.entry_date is None:
+            entrance_request = (
+                obj.entrance_request
+                or new_requests.get(obj.entrance_request_id)
+                or session.get(EntranceRequest, obj.entrance_request_id)
+            )
+            if entrance_request is not None:
+                obj.entry_date = entrance_request.entry_date
+                obj.departure_date = entrance_request.departure_date
+    table = EntranceRequestGuest.__table__
+    for obj in session.dirty:
+        if not isinstance(obj, EntranceRequest):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.entry_date.history.has_changes() or attrs.departure_date.history.has_changes():
+            session.connection().execute(
+                update(table)
+                .where(table.c.entrance_request_id == obj.id)
+                .values(entry_date=obj.entry_date, departure_date=obj.departure_date)
+            )
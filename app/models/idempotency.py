@@ -0,0 +1,18 @@
+"""Modelos de idempotencia."""
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from app.db.database import Base
+
+
+class IdempotencyKey(Base):
+    """Modelo respuesta guardada por llave de idempotencia."""
+    __tablename__ = "idempotency_keys"
+
+    # Endpoint y usuario que enviaron la llave
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    # Hash del cuerpo validado, para rechazar la misma llave con otro contenido
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    headers = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
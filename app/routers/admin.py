@@ -0,0 +1,63 @@
+"""Rutas de diagnóstico para los administradores de la aplicación."""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.schemas.admin import (
+    ProfilingSamplingSchema,
+    ProfilingStatusSchema,
+    ProfilingTokenRequestSchema,
+    ProfilingTokenSchema,
+)
+from app.scripts.rebuild_counters import rebuild_pending_counters, rebuild_request_summary
+from app.utils.flight_recorder import slow_requests
+from app.utils.profiling import create_profile_token, get_sampling, set_sampling
+
+router = APIRouter()
+
+
+@router.get("/slow-requests")
+def get_slow_requests():
+    """Obtiene las últimas peticiones que superaron el umbral de lentitud."""
+    return list(reversed(slow_requests))
+
+
+@router.delete("/slow-requests", status_code=204)
+def clear_slow_requests():
+    """Vacía el registro de peticiones lentas."""
+    slow_requests.clear()
+
+
+@router.get("/profiling", response_model=ProfilingStatusSchema)
+def get_profiling():
+    """Obtiene el estado del muestreo de perfilado de peticiones."""
+    return get_sampling()
+
+
+@router.put("/profiling", response_model=ProfilingStatusSchema)
+def update_profiling(data: ProfilingSamplingSchema):
+    """Activa o desactiva el muestreo de perfilado; la tasa se limita a la configurada."""
+    return set_sampling(data.rate, data.duration_seconds)
+
+
+@router.post("/profiling/token", response_model=ProfilingTokenSchema)
+def create_profiling_token(data: ProfilingTokenRequestSchema):
+    """Genera un token firmado para perfilar peticiones con el encabezado X-Profile-Token."""
+    token = create_profile_token(data.expires_in)
+    return {"token": token, "expires_at": int(token.partition(".")[0])}
+
+
+@router.post("/pending-counters/rebuild")
+def rebuild_counters(db: Session = Depends(get_db)):
+    """Recalcula los contadores de solicitudes pendientes por usuario."""
+    total = rebuild_pending_counters(db.connection())
+    db.commit()
+    return {"counters": total}
+
+
+@router.post("/request-summary/rebuild")
+def rebuild_summary(db: Session = Depends(get_db)):
+    """Recalcula el resumen de solicitudes por sede, estado y día."""
+    total = rebuild_request_summary(db.connection())
+    db.commit()
+    return {"rows": total}
@@ -8,8 +8,9 @@ from app.db.database import get_db
 from app.models.branches import Branch, BranchTypes
 from app.schemas.branches import BranchSchema
 from app.utils.pagination import paginate, PaginatedResponse
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.get("/", response_model=PaginatedResponse[BranchSchema])
@@ -1,35 +1,167 @@
 """Rutas para la creacion de solicitudes de ingreso."""
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import tempfile
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 from fastapi.params import Body, Query
+from sqlalchemy import and_, insert, or_, select, update
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
+from app.auth.dependencies import get_current_user, get_current_user_id
+from app.config.settings import settings
 from app.db.database import get_db
-from app.models.entrances import Material, EntranceRequest, EntranceRequestGuest, RequestStatus
+from app.models.entrances import (
+    BranchMove,
+    Material,
+    EntranceRequest,
+    EntranceRequestGuest,
+    PENDING_ROLES,
+    PendingCounter,
+    RequestStatus,
+    increment_pending_counter,
+    increment_request_summary,
+    pending_key,
+    record_pass_revocation
+)
 from app.models.branches import Branch
 from app.models.users import Guest, User
 from app.schemas.entrances import (
+    CheckInSchema,
     EntranceRequestCreateSchema,
     EntranceRequestUpdateSchema,
-    EntranceRequestSchema
+    EntranceRequestSchema,
+    EntryPassSchema,
+    EntryPassVerificationSchema,
+    EntryPassVerifySchema,
+    GuestConflictSchema,
+    InboxCountsSchema,
+    OccupancySchema,
+    RecurringEntranceRequestResultSchema,
+    RecurringEntranceRequestSchema,
+    StatusTransitionBatchResultSchema,
+    StatusTransitionBatchSchema,
+    StatusTransitionResultSchema,
+    SyncRequestSchema,
+    SyncSchema
+)
+from app.utils.checkin import checkin_index
+from app.utils.dates import to_local_naive
+from app.utils.events import event_stream, hub, publish_request_event
+from app.utils.email import build_approval_body, send_email_with_attachments
+from app.utils.etags import entity_tag, etag_matches
+from app.utils.exports import request_filters
+from app.utils.format_cache import passes_for_format
+from app.utils.idempotency import (
+    IDEMPOTENCY_HEADER,
+    begin_idempotent,
+    idempotency_scope,
+    store_response
 )
-from app.utils.email import send_email_with_attachments
+from app.utils.passes import issue_passes, pass_revocations, verify_pass
+from app.utils.notifications import notify_authorized_requests
+from app.utils.occupancy import BUCKETS, bucket_start, branch_occupancy
+from app.utils.overlaps import find_guest_conflicts
 from app.utils.pagination import PaginatedResponse, paginate
 from app.scripts.create_format import export_entrance_requests_to_excel
+from app.utils.profiling import ProfiledRoute
+from app.utils.request_cache import get_or_load, invalidate_requests
+
+router = APIRouter(route_class=ProfiledRoute)
+
+TEMPLATE_PATH = "format_templates/PERMISO MOVISTAR.xlsx"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 
-router = APIRouter()
+def detail_options() -> tuple:
+    """Opciones de carga de todas las relaciones que serializa ``EntranceRequestSchema``."""
+    guest = selectinload(EntranceRequest.guests).selectinload(EntranceRequestGuest.guest)
+    return (
+        selectinload(EntranceRequest.branch),
+        guest.selectinload(Guest.eps),
+        guest.selectinload(Guest.arl),
+        guest.selectinload(Guest.company),
+        guest.selectinload(Guest.city),
+        *(
+            selectinload(relation).selectinload(nested)
+            for relation in (
+                EntranceRequest.creator, EntranceRequest.authorizer, EntranceRequest.security
+            )
+            for nested in (User.unit, User.position)
+        ),
+        selectinload(EntranceRequest.materials),
+    )
+
+
+# Estado pendiente y columna del usuario responsable de cada bandeja
+INBOXES = {role: (status, column) for status, (role, column) in PENDING_ROLES.items()}
+
+# Campos que invalidan los pases ya emitidos de una solicitud autorizada
+PASS_FIELDS = {"branch_id", "entry_date", "departure_date", "guests_ids"}
+
+
+def precondition_failed(version: int | None) -> HTTPException:
+    """Error 412 con el ETag de la versión vigente de la solicitud."""
+    return HTTPException(
+        status_code=412,
+        detail="La solicitud fue modificada por otro usuario; vuelva a consultarla",
+        headers={"ETag": entity_tag(version)} if version is not None else None,
+    )
+
+
+def check_guest_conflicts(
+    db: Session,
+    guest_ids: list[int],
+    windows: list[tuple[datetime, datetime]],
+    branch_id: int,
+    exclude_ids: tuple = (),
+) -> list[dict]:
+    """Busca traslapes de los invitados y los rechaza si ``GUEST_OVERLAP_POLICY`` es ``reject``."""
+    conflicts = [
+        conflict._asdict()
+        for conflict in find_guest_conflicts(db, guest_ids, windows, branch_id, exclude_ids)
+    ]
+    if conflicts and settings.GUEST_OVERLAP_POLICY == "reject":
+        raise HTTPException(status_code=409, detail={
+            "message": "Los invitados tienen solicitudes que se cruzan con la ventana de ingreso",
+            "conflicts": jsonable_encoder(conflicts),
+        })
+    return conflicts
 
 
 @router.post("/requests", response_model=EntranceRequestSchema, status_code=201)
 def create_entrance_request(
     data: EntranceRequestCreateSchema,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    user: dict = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Crea una solicitud de entrada."""
+    """Crea una solicitud de entrada.
+
+    Con ``Idempotency-Key`` un reintento con la misma llave repite la primera respuesta en
+    lugar de crear otra solicitud.
+    """
+    scope = None
+    if idempotency_key:
+        # Sin un usuario identificado la llave podría repetir la respuesta de otro
+        scope = idempotency_scope("entrance_requests", get_current_user_id(user))
+        replay = begin_idempotent(db, scope, idempotency_key, data)
+        if replay is not None:
+            return replay
     # Valida que la sede exista
     branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
     if not branch:
         raise HTTPException(status_code=404, detail="Sede no encontrada")
+    conflicts = []
+    if data.status != RequestStatus.refused:
+        conflicts = check_guest_conflicts(
+            db, data.guests_ids, [(data.entry_date, data.departure_date)], data.branch_id
+        )
     # Crea la solicitud de ingreso
     entrance_data = data.model_dump(exclude={"guests_ids", "materials"})
     entrance_request = EntranceRequest(**entrance_data)
@@ -54,8 +186,9 @@ def create_entrance_request(
             **material_data.model_dump()
         )
         db.add(material)
-    db.commit()
+    db.flush()
 
+    # La respuesta se arma antes del commit para guardarla junto con la llave de idempotencia
     entrance_request = (
         db.query(EntranceRequest)
         .options(
@@ -67,9 +200,10 @@ def create_entrance_request(
             selectinload(EntranceRequest.materials),
         )
         .filter(EntranceRequest.id == entrance_request.id)
+        .populate_existing()
         .first()
     )
-    return EntranceRequestSchema(
+    result = EntranceRequestSchema(
         id=entrance_request.id,
         branch=entrance_request.branch,
         guests=[guest.guest for guest in entrance_request.guests],
@@ -79,19 +213,451 @@ def create_entrance_request(
         status=entrance_request.status,
         is_installation=entrance_request.is_installation,
         is_uninstallation=entrance_request.is_uninstallation,
+        version=entrance_request.version,
         creator=entrance_request.creator,
         authorizer=entrance_request.authorizer,
         security=entrance_request.security,
-        materials=[material for material in entrance_request.materials]
+        materials=[material for material in entrance_request.materials],
+        conflicts=conflicts,
+    )
+    response.headers["ETag"] = entity_tag(result.version)
+    if idempotency_key:
+        store_response(db, scope, idempotency_key, 201, result, {"ETag": response.headers["ETag"]})
+    db.commit()
+    checkin_index.refresh_request(db, result.id)
+    invalidate_requests([result.id])
+    publish_request_event("created", entrance_request)
+    return result
+
+
+def expand_occurrences(
+    entry_date: datetime, departure_date: datetime, weekdays: list[int], until: date
+) -> list[tuple[datetime, datetime]]:
+    """Calcula el ingreso y la salida de cada ocurrencia, hasta una más del máximo permitido."""
+    duration = departure_date - entry_date
+    occurrences = []
+    day = entry_date.date()
+    while day <= until and len(occurrences) <= settings.RECURRENCE_MAX_OCCURRENCES:
+        if day.weekday() in weekdays:
+            entry = datetime.combine(day, entry_date.time())
+            occurrences.append((entry, entry + duration))
+        day += timedelta(days=1)
+    return occurrences
+
+
+@router.post(
+    "/requests/recurring", response_model=RecurringEntranceRequestResultSchema, status_code=201
+)
+def create_recurring_entrance_requests(
+    data: RecurringEntranceRequestSchema,
+    db: Session = Depends(get_db),
+):
+    """Crea en una sola transacción las solicitudes de una regla de repetición."""
+    base = data.request
+    occurrences = expand_occurrences(
+        base.entry_date, base.departure_date, data.rule.weekdays, data.rule.until
+    )
+    if not occurrences:
+        raise HTTPException(status_code=422, detail="La regla no genera ninguna solicitud")
+    if len(occurrences) > settings.RECURRENCE_MAX_OCCURRENCES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"La regla genera más de {settings.RECURRENCE_MAX_OCCURRENCES} solicitudes"
+        )
+    # Valida la sede y los invitados una sola vez para todas las ocurrencias
+    if not db.query(Branch.id).filter(Branch.id == base.branch_id).first():
+        raise HTTPException(status_code=404, detail="Sede no encontrada")
+    guest_ids = list(dict.fromkeys(base.guests_ids))
+    found = {guest_id for (guest_id,) in db.query(Guest.id).filter(Guest.id.in_(guest_ids))}
+    missing = [guest_id for guest_id in guest_ids if guest_id not in found]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Invitados con ID {', '.join(map(str, missing))} no encontrados"
+        )
+    conflicts = []
+    if base.status != RequestStatus.refused:
+        conflicts = check_guest_conflicts(db, guest_ids, occurrences, base.branch_id)
+
+    request_data = base.model_dump(
+        exclude={"guests_ids", "materials", "entry_date", "departure_date"}
+    )
+    ids = list(db.scalars(
+        insert(EntranceRequest).returning(EntranceRequest.id, sort_by_parameter_order=True),
+        [
+            {**request_data, "entry_date": entry, "departure_date": departure}
+            for entry, departure in occurrences
+        ],
+    ))
+    if guest_ids:
+        db.execute(insert(EntranceRequestGuest), [
+            {
+                "entrance_request_id": request_id,
+                "guest_id": guest_id,
+                "entry_date": entry,
+                "departure_date": departure,
+            }
+            for request_id, (entry, departure) in zip(ids, occurrences)
+            for guest_id in guest_ids
+        ])
+    if base.materials:
+        db.execute(insert(Material), [
+            {"entrance_request_id": request_id, **material.model_dump()}
+            for request_id in ids
+            for material in base.materials
+        ])
+    # La inserción masiva no pasa por los hooks de la sesión que mantienen los contadores
+    key = pending_key(request_data)
+    if key is not None:
+        increment_pending_counter(db.connection(), *key, len(ids))
+    for day, count in Counter(entry.date() for entry, _ in occurrences).items():
+        increment_request_summary(db.connection(), base.branch_id, base.status, day, count)
+    db.commit()
+
+    checkin_index.refresh_requests(db, ids)
+    invalidate_requests(ids)
+    for entrance_request in db.query(EntranceRequest).filter(EntranceRequest.id.in_(ids)):
+        publish_request_event("created", entrance_request)
+    return RecurringEntranceRequestResultSchema(ids=ids, conflicts=conflicts)
+
+
+@router.post("/requests/transitions", response_model=StatusTransitionBatchResultSchema)
+def transition_entrance_requests(
+    data: StatusTransitionBatchSchema,
+    db: Session = Depends(get_db),
+):
+    """Cambia el estado de varias solicitudes en una sola transacción.
+
+    Cada cambio se aplica solo si la solicitud sigue en el estado esperado (``expected_status``
+    o el leído al validar); si no, se reporta ``conflict``. Las solicitudes autorizadas se
+    notifican con un solo correo por destinatario.
+    """
+    entrance_requests = {
+        entrance_request.id: entrance_request
+        for entrance_request in db.query(EntranceRequest).filter(
+            EntranceRequest.id.in_({item.id for item in data.transitions})
+        )
+    }
+    results, applied, processed = [], [], set()
+    now = datetime.now()
+    for item in data.transitions:
+        if item.id in processed:
+            results.append(StatusTransitionResultSchema(id=item.id, result="duplicated"))
+            continue
+        processed.add(item.id)
+        entrance_request = entrance_requests.get(item.id)
+        if entrance_request is None:
+            results.append(StatusTransitionResultSchema(id=item.id, result="not_found"))
+            continue
+        previous_status = entrance_request.status
+        if item.expected_status not in (None, previous_status):
+            results.append(StatusTransitionResultSchema(
+                id=item.id, result="conflict", status=previous_status
+            ))
+            continue
+        if item.status == previous_status:
+            results.append(StatusTransitionResultSchema(
+                id=item.id, result="unchanged", status=previous_status
+            ))
+            continue
+        # Actualización condicionada al estado leído (concurrencia optimista)
+        updated = db.execute(
+            update(EntranceRequest)
+            .where(EntranceRequest.id == item.id, EntranceRequest.status == previous_status)
+            .values(status=item.status, updated_at=now, version=EntranceRequest.version + 1)
+        ).rowcount
+        if not updated:
+            results.append(StatusTransitionResultSchema(id=item.id, result="conflict"))
+            continue
+        # La actualización masiva no pasa por los hooks de la sesión que mantienen los contadores
+        for status, delta in ((previous_status, -1), (item.status, 1)):
+            if status is not None:
+                increment_request_summary(
+                    db.connection(), entrance_request.branch_id, status,
+                    entrance_request.entry_date.date(), delta
+                )
+        values = {
+            "authorizer_id": entrance_request.authorizer_id,
+            "security_id": entrance_request.security_id,
+        }
+        for key, delta in (
+            (pending_key({**values, "status": previous_status}), -1),
+            (pending_key({**values, "status": item.status}), 1),
+        ):
+            if key is not None:
+                increment_pending_counter(db.connection(), *key, delta)
+        if previous_status == RequestStatus.authorized and item.status != RequestStatus.authorized:
+            record_pass_revocation(
+                db.connection(), item.id, now, entrance_request.departure_date
+            )
+        applied.append((entrance_request, previous_status))
+        results.append(StatusTransitionResultSchema(
+            id=item.id, result="applied", status=item.status
+        ))
+    db.commit()
+
+    applied_ids = [entrance_request.id for entrance_request, _ in applied]
+    # Recarga en una consulta las solicitudes que expiraron con el commit
+    db.query(EntranceRequest).filter(EntranceRequest.id.in_(applied_ids)).all()
+    checkin_index.refresh_requests(db, applied_ids)
+    invalidate_requests(applied_ids)
+    for entrance_request, previous_status in applied:
+        if (
+            previous_status == RequestStatus.authorized
+            and entrance_request.status != RequestStatus.authorized
+        ):
+            pass_revocations.revoke(entrance_request.id, entrance_request.departure_date)
+        publish_request_event("status_changed", entrance_request, previous_status)
+    emails_sent, errors = notify_authorized_requests(db, [
+        entrance_request.id
+        for entrance_request, _ in applied
+        if entrance_request.status == RequestStatus.authorized
+    ])
+    for result in results:
+        if result.result == "applied" and result.id in errors:
+            result.error = errors[result.id]
+    return StatusTransitionBatchResultSchema(results=results, emails_sent=emails_sent)
+
+
+@router.get("/checkin", response_model=CheckInSchema)
+def check_in(
+    branch_id: int = Query(..., description="ID de la sede"),
+    document_id: str = Query(..., description="Documento del invitado"),
+    db: Session = Depends(get_db),
+):
+    """Valida si un documento tiene un ingreso autorizado vigente en la sede."""
+    entry, source = checkin_index.lookup(db, branch_id, document_id, datetime.now())
+    if entry is None:
+        return CheckInSchema(
+            authorized=False, branch_id=branch_id, document_id=document_id, source=source
+        )
+    return CheckInSchema(
+        authorized=True,
+        branch_id=branch_id,
+        document_id=document_id,
+        entrance_request_id=entry.entrance_request_id,
+        guest_id=entry.guest_id,
+        entry_date=entry.entry_date,
+        departure_date=entry.departure_date,
+        source=source,
+    )
+
+
+@router.get("/conflicts", response_model=list[GuestConflictSchema])
+def get_guest_conflicts(
+    guest_ids: list[int] = Query(..., description="IDs de los invitados"),
+    entry_date: datetime = Query(..., description="Fecha de ingreso"),
+    departure_date: datetime = Query(..., description="Fecha de salida"),
+    branch_id: int = Query(..., description="ID de la sede"),
+    exclude_id: Optional[int] = Query(None, description="ID de la solicitud a ignorar"),
+    db: Session = Depends(get_db),
+):
+    """Consulta las solicitudes de los invitados que se cruzan con una ventana de ingreso."""
+    conflicts = find_guest_conflicts(
+        db, guest_ids, [(entry_date, departure_date)], branch_id,
+        () if exclude_id is None else (exclude_id,)
+    )
+    return [conflict._asdict() for conflict in conflicts]
+
+
+@router.get("/occupancy", response_model=OccupancySchema)
+def get_occupancy(
+    branch_ids: Optional[list[int]] = Query(None, description="IDs de las sedes"),
+    start: Optional[datetime] = Query(None, description="Inicio del rango; por defecto ahora"),
+    days: int = Query(7, ge=1, le=settings.OCCUPANCY_MAX_DAYS, description="Días del rango"),
+    bucket: Literal["hour", "day"] = Query("hour", description="Tamaño del intervalo"),
+    db: Session = Depends(get_db),
+):
+    """Calcula la ocupación esperada de las sedes según las solicitudes autorizadas.
+
+    Sin ``branch_ids`` se incluyen todas las sedes con solicitudes en el rango.
+    """
+    start = to_local_naive(start) if start else datetime.now()
+    start = bucket_start(start, bucket)
+    size = days * (24 if bucket == "hour" else 1)
+    occupancy = branch_occupancy(db, start, size, bucket, branch_ids)
+    return OccupancySchema(
+        start=start,
+        end=start + BUCKETS[bucket] * size,
+        bucket=bucket,
+        branches=[
+            {
+                "branch_id": branch_id,
+                "peak": max((item.peak for item in buckets), default=0),
+                "buckets": [item._asdict() for item in buckets],
+            }
+            for branch_id, buckets in occupancy.items()
+        ],
+    )
+
+
+@router.post("/passes/verify", response_model=EntryPassVerificationSchema)
+def verify_entry_pass(
+    data: EntryPassVerifySchema,
+    db: Session = Depends(get_db),
+):
+    """Valida un pase de ingreso sin consultar la solicitud."""
+    pass_revocations.refresh(db)
+    entry_pass, reason = verify_pass(data.token, data.branch_id)
+    if entry_pass is None:
+        return EntryPassVerificationSchema(valid=False, reason=reason)
+    return EntryPassVerificationSchema(
+        valid=reason == "valid",
+        reason=reason,
+        entrance_request_id=entry_pass.entrance_request_id,
+        branch_id=entry_pass.branch_id,
+        document_id=entry_pass.document_id,
+        entry_date=entry_pass.entry_date,
+        departure_date=entry_pass.departure_date,
+    )
+
+
+@router.get("/events")
+async def stream_entrance_events(
+    request: Request,
+    branch_id: Optional[int] = Query(None, description="Filtrar por ID de sede"),
+    authorizer_id: Optional[int] = Query(None, description="Filtrar por ID de autorizador"),
+    security_id: Optional[int] = Query(None, description="Filtrar por ID de seguridad"),
+):
+    """Transmite por Server-Sent Events la creación y los cambios de estado de solicitudes."""
+    filters = {
+        key: value
+        for key, value in (
+            ("branch_id", branch_id),
+            ("authorizer_id", authorizer_id),
+            ("security_id", security_id),
+        )
+        if value is not None
+    }
+    subscription = hub.subscribe(settings.EVENT_QUEUE_SIZE)
+    return StreamingResponse(
+        event_stream(request, subscription, filters),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/sync", response_model=SyncSchema)
+def sync_branch_requests(
+    branch_id: int = Query(..., description="ID de la sede"),
+    since: Optional[datetime] = Query(None, description="Marca de agua de la sincronización"),
+    days: int = Query(1, ge=1, le=settings.SYNC_MAX_DAYS, description="Días a partir de hoy"),
+    db: Session = Depends(get_db),
+):
+    """Retorna las solicitudes autorizadas de la sede o solo los cambios desde ``since``.
+
+    Sin ``since`` se retorna la foto completa de la ventana. Con ``since`` se retornan las
+    solicitudes modificadas desde esa marca, las trasladadas a otra sede y las que entraron o
+    salieron de la ventana al cambiar el día (con el mismo ``days`` de la llamada anterior): las
+    que siguen autorizadas en ``requests`` y las demás en ``removed``. La respuesta incluye la
+    marca de agua para la siguiente llamada.
+    """
+    watermark = datetime.now()
+    window_start = datetime.combine(watermark.date(), time.min)
+    window_end = window_start + timedelta(days=days)
+    if since is None:
+        query = db.query(EntranceRequest).filter(
+            EntranceRequest.branch_id == branch_id,
+            EntranceRequest.status == RequestStatus.authorized,
+            EntranceRequest.entry_date < window_end,
+            EntranceRequest.departure_date >= window_start,
+        )
+    else:
+        since = to_local_naive(since)
+        # Se repite un margen para no perder transacciones confirmadas después de la marca
+        changed_since = since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        # Ventana que tenía la portería en la llamada anterior
+        previous_start = datetime.combine(since.date(), time.min)
+        previous_end = previous_start + timedelta(days=days)
+        moved_out = select(BranchMove.entrance_request_id).where(
+            BranchMove.branch_id == branch_id, BranchMove.moved_at >= changed_since
+        )
+        window_edges = and_(
+            EntranceRequest.branch_id == branch_id,
+            EntranceRequest.status == RequestStatus.authorized,
+            or_(
+                # Solicitudes que entraron por el final de la ventana
+                and_(
+                    EntranceRequest.entry_date >= previous_end,
+                    EntranceRequest.entry_date < window_end,
+                ),
+                # Solicitudes que salieron por el inicio de la ventana
+                and_(
+                    EntranceRequest.departure_date >= previous_start,
+                    EntranceRequest.departure_date < window_start,
+                ),
+            ),
+        )
+        query = db.query(EntranceRequest).filter(or_(
+            and_(
+                EntranceRequest.branch_id == branch_id,
+                EntranceRequest.updated_at >= changed_since,
+            ),
+            EntranceRequest.id.in_(moved_out),
+            window_edges,
+        ))
+    entrance_requests = (
+        query.options(
+            selectinload(EntranceRequest.guests).selectinload(EntranceRequestGuest.guest),
+            selectinload(EntranceRequest.materials),
+        )
+        .order_by(EntranceRequest.id)
+        .all()
+    )
+    requests, removed = [], []
+    for entrance_request in entrance_requests:
+        if (
+            entrance_request.branch_id != branch_id
+            or entrance_request.status != RequestStatus.authorized
+            or entrance_request.entry_date >= window_end
+            or entrance_request.departure_date < window_start
+        ):
+            removed.append(entrance_request.id)
+            continue
+        requests.append(SyncRequestSchema(
+            id=entrance_request.id,
+            entry_date=entrance_request.entry_date,
+            departure_date=entrance_request.departure_date,
+            is_installation=entrance_request.is_installation,
+            is_uninstallation=entrance_request.is_uninstallation,
+            guests=entrance_request.guest_list,
+            materials=entrance_request.materials,
+        ))
+    return SyncSchema(
+        branch_id=branch_id,
+        snapshot=since is None,
+        watermark=watermark,
+        requests=requests,
+        removed=removed,
     )
 
 
 @router.get("/requests/{request_id}", response_model=EntranceRequestSchema)
 def get_entrance_request(
     request_id: int,
+    request: Request,
     db: Session = Depends(get_db),
 ):
-    """Obtiene una solicitud de ingreso por ID."""
+    """Obtiene una solicitud de ingreso por ID.
+
+    Se consulta solo la versión: si coincide con ``If-None-Match`` se responde 304 y si no,
+    el JSON sale de la caché de solicitudes o se carga con sus relaciones.
+    """
+    version = db.query(EntranceRequest.version).filter(EntranceRequest.id == request_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Solicitud de ingreso no encontrada")
+    if etag_matches(request.headers.get("If-None-Match"), version, weak=True):
+        return Response(status_code=304, headers={"ETag": entity_tag(version)})
+
+    entry = get_or_load(request_id, version, lambda: load_entrance_request_json(db, request_id))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Solicitud de ingreso no encontrada")
+    version, payload = entry
+    return Response(payload, media_type="application/json", headers={"ETag": entity_tag(version)})
+
+
+def load_entrance_request_json(db: Session, request_id: int) -> tuple[int, bytes] | None:
+    """Carga la solicitud con sus relaciones y retorna su versión y su JSON."""
     entrance_request = (
         db.query(EntranceRequest)
         .options(
@@ -100,14 +666,15 @@ def get_entrance_request(
             selectinload(EntranceRequest.creator),
             selectinload(EntranceRequest.authorizer),
             selectinload(EntranceRequest.security),
+            selectinload(EntranceRequest.materials),
         )
         .filter(EntranceRequest.id == request_id)
         .first()
     )
     if not entrance_request:
-        raise HTTPException(status_code=404, detail="Solicitud de ingreso no encontrada")
+        return None
 
-    return EntranceRequestSchema(
+    schema = EntranceRequestSchema(
         id=entrance_request.id,
         branch=entrance_request.branch,
         guests=[guest.guest for guest in entrance_request.guests],
@@ -117,11 +684,111 @@ def get_entrance_request(
         status=entrance_request.status,
         is_installation=entrance_request.is_installation,
         is_uninstallation=entrance_request.is_uninstallation,
+        version=entrance_request.version,
         creator=entrance_request.creator,
         authorizer=entrance_request.authorizer,
         security=entrance_request.security,
         materials=[material for material in entrance_request.materials]
     )
+    return entrance_request.version, schema.model_dump_json(by_alias=True).encode("utf-8")
+
+
+@router.get("/requests/{request_id}/passes", response_model=list[EntryPassSchema])
+def get_entry_passes(
+    request_id: int,
+    db: Session = Depends(get_db),
+):
+    """Emite los pases de ingreso de los invitados de una solicitud autorizada."""
+    entrance_request = (
+        db.query(EntranceRequest)
+        .options(selectinload(EntranceRequest.guests).selectinload(EntranceRequestGuest.guest))
+        .filter(EntranceRequest.id == request_id)
+        .first()
+    )
+    if not entrance_request:
+        raise HTTPException(status_code=404, detail="Solicitud de ingreso no encontrada")
+    if entrance_request.status != RequestStatus.authorized:
+        raise HTTPException(status_code=409, detail="La solicitud no está autorizada")
+    passes = issue_passes(entrance_request)
+    return [
+        EntryPassSchema(
+            guest_id=guest.id, document_id=guest.document_id, name=guest.name,
+            token=passes[guest.id]
+        )
+        for guest in entrance_request.guest_list
+    ]
+
+
+@router.get("/requests/{request_id}/format")
+def download_entrance_request_format(request_id: int, db: Session = Depends(get_db)):
+    """Descarga el formato Excel de la solicitud; las descargas repetidas salen de la caché.
+
+    Las solicitudes autorizadas incluyen los pases, los mismos del formato enviado por correo.
+    """
+    entrance_request = (
+        db.query(EntranceRequest)
+        .options(selectinload(EntranceRequest.guests).selectinload(EntranceRequestGuest.guest))
+        .filter(EntranceRequest.id == request_id)
+        .first()
+    )
+    if not entrance_request:
+        raise HTTPException(status_code=404, detail="Solicitud de ingreso no encontrada")
+    passes = None
+    if entrance_request.status == RequestStatus.authorized:
+        passes = passes_for_format(entrance_request)
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        export_entrance_requests_to_excel(db, request_id, TEMPLATE_PATH, path, passes=passes)
+        with open(path, "rb") as file:
+            content = file.read()
+    finally:
+        os.remove(path)
+    return Response(content, media_type=XLSX_MEDIA_TYPE, headers={
+        "Content-Disposition": f'attachment; filename="solicitud_{request_id}.xlsx"'
+    })
+
+
+@router.get("/inbox/counts", response_model=InboxCountsSchema)
+def get_inbox_counts(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Obtiene la cantidad de solicitudes pendientes del usuario autenticado."""
+    counts = dict(
+        db.query(PendingCounter.role, PendingCounter.count)
+        .filter(PendingCounter.user_id == user_id)
+        .all()
+    )
+    return InboxCountsSchema(
+        authorizer=counts.get("authorizer", 0), security=counts.get("security", 0)
+    )
+
+
+@router.get("/inbox/{role}", response_model=PaginatedResponse[EntranceRequestSchema])
+def get_inbox(
+    role: Literal["authorizer", "security"],
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Obtiene las solicitudes pendientes del usuario autenticado, las más próximas primero."""
+    status, column = INBOXES[role]
+    counter = db.get(PendingCounter, (user_id, role))
+    items = (
+        db.query(EntranceRequest)
+        .filter(EntranceRequest.status == status, getattr(EntranceRequest, column) == user_id)
+        .options(*detail_options())
+        .order_by(EntranceRequest.entry_date)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    # El total sale del contador en lugar de un COUNT sobre las solicitudes
+    return PaginatedResponse[EntranceRequestSchema](
+        total=counter.count if counter else 0, items=items, offset=offset, limit=limit
+    )
 
 
 @router.get("/requests", response_model=PaginatedResponse[EntranceRequestSchema])
@@ -135,15 +802,9 @@ def get_entrance_requests(
     db: Session = Depends(get_db),
 ):
     """Obtiene una lista de solicitudes, opcionalmente filtradas por estado."""
-    query = db.query(EntranceRequest)
-    if status:
-        query = query.filter(EntranceRequest.status == status)
-    if security_id:
-        query = query.filter(EntranceRequest.security_id == security_id)
-    if creator_id:
-        query = query.filter(EntranceRequest.creator_id == creator_id)
-    if authorizer_id:
-        query = query.filter(EntranceRequest.authorizer_id == authorizer_id)
+    query = db.query(EntranceRequest).filter(
+        *request_filters(status, security_id, creator_id, authorizer_id)
+    )
     query = (
         query.options(
             selectinload(EntranceRequest.branch),
@@ -160,17 +821,31 @@ def get_entrance_requests(
 @router.put("/requests/{request_id}", response_model=EntranceRequestSchema)
 def update_entrance_request(
     request_id: int,
+    request: Request,
+    response: Response,
     data: EntranceRequestUpdateSchema = Body(...),
     db: Session = Depends(get_db),
 ):
-    """Actualiza una solicitud de ingreso."""
+    """Actualiza una solicitud de ingreso.
+
+    Requiere ``If-Match`` con el ETag leído; el UPDATE se condiciona a esa versión, así que
+    una escritura concurrente hace fallar la otra con 412 en lugar de sobrescribirla.
+    """
+    if_match = request.headers.get("If-Match")
+    if not if_match:
+        raise HTTPException(status_code=428, detail="Se requiere el encabezado If-Match")
     # Buscar la solicitud existente
     entrance_request = db.query(EntranceRequest).filter(EntranceRequest.id == request_id).first()
     if not entrance_request:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    if not etag_matches(if_match, entrance_request.version):
+        raise precondition_failed(entrance_request.version)
 
     # Actualizar campos si vienen en el body
     update_data = data.model_dump(exclude_unset=True)
+    previous_status = entrance_request.status
+    was_authorized = previous_status == RequestStatus.authorized
+    previous_departure = entrance_request.departure_date
 
     # Validar branch si se actualiza
     if "branch_id" in update_data:
@@ -190,6 +865,26 @@ def update_entrance_request(
         if not sec:
             raise HTTPException(status_code=404, detail="Personal de seguridad no encontrado")
 
+    # Validar traslapes si cambia la ventana, la sede o los invitados, o si deja de estar rechazada
+    conflicts = []
+    status = update_data.get("status") or previous_status
+    if status != RequestStatus.refused and (
+        PASS_FIELDS & update_data.keys() or previous_status == RequestStatus.refused
+    ):
+        guest_ids = update_data.get("guests_ids")
+        if guest_ids is None:
+            guest_ids = [link.guest_id for link in entrance_request.guests]
+        conflicts = check_guest_conflicts(
+            db,
+            guest_ids,
+            [(
+                update_data.get("entry_date") or entrance_request.entry_date,
+                update_data.get("departure_date") or entrance_request.departure_date,
+            )],
+            update_data.get("branch_id") or entrance_request.branch_id,
+            (request_id,),
+        )
+
     # Actualizar campos en el modelo
     for field, value in update_data.items():
         if field != "guests_ids":
@@ -200,6 +895,8 @@ def update_entrance_request(
         db.query(EntranceRequestGuest).filter(
             EntranceRequestGuest.entrance_request_id == request_id
         ).delete()
+        # El borrado masivo no pasa por la sesión; se marca el cambio para la sincronización
+        entrance_request.updated_at = datetime.now()
         for guest_id in update_data["guests_ids"]:
             guest = db.query(Guest).filter(Guest.id == guest_id).first()
             if not guest:
@@ -209,15 +906,41 @@ def update_entrance_request(
                 )
             db.add(EntranceRequestGuest(entrance_request_id=request_id, guest_id=guest_id))
 
-    db.commit()
+    revoke_passes = was_authorized and (
+        status != RequestStatus.authorized or bool(PASS_FIELDS & update_data.keys())
+    )
+    revoked_until = max(previous_departure, entrance_request.departure_date)
+    if revoke_passes:
+        record_pass_revocation(db.connection(), request_id, datetime.now(), revoked_until)
+
+    try:
+        db.commit()
+    except StaleDataError:
+        # Otra escritura cambió la versión entre la lectura y el UPDATE
+        db.rollback()
+        raise precondition_failed(
+            db.query(EntranceRequest.version).filter(EntranceRequest.id == request_id).scalar()
+        )
+    checkin_index.refresh_request(db, request_id)
+    invalidate_requests([request_id])
+    if revoke_passes:
+        pass_revocations.revoke(request_id, revoked_until)
+    if entrance_request.status != previous_status:
+        publish_request_event("status_changed", entrance_request, previous_status)
 
     if update_data.get('status') == RequestStatus.authorized:
+        passes = passes_for_format(entrance_request)
         export_entrance_requests_to_excel(
-            db, request_id, "format_templates/PERMISO MOVISTAR.xlsx", f"output_{request_id}.xlsx"
+            db, request_id, TEMPLATE_PATH, f"output_{request_id}.xlsx",
+            passes=passes,
         )
         send_email_with_attachments(
             file_name=f"output_{request_id}.xlsx",
-            recipients=[entrance_request.creator.email, entrance_request.authorizer.email]
+            recipients=[entrance_request.creator.email, entrance_request.authorizer.email],
+            body=build_approval_body([
+                (guest.name, guest.document_id, passes[guest.id])
+                for guest in entrance_request.guest_list
+            ]),
         )
 
     entrance_request = (
@@ -234,6 +957,7 @@ def update_entrance_request(
         .first()
     )
 
+    response.headers["ETag"] = entity_tag(entrance_request.version)
     return EntranceRequestSchema(
         id=entrance_request.id,
         branch=entrance_request.branch,
@@ -245,7 +969,9 @@ def update_entrance_request(
         status=entrance_request.status,
         is_installation=entrance_request.is_installation,
         is_uninstallation=entrance_request.is_uninstallation,
+        version=entrance_request.version,
         authorizer=entrance_request.authorizer,
         security=entrance_request.security,
-        materials=[material for material in entrance_request.materials]
+        materials=[material for material in entrance_request.materials],
+        conflicts=conflicts,
     )
@@ -7,8 +7,9 @@ from app.db.database import get_db
 from app.models.places import Department, Municipality, City
 from app.schemas.places import DepartmentSchema, MunicipalitySchema, CitySchema
 from app.utils.pagination import paginate, PaginatedResponse
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.get("/departments", response_model=PaginatedResponse[DepartmentSchema])
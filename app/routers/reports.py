@@ -0,0 +1,166 @@
+"""Rutas de reportes de solicitudes de ingreso.
+
+Los reportes se responden desde los resúmenes que mantienen los handlers, sin agrupar
+sobre las solicitudes: el diario por sede, estado y día, y el mensual por departamento y
+estado para las comparaciones entre meses.
+"""
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.database import get_db
+from app.models.entrances import MonthlySummary, RequestStatus, RequestSummary
+from app.models.places import Department
+from app.schemas.reports import (
+    DepartmentComparisonSchema,
+    DepartmentMonthlySchema,
+    RequestSummaryRowSchema
+)
+from app.utils.exports import iter_export_rows, request_filters, stream_csv, stream_xlsx
+from app.utils.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+# Columna de cada agrupación del reporte
+GROUP_COLUMNS = {
+    "branch": RequestSummary.branch_id.label("branch_id"),
+    "department": RequestSummary.department_id.label("department_id"),
+    "status": RequestSummary.status.label("status"),
+    "day": RequestSummary.day.label("day"),
+}
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+@router.get(
+    "/requests",
+    response_model=list[RequestSummaryRowSchema],
+    response_model_exclude_none=True,
+)
+def get_requests_report(
+    start: date = Query(..., description="Primer día de ingreso"),
+    end: date = Query(..., description="Último día de ingreso"),
+    group_by: list[Literal["branch", "department", "status", "day"]] = Query(
+        ["branch", "status"], description="Columnas de agrupación"
+    ),
+    branch_id: Optional[int] = Query(None, description="Filtrar por ID de sede"),
+    department_id: Optional[int] = Query(None, description="Filtrar por ID de departamento"),
+    status: Optional[RequestStatus] = Query(None, description="Filtrar por estado"),
+    db: Session = Depends(get_db),
+):
+    """Cuenta las solicitudes por sede, departamento, estado o día de ingreso."""
+    if end < start:
+        raise HTTPException(status_code=422, detail="La fecha final es anterior a la inicial")
+    group_by = list(dict.fromkeys(group_by))
+    columns = [GROUP_COLUMNS[name] for name in group_by]
+    query = (
+        select(*columns, func.sum(RequestSummary.count).label("count"))
+        .where(RequestSummary.day >= start, RequestSummary.day <= end)
+        .group_by(*columns)
+        .having(func.sum(RequestSummary.count) > 0)
+        .order_by(*columns)
+    )
+    if branch_id is not None:
+        query = query.where(RequestSummary.branch_id == branch_id)
+    if department_id is not None:
+        query = query.where(RequestSummary.department_id == department_id)
+    if status is not None:
+        query = query.where(RequestSummary.status == status)
+    return [row._asdict() for row in db.execute(query)]
+
+
+@router.get("/requests/export")
+def export_requests(
+    file_format: Literal["csv", "xlsx"] = Query(
+        "csv", alias="format", description="Formato del archivo"
+    ),
+    start: Optional[date] = Query(None, description="Primer día de ingreso"),
+    end: Optional[date] = Query(None, description="Último día de ingreso"),
+    branch_ids: Optional[list[int]] = Query(None, description="IDs de las sedes"),
+    status: Optional[RequestStatus] = Query(None, description="Filtrar por estado de solicitud"),
+    security_id: Optional[int] = Query(None, description="Filtrar por ID de seguridad"),
+    creator_id: Optional[int] = Query(None, description="Filtrar por ID de creador"),
+    authorizer_id: Optional[int] = Query(None, description="Filtrar por ID de autorizador"),
+    db: Session = Depends(get_db),
+):
+    """Exporta las solicitudes con sus invitados y materiales, una fila por invitado."""
+    if start and end and end < start:
+        raise HTTPException(status_code=422, detail="La fecha final es anterior a la inicial")
+    conditions = request_filters(
+        status, security_id, creator_id, authorizer_id, branch_ids, start, end
+    )
+    # La respuesta se genera después de cerrar la sesión de la petición; usa una propia
+    make_session = sessionmaker(bind=db.get_bind())
+
+    def rows():
+        session = make_session()
+        try:
+            yield from iter_export_rows(session, conditions)
+        finally:
+            session.close()
+
+    if file_format == "xlsx":
+        content = stream_xlsx(rows())
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        content = stream_csv(rows())
+        media_type = "text/csv; charset=utf-8"
+    return StreamingResponse(content, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="solicitudes.{file_format}"'
+    })
+
+
+@router.get("/departments/monthly", response_model=DepartmentComparisonSchema)
+def get_department_comparison(
+    month: Optional[str] = Query(
+        None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Mes (AAAA-MM); por defecto el actual"
+    ),
+    status: Optional[RequestStatus] = Query(None, description="Filtrar por estado"),
+    db: Session = Depends(get_db),
+):
+    """Compara las solicitudes de cada departamento en el mes con las del mes anterior."""
+    current_start = (
+        date.fromisoformat(f"{month}-01") if month else date.today().replace(day=1)
+    )
+    previous_start = _add_months(current_start, -1)
+    is_current = MonthlySummary.month == current_start
+    query = (
+        select(
+            MonthlySummary.department_id,
+            func.sum(case((is_current, MonthlySummary.count), else_=0)),
+            func.sum(case((is_current, 0), else_=MonthlySummary.count)),
+        )
+        .where(MonthlySummary.month.in_([previous_start, current_start]))
+        .group_by(MonthlySummary.department_id)
+    )
+    if status is not None:
+        query = query.where(MonthlySummary.status == status)
+    rows = db.execute(query).all()
+    names = dict(
+        db.query(Department.id, Department.name)
+        .filter(Department.id.in_([row[0] for row in rows]))
+    )
+    departments = []
+    for department_id, current, previous in sorted(rows, key=lambda row: names[row[0]]):
+        if not (current or previous):
+            continue
+        departments.append(DepartmentMonthlySchema(
+            department_id=department_id,
+            department=names[department_id],
+            current=current,
+            previous=previous,
+            change=current - previous,
+            change_pct=round((current - previous) * 100 / previous, 2) if previous else None,
+        ))
+    return DepartmentComparisonSchema(
+        month=f"{current_start:%Y-%m}",
+        previous_month=f"{previous_start:%Y-%m}",
+        departments=departments,
+    )
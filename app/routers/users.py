@@ -1,9 +1,19 @@
 """Rutas para manejar los usuarios de la aplicación."""
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import tempfile
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import ClientDisconnect
 from typing import Optional
 
+from app.auth.dependencies import get_current_user, get_current_user_id
+from app.config.settings import settings
+
 from app.db.database import get_db
+from app.models.entrances import touch_guest_requests
 from app.models.users import Company, Guest, User
 from app.schemas.users import (
     BulkGuestSchema,
@@ -12,11 +22,24 @@ from app.schemas.users import (
     GuestIdSchema,
     GuestSchema,
     GuestUpdateSchema,
+    RosterImportSchema,
     UserSchema
 )
+from app.utils.checkin import checkin_index
+from app.utils.idempotency import (
+    IDEMPOTENCY_HEADER,
+    begin_idempotent,
+    idempotency_scope,
+    store_response
+)
 from app.utils.pagination import paginate, PaginatedResponse
+from app.utils.profiling import ProfiledRoute
+from app.utils.request_cache import invalidate_guest_requests
+from app.utils.rosters import import_roster, ingest_ndjson, progress_line
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
 
 
 @router.get("/companies", response_model=PaginatedResponse[CompanySchema])
@@ -96,8 +119,21 @@ def get_guests(
 
 
 @router.post("/guests", response_model=GuestIdSchema)
-def create_guests(payload: BulkGuestSchema, db: Session = Depends(get_db)):
-    """Crea varios invitados al tiempo."""
+def create_guests(
+    payload: BulkGuestSchema,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Crea varios invitados al tiempo; con ``Idempotency-Key`` un reintento repite la
+    primera respuesta sin volver a procesar los invitados."""
+    scope = None
+    if idempotency_key:
+        # Sin un usuario identificado la llave podría repetir la respuesta de otro
+        scope = idempotency_scope("guests", get_current_user_id(user))
+        replay = begin_idempotent(db, scope, idempotency_key, payload)
+        if replay is not None:
+            return replay
     incoming_document_ids = [guest.document_id for guest in payload.guests]
 
     # Buscar los que ya existen en la DB
@@ -137,12 +173,113 @@ def create_guests(payload: BulkGuestSchema, db: Session = Depends(get_db)):
             db.add(new_guest)
             db.flush()
             inserted_ids.append(new_guest.id)
+    result = GuestIdSchema(
+        inserted_ids=inserted_ids,
+        updated_ids=updated_ids,
+        guests_ids=inserted_ids + updated_ids,
+    )
+    touch_guest_requests(db.connection(), updated_ids)
+    if idempotency_key:
+        store_response(db, scope, idempotency_key, 200, result)
     db.commit()
-    return {
-        "inserted_ids": inserted_ids,
-        "updated_ids": updated_ids,
-        "guests_ids": inserted_ids + updated_ids
-    }
+    invalidate_guest_requests(db, updated_ids)
+    return result
+
+
+@router.post("/guests/import", response_model=RosterImportSchema)
+async def import_guests(request: Request, db: Session = Depends(get_db)):
+    """
+    Importa una planilla de invitados (Excel o CSV) enviada como cuerpo de la petición.
+
+    Los invitados se crean o actualizan por documento; las filas con errores se omiten y se
+    reportan con su número de fila.
+    """
+    # El cuerpo se copia por partes a un archivo temporal que pasa a disco si es grande
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as file:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.ROSTER_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="El archivo es demasiado grande")
+            file.write(chunk)
+        file.seek(0)
+        try:
+            return await run_in_threadpool(import_roster, db, file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+class IngestResponse(StreamingResponse):
+    """Respuesta NDJSON que se envía mientras todavía se lee el cuerpo de la petición.
+
+    Con ASGI 2.3 ``StreamingResponse`` escucha la desconexión sobre el mismo canal del cuerpo y
+    se lo quitaría a la ingesta; esta respuesta no lo escucha y la ingesta detecta la desconexión.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/guests/ingest")
+async def ingest_guests(request: Request, db: Session = Depends(get_db)):
+    """
+    Crea o actualiza invitados desde un cuerpo NDJSON (un ``GuestCreateSchema`` por línea).
+
+    El cuerpo se lee y se guarda por lotes a medida que llega. La respuesta es NDJSON con el
+    avance de cada lote (insertados, actualizados y errores por línea) enviado al confirmarlo y
+    un resumen final; si la ingesta falla a mitad del cuerpo, el resumen trae ``"done": false``,
+    el error y lo confirmado hasta la última línea guardada.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_TYPES:
+        raise HTTPException(status_code=415, detail="Se espera application/x-ndjson")
+    # La respuesta sigue después de cerrar la sesión de la petición; la ingesta usa la suya
+    session = sessionmaker(bind=db.get_bind())()
+    totals: dict[str, int] = {}
+    records = ingest_ndjson(session, request.stream(), totals, request.is_disconnected)
+    # El primer lote se guarda antes de responder para que un cuerpo inválido reciba un 400
+    try:
+        first = await anext(records, None)
+    except ValueError as e:
+        await records.aclose()
+        session.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await records.aclose()
+        session.close()
+        raise
+
+    async def content():
+        committed_line = 0
+        try:
+            record = first
+            while record is not None:
+                committed_line = record["line"]
+                yield progress_line(record)
+                record = await anext(records, None)
+            if not await request.is_disconnected():
+                yield progress_line({"done": True, **totals})
+        except (ValueError, SQLAlchemyError) as e:
+            # Los lotes anteriores ya están confirmados; se reporta hasta dónde se guardó
+            await run_in_threadpool(session.rollback)
+            yield progress_line({
+                "done": False,
+                "error": str(e),
+                "line": committed_line,
+                **{key: totals[key] for key in ("inserted", "updated", "failed")},
+            })
+        except ClientDisconnect:
+            return
+        finally:
+            await records.aclose()
+            await run_in_threadpool(session.close)
+
+    return IngestResponse(content(), media_type="application/x-ndjson")
 
 
 @router.put("/guests/{guest_id}", response_model=GuestSchema)
@@ -151,9 +288,14 @@ def update_guest(guest_id: int, data: GuestUpdateSchema, db: Session = Depends(g
     if not guest:
         raise HTTPException(status_code=404, detail="Guest not found")
 
-    for field, value in data.dict(exclude_unset=True).items():
+    update_data = data.dict(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(guest, field, value)
+    touch_guest_requests(db.connection(), [guest_id])
 
     db.commit()
+    if "document_id" in update_data:
+        checkin_index.refresh_guest(db, guest_id)
+    invalidate_guest_requests(db, [guest_id])
     db.refresh(guest)
     return guest
@@ -0,0 +1,25 @@
+"""Esquemas para los endpoints de administración."""
+from pydantic import BaseModel, Field
+
+
+class ProfilingSamplingSchema(BaseModel):
+    """Esquema para activar el muestreo de perfilado de peticiones."""
+    rate: float = Field(..., ge=0, le=1)
+    duration_seconds: int = Field(300, gt=0, le=3600)
+
+
+class ProfilingStatusSchema(BaseModel):
+    """Esquema del estado del muestreo de perfilado."""
+    rate: float
+    remaining_seconds: int
+
+
+class ProfilingTokenRequestSchema(BaseModel):
+    """Esquema para solicitar un token de perfilado."""
+    expires_in: int = Field(300, gt=0, le=3600)
+
+
+class ProfilingTokenSchema(BaseModel):
+    """Esquema del token firmado para el encabezado ``X-Profile-Token``."""
+    token: str
+    expires_at: int
@@ -1,11 +1,13 @@
 """Esquemas para las solicitudes de ingreso."""
-from datetime import datetime
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from datetime import date, datetime
+from pydantic import AliasChoices, BaseModel, Field, field_validator
+from typing import Annotated, List, Optional
 
+from app.config.settings import settings
 from app.models.entrances import RequestStatus
 from app.schemas.branches import BranchSchema
 from app.schemas.users import GuestSchema, UserSchema
+from app.utils.dates import to_local_naive
 
 
 class MaterialCreateSchema(BaseModel):
@@ -43,8 +45,15 @@ class EntranceRequestCreateSchema(BaseModel):
     security_id: int | None = None
     materials: Optional[List[MaterialCreateSchema]] = []
 
+    @field_validator("entry_date", "departure_date")
+    @classmethod
+    def local_dates(cls, value):
+        """Convierte las fechas con zona horaria a la hora local con que se guardan."""
+        return to_local_naive(value)
+
     @field_validator("departure_date")
-    def max_days_validation(self, departure_date, values):
+    @classmethod
+    def max_days_validation(cls, departure_date, values):
         """Valida que la fecha de salida no sea mayor a 30 días desde la fecha de ingreso."""
         entry_date = values.data.get("entry_date")
         if entry_date and (departure_date - entry_date).days > 30:
@@ -69,12 +78,28 @@ class EntranceRequestUpdateSchema(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_validator("entry_date", "departure_date")
+    @classmethod
+    def local_dates(cls, value):
+        """Convierte las fechas con zona horaria a la hora local con que se guardan."""
+        return to_local_naive(value) if value is not None else value
+
+
+class GuestConflictSchema(BaseModel):
+    """Esquema de una solicitud existente que se cruza con la ventana de un invitado."""
+    guest_id: int
+    entrance_request_id: int
+    branch_id: int
+    entry_date: datetime
+    departure_date: datetime
+    same_branch: bool
+
 
 class EntranceRequestSchema(BaseModel):
     """Esquema para representar una solicitud de ingreso."""
     id: int
     branch: BranchSchema
-    guests: List[GuestSchema] = Field(..., alias="guests")
+    guests: List[GuestSchema] = Field(..., validation_alias=AliasChoices("guest_list", "guests"))
     materials: List[MaterialSchema] = Field(..., alias="materials")
     entry_date: datetime
     departure_date: datetime
@@ -82,9 +107,11 @@ class EntranceRequestSchema(BaseModel):
     status: RequestStatus
     is_installation: bool
     is_uninstallation: bool
+    version: int
     creator: UserSchema | None = None
     authorizer: UserSchema | None = None
     security: UserSchema | None = None
+    conflicts: List[GuestConflictSchema] = []
 
     class Config:
         from_attributes = True
@@ -92,3 +119,164 @@ class EntranceRequestSchema(BaseModel):
     @property
     def guest_list(self):
         return [g.guest for g in self.guests]
+
+
+class CheckInSchema(BaseModel):
+    """Esquema de la validación de ingreso en portería."""
+    authorized: bool
+    branch_id: int
+    document_id: str
+    entrance_request_id: int | None = None
+    guest_id: int | None = None
+    entry_date: datetime | None = None
+    departure_date: datetime | None = None
+    source: str
+
+
+class SyncGuestSchema(BaseModel):
+    """Esquema compacto de un invitado para la sincronización de portería."""
+    id: int
+    document_id: str
+    name: str
+
+    class Config:
+        from_attributes = True
+
+
+class SyncMaterialSchema(BaseModel):
+    """Esquema compacto de un material para la sincronización de portería."""
+    model: str
+    serial: str | None = None
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+
+class SyncRequestSchema(BaseModel):
+    """Esquema compacto de una solicitud autorizada para portería."""
+    id: int
+    entry_date: datetime
+    departure_date: datetime
+    is_installation: bool
+    is_uninstallation: bool
+    guests: List[SyncGuestSchema]
+    materials: List[SyncMaterialSchema]
+
+
+class SyncSchema(BaseModel):
+    """Esquema de la foto o de los cambios de solicitudes autorizadas de una sede."""
+    branch_id: int
+    snapshot: bool
+    watermark: datetime
+    requests: List[SyncRequestSchema]
+    removed: List[int]
+
+
+class EntryPassSchema(BaseModel):
+    """Esquema del pase de ingreso de un invitado."""
+    guest_id: int
+    document_id: str
+    name: str
+    token: str
+
+
+class EntryPassVerifySchema(BaseModel):
+    """Esquema para validar un pase de ingreso en portería."""
+    token: str
+    branch_id: int | None = None
+
+
+class EntryPassVerificationSchema(BaseModel):
+    """Esquema del resultado de la validación de un pase de ingreso."""
+    valid: bool
+    reason: str
+    entrance_request_id: int | None = None
+    branch_id: int | None = None
+    document_id: str | None = None
+    entry_date: datetime | None = None
+    departure_date: datetime | None = None
+
+
+class InboxCountsSchema(BaseModel):
+    """Esquema de la cantidad de solicitudes pendientes del usuario por rol."""
+    authorizer: int
+    security: int
+
+
+class StatusTransitionSchema(BaseModel):
+    """Esquema del cambio de estado de una solicitud.
+
+    Si se envía ``expected_status`` el cambio solo se aplica si la solicitud sigue en ese estado.
+    """
+    id: int
+    status: RequestStatus
+    expected_status: RequestStatus | None = None
+
+
+class StatusTransitionBatchSchema(BaseModel):
+    """Esquema para cambiar el estado de varias solicitudes."""
+    transitions: List[StatusTransitionSchema] = Field(
+        ..., min_length=1, max_length=settings.TRANSITION_BATCH_MAX
+    )
+
+
+class StatusTransitionResultSchema(BaseModel):
+    """Esquema del resultado del cambio de estado de una solicitud.
+
+    ``error`` indica que el cambio se aplicó pero no se pudo generar el formato ni notificar.
+    """
+    id: int
+    result: str
+    status: RequestStatus | None = None
+    error: str | None = None
+
+
+class StatusTransitionBatchResultSchema(BaseModel):
+    """Esquema del resultado del cambio de estado de varias solicitudes."""
+    results: List[StatusTransitionResultSchema]
+    emails_sent: int
+
+
+class RecurrenceRuleSchema(BaseModel):
+    """Esquema de la regla de repetición: días de la semana (0 = lunes) hasta una fecha."""
+    weekdays: List[Annotated[int, Field(ge=0, le=6)]] = Field(..., min_length=1)
+    until: date
+
+
+class RecurringEntranceRequestSchema(BaseModel):
+    """Esquema para crear una solicitud que se repite según una regla.
+
+    Las fechas de ``request`` son las de la primera ocurrencia; las demás conservan la hora de
+    ingreso y la duración.
+    """
+    request: EntranceRequestCreateSchema
+    rule: RecurrenceRuleSchema
+
+
+class RecurringEntranceRequestResultSchema(BaseModel):
+    """Esquema de las solicitudes creadas por una regla de repetición."""
+    ids: List[int]
+    conflicts: List[GuestConflictSchema] = []
+
+
+class OccupancyBucketSchema(BaseModel):
+    """Esquema de la ocupación de una sede en un intervalo."""
+    start: datetime
+    peak: int
+    arrivals: int
+
+
+class BranchOccupancySchema(BaseModel):
+    """Esquema de la ocupación de una sede en el rango consultado."""
+    branch_id: int
+    peak: int
+    buckets: List[OccupancyBucketSchema]
+
+
+class OccupancySchema(BaseModel):
+    """Esquema de la ocupación esperada de las sedes por hora o por día."""
+    start: datetime
+    end: datetime
+    bucket: str
+    branches: List[BranchOccupancySchema]
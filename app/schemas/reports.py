@@ -0,0 +1,33 @@
+"""Esquemas para los reportes de solicitudes de ingreso."""
+from datetime import date
+from typing import List
+
+from pydantic import BaseModel
+
+from app.models.entrances import RequestStatus
+
+
+class RequestSummaryRowSchema(BaseModel):
+    """Esquema de una fila del reporte; solo trae las columnas agrupadas."""
+    branch_id: int | None = None
+    department_id: int | None = None
+    status: RequestStatus | None = None
+    day: date | None = None
+    count: int
+
+
+class DepartmentMonthlySchema(BaseModel):
+    """Esquema de las solicitudes de un departamento en el mes y el mes anterior."""
+    department_id: int
+    department: str
+    current: int
+    previous: int
+    change: int
+    change_pct: float | None = None
+
+
+class DepartmentComparisonSchema(BaseModel):
+    """Esquema de la comparación mensual de solicitudes por departamento."""
+    month: str
+    previous_month: str
+    departments: List[DepartmentMonthlySchema]
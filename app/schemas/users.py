@@ -65,6 +65,26 @@ class GuestIdSchema(BaseModel):
     guests_ids: List[int]
 
 
+class RosterRowErrorSchema(BaseModel):
+    """Esquema de los errores de una fila de la planilla."""
+    row: int
+    errors: List[str]
+
+    class Config:
+        from_attributes = True
+
+
+class RosterImportSchema(BaseModel):
+    """Esquema del resultado de importar una planilla de invitados."""
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[RosterRowErrorSchema]
+
+    class Config:
+        from_attributes = True
+
+
 class GuestSchema(BaseModel):
     """Esquema de invitados."""
     id: int
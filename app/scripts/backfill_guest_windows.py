@@ -0,0 +1,37 @@
+"""Script para copiar la ventana de cada solicitud a sus invitados.
+
+La sesión mantiene la copia al crear o actualizar solicitudes; este script completa los
+vínculos creados antes de que existieran las columnas o por cargas que no pasan por la
+sesión.
+"""
+from sqlalchemy import select, update
+
+from app.db.database import engine
+from app.models.entrances import EntranceRequest, EntranceRequestGuest
+
+
+def backfill_guest_windows(connection) -> int:
+    """Completa las ventanas faltantes en la transacción de ``connection``."""
+    links = EntranceRequestGuest.__table__
+    requests = EntranceRequest.__table__
+
+    def request_column(column):
+        return (
+            select(column)
+            .where(requests.c.id == links.c.entrance_request_id)
+            .scalar_subquery()
+        )
+
+    return connection.execute(
+        update(links)
+        .where(links.c.entry_date.is_(None))
+        .values(
+            entry_date=request_column(requests.c.entry_date),
+            departure_date=request_column(requests.c.departure_date),
+        )
+    ).rowcount
+
+
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        print(f"Invitados actualizados: {backfill_guest_windows(conn)}")
@@ -2,13 +2,24 @@
 from copy import copy
 import os
 import shutil
+import time
 from openpyxl import load_workbook
 from openpyxl.utils import range_boundaries
 from sqlalchemy.orm import Session, selectinload
 
+from app.config.settings import settings
 from app.models.branches import Branch, BranchTypes
 from app.models.users import Guest, User
 from app.models.entrances import EntranceRequest, EntranceRequestGuest
+from app.utils.format_cache import fetch_format, format_key, store_format
+from app.utils.metrics import EXPORT_DURATION, EXPORT_SIZE
+from app.utils.sheet_xml import get_layout
+
+# Columna libre a la derecha del formato donde se escribe el pase de cada invitado
+PASS_COLUMN = 18
+# Filas prototipo de invitados y materiales, que se repiten por cada registro
+GUEST_ROW = 15
+MATERIAL_ROW = 22
 
 
 def copy_row(ws, source_row, target_row):
@@ -30,7 +41,7 @@ def copy_row(ws, source_row, target_row):
     ws.row_dimensions[target_row].height = ws.row_dimensions[source_row].height
 
     # Copiar celdas combinadas
-    for merged_cell_range in ws.merged_cells.ranges:
+    for merged_cell_range in list(ws.merged_cells.ranges):
         min_col, min_row, max_col, max_row = range_boundaries(str(merged_cell_range))
         if min_row == max_row == source_row:
             new_range = (
@@ -40,9 +51,111 @@ def copy_row(ws, source_row, target_row):
             ws.merge_cells(new_range)
 
 
+def insert_row(ws, row):
+    """Inserta una fila en blanco desplazando también las celdas combinadas siguientes."""
+    ws.insert_rows(row)
+    # openpyxl mueve las celdas pero no los rangos combinados
+    for merged_cell_range in ws.merged_cells.ranges:
+        if merged_cell_range.min_row >= row:
+            merged_cell_range.shift(0, 1)
+
+
+def build_format_cells(entrance_request: EntranceRequest, passes: dict[int, str] | None = None):
+    """Valores del formato por (fila, columna) de la plantilla y filas de invitados y materiales."""
+    cells = {}
+    # Datos Generales
+    cells[6, 2] = entrance_request.branch.name.upper()
+    cells[6, 5] = entrance_request.branch.municipality.name.upper()
+    if entrance_request.branch.type == BranchTypes.administrative:
+        cells[5, 9] = ""
+        cells[6, 9] = "x"
+    else:
+        cells[5, 9] = "x"
+        cells[6, 9] = ""
+    cells[5, 11] = "x" if entrance_request.is_installation else ""
+    cells[6, 11] = "x" if entrance_request.is_uninstallation else ""
+    cells[6, 12] = entrance_request.entry_date.strftime("%d/%m/%Y")
+    cells[6, 15] = entrance_request.departure_date.strftime("%d/%m/%Y")
+
+    # Descripcion de las actividades
+    cells[9, 2] = entrance_request.reason.upper()
+
+    # Solicitante, autorizador y seguridad
+    for column, user in (
+        (3, entrance_request.creator),
+        (8, entrance_request.authorizer),
+        (15, entrance_request.security),
+    ):
+        cells[28, column] = user.name
+        cells[29, column] = user.unit.name
+        cells[30, column] = user.position.name
+        cells[31, column] = user.phone_number
+
+    # Relacion de ingreso y salida de personal a las instalaciones
+    if passes:
+        cells[GUEST_ROW - 1, PASS_COLUMN] = "Pase de ingreso"
+    guest_rows = []
+    for entrance_guest in entrance_request.guests:
+        values = {
+            2: entrance_guest.guest.name,
+            4: entrance_guest.guest.eps.name,
+            5: entrance_guest.guest.arl.name,
+            7: entrance_guest.guest.document_id,
+            8: entrance_guest.guest.company.name,
+            14: entrance_request.entry_date.strftime("%H:%M"),
+            16: entrance_request.departure_date.strftime("%H:%M"),
+        }
+        if passes:
+            values[PASS_COLUMN] = passes.get(entrance_guest.guest.id, "")
+        guest_rows.append(values)
+
+    # Inventario de materiales o equipos
+    material_rows = [
+        {
+            2: material.quantity,
+            4: material.serial or "",
+            5: material.model,
+            10: material.description or "",
+        }
+        for material in entrance_request.materials
+    ]
+    return cells, {GUEST_ROW: guest_rows, MATERIAL_ROW: material_rows}
+
+
+def render_with_openpyxl(template_path: str, output_path: str, cells: dict, blocks: dict):
+    """Llena una copia de la plantilla con openpyxl, insertando las filas de cada bloque."""
+    # Copiar plantilla a archivo nuevo
+    shutil.copy(template_path, output_path)
+
+    # Cargar archivo copiado
+    wb = load_workbook(output_path)
+    ws = wb.active
+    for (row, column), value in cells.items():
+        ws.cell(row=row, column=column).value = value
+
+    offset = 0
+    for start_row, rows in sorted(blocks.items()):
+        start_row += offset
+        for idx, values in enumerate(rows, start=start_row):
+            if idx < start_row + len(rows) - 1:
+                # Agregar una fila con el formato de la fila plantilla, que baja una posición
+                insert_row(ws, idx)
+                copy_row(ws, idx + 1, idx)
+            for column, value in values.items():
+                ws.cell(row=idx, column=column).value = value
+        offset += max(len(rows) - 1, 0)
+    wb.save(output_path)
+
+
 def export_entrance_requests_to_excel(
-        db: Session, request_id: int, template_path: str, output_path: str):
-    """Genera formato de ingreso a partir de una plantilla de Excel."""
+        db: Session, request_id: int, template_path: str, output_path: str,
+        passes: dict[int, str] | None = None, engine: str | None = None):
+    """Genera formato de ingreso a partir de una plantilla de Excel.
+
+    Si se reciben ``passes`` (pase por ID de invitado) se agregan junto a cada invitado.
+    ``engine`` elige el render ("xml" u "openpyxl"); por defecto ``FORMAT_RENDER_ENGINE``.
+    """
+    start = time.perf_counter()
     # Cargar datos de SQLAlchemy
     entrance_request = (
         db.query(EntranceRequest)
@@ -89,74 +202,16 @@ def export_entrance_requests_to_excel(
     if not os.path.exists(template_path):
         raise FileNotFoundError(f"Plantilla no encontrada: {template_path}")
 
-    # Copiar plantilla a archivo nuevo
-    shutil.copy(template_path, output_path)
-
-    # Cargar archivo copiado
-    wb = load_workbook(output_path)
-    ws = wb.active
-
-    # Datos Generales
-    ws.cell(row=6, column=2).value = entrance_request.branch.name.upper()
-    ws.cell(row=6, column=5).value = entrance_request.branch.municipality.name.upper()
-    if entrance_request.branch.type == BranchTypes.administrative:
-        ws.cell(row=5, column=9).value = ""
-        ws.cell(row=6, column=9).value = "x"
-    else:
-        ws.cell(row=5, column=9).value = "x"
-        ws.cell(row=6, column=9).value = ""
-    ws.cell(row=5, column=11).value = "x" if entrance_request.is_installation else ""
-    ws.cell(row=6, column=11).value = "x" if entrance_request.is_uninstallation else ""
-    ws.cell(row=6, column=12).value = entrance_request.entry_date.strftime("%d/%m/%Y")
-    ws.cell(row=6, column=15).value = entrance_request.departure_date.strftime("%d/%m/%Y")
-
-    # Descripcion de las actividades
-    ws.cell(row=9, column=2).value = entrance_request.reason.upper()
-
-    # Solicitante, autorizador y seguridad
-    ws.cell(row=28, column=3).value = entrance_request.creator.name
-    ws.cell(row=28, column=8).value = entrance_request.authorizer.name
-    ws.cell(row=28, column=15).value = entrance_request.security.name
-
-    ws.cell(row=29, column=3).value = entrance_request.creator.unit.name
-    ws.cell(row=29, column=8).value = entrance_request.authorizer.unit.name
-    ws.cell(row=29, column=15).value = entrance_request.security.unit.name
-
-    ws.cell(row=30, column=3).value = entrance_request.creator.position.name
-    ws.cell(row=30, column=8).value = entrance_request.authorizer.position.name
-    ws.cell(row=30, column=15).value = entrance_request.security.position.name
-
-    ws.cell(row=31, column=3).value = entrance_request.creator.phone_number
-    ws.cell(row=31, column=8).value = entrance_request.authorizer.phone_number
-    ws.cell(row=31, column=15).value = entrance_request.security.phone_number
-
-    # Relacion de ingreso y salida de personal a las instalaciones
-    start_row = 15
-    for idx, entrance_guest in enumerate(entrance_request.guests, start=start_row):
-        if entrance_request.guests[-1] != entrance_guest:
-            # Agregar una fila en blanco entre cada invitado
-            current_row = idx
-            ws.insert_rows(current_row)
-            copy_row(ws, current_row, idx + 1)
-        ws.cell(row=idx, column=2).value = entrance_guest.guest.name
-        ws.cell(row=idx, column=4).value = entrance_guest.guest.eps.name
-        ws.cell(row=idx, column=5).value = entrance_guest.guest.arl.name
-        ws.cell(row=idx, column=7).value = entrance_guest.guest.document_id
-        ws.cell(row=idx, column=8).value = entrance_guest.guest.company.name
-        ws.cell(row=idx, column=14).value = entrance_request.entry_date.strftime("%H:%M")
-        ws.cell(row=idx, column=16).value = entrance_request.departure_date.strftime("%H:%M")
-
-    next_row = start_row + (len(entrance_request.guests) - 1) + 7
-    # Inventario de materiales o equipos
-    for idx, material in enumerate(entrance_request.materials, start=next_row):
-        if entrance_request.materials[-1] != material:
-            current_row = idx
-            ws.insert_rows(current_row)
-            copy_row(ws, current_row, idx + 1)
-        ws.cell(row=idx, column=2).value = material.quantity
-        ws.cell(row=idx, column=4).value = material.serial or ""
-        ws.cell(row=idx, column=5).value = material.model
-        ws.cell(row=idx, column=10).value = material.description or ""
-
-    wb.save(output_path)
+    cells, blocks = build_format_cells(entrance_request, passes)
+    engine = engine or settings.FORMAT_RENDER_ENGINE
+    # Un formato ya generado con los mismos valores se lee de la caché
+    key = format_key(template_path, engine, entrance_request, cells, blocks)
+    if not fetch_format(key, output_path):
+        if engine == "openpyxl":
+            render_with_openpyxl(template_path, output_path, cells, blocks)
+        else:
+            get_layout(template_path, (GUEST_ROW, MATERIAL_ROW)).render(output_path, cells, blocks)
+        store_format(key, output_path)
+    EXPORT_DURATION.observe(time.perf_counter() - start)
+    EXPORT_SIZE.observe(os.path.getsize(output_path))
     print(f"Archivo generado: {output_path}")
@@ -0,0 +1,78 @@
+"""Script para recalcular los contadores de pendientes y el resumen de solicitudes.
+
+Los handlers mantienen los contadores y el resumen al crear o actualizar solicitudes; este
+script los recalcula después de cargas masivas que no pasan por la sesión (p. ej. el seeder).
+"""
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import delete, extract, func, insert, select
+
+from app.db.database import engine
+from app.models.branches import Branch
+from app.models.entrances import (
+    EntranceRequest,
+    MonthlySummary,
+    PENDING_ROLES,
+    PendingCounter,
+    RequestSummary
+)
+
+
+def rebuild_pending_counters(connection) -> int:
+    """Recalcula los contadores en la transacción de ``connection`` y retorna cuántos hay."""
+    connection.execute(delete(PendingCounter))
+    total = 0
+    for status, (role, column) in PENDING_ROLES.items():
+        user_column = getattr(EntranceRequest, column)
+        rows = connection.execute(
+            select(user_column, func.count())
+            .where(EntranceRequest.status == status, user_column.is_not(None))
+            .group_by(user_column)
+        ).all()
+        if rows:
+            connection.execute(insert(PendingCounter), [
+                {"user_id": user_id, "role": role, "count": count} for user_id, count in rows
+            ])
+        total += len(rows)
+    return total
+
+
+def rebuild_request_summary(connection) -> int:
+    """Recalcula los resúmenes diario y mensual y retorna cuántas filas tiene el diario."""
+    connection.execute(delete(RequestSummary))
+    connection.execute(delete(MonthlySummary))
+    day = func.date(EntranceRequest.entry_date)
+    # Se inserta desde la consulta para no traer las filas a Python
+    total = connection.execute(insert(RequestSummary).from_select(
+        ["branch_id", "status", "day", "department_id", "count"],
+        select(
+            EntranceRequest.branch_id, EntranceRequest.status, day, Branch.department_id,
+            func.count(),
+        )
+        .join(Branch, Branch.id == EntranceRequest.branch_id)
+        .where(EntranceRequest.status.is_not(None))
+        .group_by(EntranceRequest.branch_id, EntranceRequest.status, day, Branch.department_id),
+    )).rowcount
+    # El mensual sale del diario, agrupado por año y mes
+    year, month = extract("year", RequestSummary.day), extract("month", RequestSummary.day)
+    rows = connection.execute(
+        select(RequestSummary.department_id, RequestSummary.status, year, month,
+               func.sum(RequestSummary.count))
+        .group_by(RequestSummary.department_id, RequestSummary.status, year, month)
+    ).all()
+    months = Counter()
+    for department_id, status, row_year, row_month, count in rows:
+        months[department_id, status, date(int(row_year), int(row_month), 1)] += count
+    if months:
+        connection.execute(insert(MonthlySummary), [
+            {"department_id": department_id, "status": status, "month": month, "count": count}
+            for (department_id, status, month), count in months.items()
+        ])
+    return total
+
+
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        print(f"Contadores recalculados: {rebuild_pending_counters(conn)}")
+        print(f"Filas del resumen recalculadas: {rebuild_request_summary(conn)}")
@@ -0,0 +1,159 @@
+"""Servidor de producción con varios workers.
+
+El proceso principal importa la aplicación, abre el socket y crea ``SERVER_WORKERS`` procesos
+con ``fork``, así que el código ya cargado se comparte entre los workers. Cada worker descarta
+las conexiones de base de datos heredadas, atiende con su propio servidor uvicorn (con
+``THREADPOOL_SIZE`` hilos, fijados en el lifespan) y se recicla tras ``SERVER_MAX_REQUESTS``
+peticiones; el proceso principal lo reemplaza sin cerrar el socket, por lo que las conexiones
+nuevas esperan en el backlog en vez de fallar.
+
+Con ``SIGTERM`` o ``SIGINT`` los workers dejan de aceptar conexiones, cierran los streams de
+eventos y esperan hasta ``SERVER_GRACEFUL_TIMEOUT`` segundos a las peticiones en curso; los
+hilos que siguen generando formatos o enviando correos se esperan hasta completar
+``SERVER_SHUTDOWN_TIMEOUT`` y después el worker se termina a la fuerza.
+"""
+import logging
+import multiprocessing
+import random
+import signal
+import socket
+import sys
+import time
+from multiprocessing.connection import wait
+
+import uvicorn
+
+from app.config.settings import settings
+
+# Los mensajes del proceso principal usan el formato de los de uvicorn
+logger = logging.getLogger("uvicorn.error")
+
+STARTUP_FAILURE = 3
+
+
+class WorkerServer(uvicorn.Server):
+    """Servidor uvicorn de un worker que cierra los streams de eventos al apagarse."""
+
+    async def shutdown(self, sockets: list[socket.socket] | None = None) -> None:
+        from app.utils.events import hub
+
+        # Los streams no terminan solos; el cliente se reconecta a otro worker
+        hub.close_all()
+        await super().shutdown(sockets)
+
+
+def _max_requests() -> int | None:
+    """Peticiones antes de reciclar el worker, con variación para no reciclarlos a la vez."""
+    if settings.SERVER_MAX_REQUESTS <= 0:
+        return None
+    return settings.SERVER_MAX_REQUESTS + random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER)
+
+
+def _dispose_engines() -> None:
+    """Descarta las conexiones heredadas del proceso principal sin cerrarlas."""
+    from app.db.database import engine
+    from app.utils.events import broker
+
+    for pooled in (engine, getattr(broker, "engine", None)):
+        if pooled is not None:
+            # Con close=False el hijo no cierra los sockets que el padre aún podría usar
+            pooled.dispose(close=False)
+
+
+def run_worker(config: uvicorn.Config, sock: socket.socket) -> None:
+    """Atiende peticiones en el socket compartido hasta apagarse o reciclarse."""
+    # uvicorn atiende las señales mientras sirve y al terminar las vuelve a emitir; se ignoran
+    # para que el worker salga normalmente y espere los hilos que siguen trabajando
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _dispose_engines()
+    config.limit_max_requests = _max_requests()
+    server = WorkerServer(config)
+    server.run(sockets=[sock])
+    if not server.started:
+        sys.exit(STARTUP_FAILURE)
+
+
+class Supervisor:
+    """Proceso principal: mantiene los workers vivos y los apaga en orden."""
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.stopping = False
+        self._context = multiprocessing.get_context("fork")
+
+    def spawn(self) -> None:
+        process = self._context.Process(target=run_worker, args=(self.config, self.sock))
+        process.start()
+        self.processes[process.sentinel] = process
+        logger.info(f"Worker {process.pid} iniciado")
+
+    def stop(self, signum, _frame) -> None:
+        logger.info(f"Señal {signal.Signals(signum).name} recibida, apagando los workers")
+        self.stopping = True
+
+    def run(self) -> int:
+        """Crea los workers, reemplaza los que terminan y retorna el código de salida."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        exit_code = 0
+        while not self.stopping:
+            for sentinel in wait(list(self.processes), timeout=1.0):
+                process = self.processes.pop(sentinel)
+                process.join()
+                if process.exitcode == STARTUP_FAILURE:
+                    # Un worker que no arranca fallaría igual al reemplazarlo
+                    logger.error(f"Worker {process.pid} no pudo iniciar la aplicación")
+                    self.stopping = True
+                    exit_code = STARTUP_FAILURE
+                    break
+                logger.info(f"Worker {process.pid} terminó ({process.exitcode}), reemplazándolo")
+                self.spawn()
+        self.shutdown()
+        return exit_code
+
+    def shutdown(self) -> None:
+        """Pide a los workers que terminen y mata a los que no lo hacen a tiempo."""
+        for process in self.processes.values():
+            process.terminate()
+        deadline = time.monotonic() + settings.SERVER_SHUTDOWN_TIMEOUT
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} no terminó a tiempo, se mata")
+                process.kill()
+                process.join()
+            logger.info(f"Worker {process.pid} terminó ({process.exitcode})")
+        self.processes.clear()
+        self.sock.close()
+
+
+def main() -> None:
+    """Inicia el servidor con la configuración de ``Settings``."""
+    if settings.SERVER_RELOAD:
+        # Solo para desarrollo: un proceso que se reinicia al cambiar el código
+        uvicorn.run(
+            "app.main:app", host=settings.SERVER_HOST, port=settings.SERVER_PORT, reload=True
+        )
+        return
+
+    from app.main import app
+
+    config = uvicorn.Config(
+        app,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        lifespan="on",
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+    )
+    sock = config.bind_socket()
+    sys.exit(Supervisor(config, sock, settings.SERVER_WORKERS).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Tests unitarios para los endpoints de administración."""
+import pstats
+import threading
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import settings
+from app.db.database import Base, get_db
+from app.auth.dependencies import get_current_user
+from app.models.places import Department
+from app.main import app
+from app.utils.flight_recorder import Timeline, _current_timeline, slow_requests
+from app.utils.profiling import (
+    ProfiledRoute,
+    ProfilingMiddleware,
+    _profile_lock,
+    create_profile_token,
+    set_sampling,
+)
+
+# Crear una BD para pruebas
+SQLALCHEMY_DATABASE_URL = "sqlite:///./unit_test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Sobrescribe la función get_db para usar la BD de pruebas."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def override_get_current_user():
+    """Emula la función get_current_user para pruebas."""
+    return {
+        "sub": "testuser",
+        "id": 1,
+        "role": "admin",
+    }
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Crear tablas
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def setup_data(monkeypatch):
+    """Configura los datos necesarios para las pruebas."""
+    monkeypatch.setattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 0)
+    slow_requests.clear()
+    db = TestingSessionLocal()
+    db.query(Department).delete()
+    db.add(Department(id=1, name="Bogota DC", cod_dane="11"))
+    db.commit()
+    yield
+    db.close()
+    slow_requests.clear()
+
+
+def test_slow_request_is_recorded_with_redacted_sql():
+    """Prueba que la petición lenta quede registrada sin los valores de los parámetros."""
+    client.get("/api/places/departments?name=Bogota")
+    response = client.get("/api/admin/slow-requests")
+    assert response.status_code == 200
+    entry = next(
+        item for item in response.json() if item["route"] == "/api/places/departments"
+    )
+    assert entry["query_params"] == {"name": "Bogota"}
+    assert entry["statements"]
+    assert all("bogota" not in str(item["parameters"]) for item in entry["statements"])
+    assert entry["explain"] is None
+
+
+def test_slow_request_hides_credentials_in_query():
+    """Prueba que los parámetros de la URL con credenciales no queden en el registro."""
+    client.get("/api/places/departments?name=Bogota&access_token=abc&api_key=xyz")
+    entry = client.get("/api/admin/slow-requests").json()[0]
+    assert entry["query_params"] == {
+        "name": "Bogota", "access_token": "[oculto]", "api_key": "[oculto]"
+    }
+
+
+def test_flight_recorder_survives_failed_statements(monkeypatch):
+    """Prueba que una sentencia fallida no desalinee los tiempos y que se limite la línea."""
+    monkeypatch.setattr(settings, "SLOW_REQUEST_MAX_STATEMENTS", 2)
+    timeline = Timeline()
+    token = _current_timeline.set(timeline)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM tabla_que_no_existe"))
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+            assert not conn.info.get("flight_recorder_start")
+    finally:
+        _current_timeline.reset(token)
+    assert [item[0] for item in timeline] == ["SELECT 1", "SELECT 1"]
+    assert timeline.dropped == 1
+
+
+def test_slow_request_explains_slowest_statement(monkeypatch):
+    """Prueba que se adjunte el plan de ejecución de la sentencia más lenta."""
+    monkeypatch.setattr(settings, "SLOW_REQUEST_EXPLAIN", True)
+    client.get("/api/places/departments?name=Bogota")
+    entry = client.get("/api/admin/slow-requests").json()[0]
+    assert entry["explain"]["statement"].lstrip().upper().startswith("SELECT")
+    assert entry["explain"]["plan"]
+
+
+def test_admin_endpoints_require_admin_role():
+    """Prueba que un usuario sin rol de administrador no pueda consultar el registro."""
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "guard", "id": 2}
+    try:
+        response = client.get("/api/admin/slow-requests")
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    assert response.status_code == 403
+
+
+def test_signed_header_profiles_request(monkeypatch, tmp_path):
+    """Prueba que un token de perfilado válido genere el archivo de estadísticas."""
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    response = client.get(
+        "/api/places/departments",
+        headers={"X-Profile-Token": create_profile_token()}
+    )
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    stats = pstats.Stats(str(tmp_path / profile_id))
+    functions = {func[2] for func in stats.stats}
+    # Se perfila el handler completo, incluida la serialización del response_model
+    assert {"get_departments", "serialize_response"} <= functions
+
+
+def test_invalid_profile_token_is_ignored(monkeypatch, tmp_path):
+    """Prueba que un token alterado no active el perfilado."""
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    token = create_profile_token()
+    token = token[:-1] + ("0" if token[-1] != "0" else "1")
+    response = client.get("/api/places/departments", headers={"X-Profile-Token": token})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    # Tampoco fallan las cabeceras con caracteres que no son ASCII
+    expires = token.partition(".")[0]
+    for token in (f"{expires}.é", "²."):
+        response = client.get(
+            "/api/places/departments", headers={"X-Profile-Token": token.encode("latin-1")}
+        )
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+    assert not list(tmp_path.iterdir())
+
+
+def test_profiling_sample_rate_is_capped():
+    """Prueba que la tasa de muestreo no supere la máxima configurada."""
+    response = client.put("/api/admin/profiling", json={"rate": 1, "duration_seconds": 60})
+    assert response.status_code == 200
+    assert response.json()["rate"] == settings.PROFILE_MAX_SAMPLE_RATE
+    set_sampling(0, 0)
+
+
+def test_admin_mints_profile_token(monkeypatch, tmp_path):
+    """Prueba que el token generado por el endpoint de administración active el perfilado."""
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    response = client.post("/api/admin/profiling/token", json={"expires_in": 60})
+    assert response.status_code == 200
+    token = response.json()["token"]
+    assert response.json()["expires_at"] == int(token.partition(".")[0])
+    response = client.get("/api/places/departments", headers={"X-Profile-Token": token})
+    assert (tmp_path / response.headers["x-profile-id"]).exists()
+    response = client.post("/api/admin/profiling/token", json={"expires_in": 7200})
+    assert response.status_code == 422
+
+
+def busy_elsewhere(stop):
+    """Simula el trabajo de otra petición en un hilo distinto."""
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_profile_excludes_other_threads(monkeypatch, tmp_path):
+    """Prueba que el perfil no registre lo que otros hilos ejecutan durante la petición."""
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_elsewhere, args=(stop,))
+    worker.start()
+    try:
+        response = client.get(
+            "/api/places/departments", headers={"X-Profile-Token": create_profile_token()}
+        )
+    finally:
+        stop.set()
+        worker.join()
+    stats = pstats.Stats(str(tmp_path / response.headers["x-profile-id"]))
+    functions = {func[2] for func in stats.stats}
+    assert "get_departments" in functions
+    assert "busy_elsewhere" not in functions
+
+
+def test_profile_lock_released_before_stream_body(monkeypatch, tmp_path):
+    """Prueba que el candado de perfilado se libere antes de enviar el cuerpo en stream."""
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    locked = []
+
+    def body():
+        locked.append(_profile_lock.locked())
+        yield b"ok"
+
+    router = APIRouter(route_class=ProfiledRoute)
+
+    @router.get("/stream")
+    def stream():
+        return StreamingResponse(body())
+
+    stream_app = FastAPI()
+    stream_app.include_router(router)
+    stream_app.add_middleware(ProfilingMiddleware)
+    response = TestClient(stream_app).get(
+        "/stream", headers={"X-Profile-Token": create_profile_token()}
+    )
+    assert response.text == "ok"
+    assert "x-profile-id" in response.headers
+    assert locked == [False]
+    assert not _profile_lock.locked()
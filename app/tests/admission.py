@@ -0,0 +1,167 @@
+"""Tests unitarios para el control de admisión y el descarte de carga."""
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base, get_db
+from app.auth.dependencies import get_current_user
+from app.main import app
+from app.utils import admission
+from app.utils.admission import (
+    CRITICAL, HEAVY, READ, WRITE, AdmissionController, RouteClassifier, parse_route_limits,
+)
+from app.utils.metrics import ADMISSION_REJECTIONS
+
+# Crear una BD para pruebas
+SQLALCHEMY_DATABASE_URL = "sqlite:///./unit_test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Sobrescribe la función get_db para usar la BD de pruebas."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def override_get_current_user():
+    """Emula la función get_current_user para pruebas."""
+    return {
+        "sub": "testuser",
+        "id": 1,
+        "role": "admin",
+    }
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Crear tablas
+Base.metadata.create_all(bind=engine)
+
+
+def test_route_classification_and_limits():
+    """Prueba las prioridades por ruta y la lectura de los límites configurados."""
+    limits = parse_route_limits(
+        "GET /api/reports/requests/export=2, post /api/users/guests/import=1"
+    )
+    assert limits == {
+        "GET /api/reports/requests/export": 2,
+        "POST /api/users/guests/import": 1,
+    }
+    classifier = RouteClassifier(limits)
+    assert classifier.classify("GET", "/metrics") == (None, None)
+    assert classifier.classify("GET", "/api/entrances/events") == (None, None)
+    assert classifier.classify("GET", "/api/entrances/checkin") == (CRITICAL, None)
+    assert classifier.classify("GET", "/api/entrances/requests/7") == (READ, None)
+    assert classifier.classify("HEAD", "/api/branches/") == (READ, None)
+    assert classifier.classify("PUT", "/api/entrances/requests/7") == (WRITE, None)
+    assert classifier.classify("GET", "/api/entrances/requests/7/format") == (HEAVY, None)
+    assert classifier.classify("GET", "/api/reports/requests/export") == (
+        HEAVY, "GET /api/reports/requests/export"
+    )
+    assert classifier.classify("POST", "/api/users/guests/import") == (
+        HEAVY, "POST /api/users/guests/import"
+    )
+
+
+def test_controller_limits_and_priorities():
+    """Prueba la capacidad global, los límites de pesadas y por ruta y el orden de la cola."""
+    async def scenario():
+        controller = AdmissionController(
+            max_in_flight=3, max_queue=10, queue_timeout=1, heavy_limit=1,
+            route_limits={"GET /export": 1},
+        )
+        assert await controller.acquire(HEAVY) is None
+        # Las pesadas no pasan de su cuota aunque quede capacidad
+        heavy = asyncio.create_task(controller.acquire(HEAVY))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        assert await controller.acquire(READ, "GET /export") is None
+        limited = asyncio.create_task(controller.acquire(READ, "GET /export"))
+        await asyncio.sleep(0)
+        assert await controller.acquire(WRITE) is None
+        assert controller.in_flight == 3
+
+        write = asyncio.create_task(controller.acquire(WRITE))
+        read = asyncio.create_task(controller.acquire(READ))
+        critical = asyncio.create_task(controller.acquire(CRITICAL))
+        await asyncio.sleep(0)
+        assert controller.queued == 5
+
+        # Al liberar una escritura entra la petición de portería antes que las demás
+        controller.release(WRITE)
+        assert await critical is None
+        assert not read.done() and not write.done()
+        # Al liberar la pesada entra la lectura, no la pesada ni la ruta limitada
+        controller.release(HEAVY)
+        assert await read is None
+        assert not heavy.done() and not limited.done() and not write.done()
+        controller.release(READ, "GET /export")
+        assert await limited is None
+        controller.release(CRITICAL)
+        assert await write is None
+        controller.release(READ)
+        assert await heavy is None
+        assert controller.in_flight == 3
+        assert controller.heavy_in_flight == 1
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_controller_sheds_on_timeout_and_full_queue():
+    """Prueba el rechazo por espera vencida, por cola llena y el desplazamiento por prioridad."""
+    async def scenario():
+        controller = AdmissionController(
+            max_in_flight=1, max_queue=1, queue_timeout=0.05, heavy_limit=1
+        )
+        assert await controller.acquire(READ) is None
+        assert await controller.acquire(READ) == "timeout"
+        assert controller.queued == 0
+
+        heavy = asyncio.create_task(controller.acquire(HEAVY))
+        await asyncio.sleep(0)
+        # Con la cola llena una lectura desplaza a la pesada, pero otra pesada no
+        assert await controller.acquire(HEAVY) == "queue_full"
+        read = asyncio.create_task(controller.acquire(READ))
+        await asyncio.sleep(0)
+        assert await heavy == "queue_full"
+        controller.release(READ)
+        assert await read is None
+
+        # Una petición cancelada mientras espera no se queda con el cupo
+        cancelled = asyncio.create_task(controller.acquire(WRITE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert controller.queued == 0
+        controller.release(READ)
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_saturated_server_returns_503(monkeypatch):
+    """Prueba que una petición sin cupo reciba 503 con Retry-After y que las exentas pasen."""
+    controller = admission.admission_controller
+    monkeypatch.setattr(controller, "queue_timeout", 0.01)
+    before = ADMISSION_REJECTIONS.collect().get(("read", "timeout"), 0)
+    controller.in_flight += controller.max_in_flight
+    try:
+        response = client.get("/api/branches/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+        assert ADMISSION_REJECTIONS.collect().get(("read", "timeout"), 0) == before + 1
+        assert client.get("/metrics").status_code == 200
+    finally:
+        controller.in_flight -= controller.max_in_flight
+    assert client.get("/api/branches/").status_code == 200
+    assert controller.in_flight == 0
@@ -0,0 +1,1332 @@
+"""Tests unitarios para el endpoint de solicitudes de ingreso."""
+from copy import copy
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import settings
+from app.db.database import Base, get_db
+from app.db.migrate import migrate
+from app.auth.dependencies import get_current_user
+from app.models.branches import Branch, BranchTypes
+from app.models.entrances import (
+    BranchMove,
+    EntranceRequest,
+    EntranceRequestGuest,
+    Material,
+    MonthlySummary,
+    PassRevocation,
+    PendingCounter,
+    RequestStatus,
+    RequestSummary
+)
+from app.models.idempotency import IdempotencyKey
+from app.models.places import Department, Municipality
+from app.models.users import Company, Guest, Position, Unit, User
+from app.main import app
+from app.routers import entrances as entrances_router
+from app.scripts import create_format
+from app.scripts.create_format import export_entrance_requests_to_excel
+from app.scripts.rebuild_counters import rebuild_pending_counters
+from app.utils.checkin import CheckInIndex, checkin_index
+from app.utils.events import broker
+from app.utils import notifications
+from app.utils import format_cache
+from app.utils.format_cache import LocalDirectoryBackend, S3Backend, passes_for_format
+from app.utils.metrics import FORMAT_CACHE_REQUESTS
+from app.utils.passes import RevocationList, decode_pass, pass_revocations
+from app.utils import request_cache, rosters
+
+# Crear una BD para pruebas
+SQLALCHEMY_DATABASE_URL = "sqlite:///./unit_test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Sobrescribe la función get_db para usar la BD de pruebas."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def override_get_current_user():
+    """Emula la función get_current_user para pruebas."""
+    return {
+        "sub": "testuser",
+        "id": 1,
+        "role": "admin",
+    }
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Crear tablas
+Base.metadata.create_all(bind=engine)
+
+
+def update_request(url: str, **kwargs):
+    """Actualiza la solicitud enviando en ``If-Match`` el ETag vigente."""
+    return client.put(url, headers={"If-Match": client.get(url).headers["ETag"]}, **kwargs)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def setup_data():
+    """Configura los datos necesarios para las pruebas."""
+    db = TestingSessionLocal()
+    for model in (
+        IdempotencyKey, RequestSummary, MonthlySummary, PendingCounter, Material,
+        EntranceRequestGuest, BranchMove, PassRevocation,
+        EntranceRequest, Guest, User, Position, Unit, Company, Branch, Municipality,
+        Department,
+    ):
+        db.query(model).delete()
+    db.add_all([
+        Department(id=1, name="Bogota DC", cod_dane="11"),
+        Municipality(id=1, name="Bogota", cod_dane="11001", department_id=1),
+        Branch(
+            id=1,
+            code="s1234",
+            name="Sede Administrativa",
+            address="Calle 123",
+            type=BranchTypes.administrative,
+            department_id=1,
+            municipality_id=1
+        ),
+        Branch(
+            id=2,
+            code="s1235",
+            name="Sede Tecnica",
+            address="Carrera 46",
+            type=BranchTypes.technical,
+            department_id=1,
+            municipality_id=1
+        ),
+        Company(id=1, name="Sura", is_eps=True),
+        Company(id=2, name="Positiva", is_arl=True),
+        Company(id=3, name="Contratista SAS"),
+        Unit(id=1, name="Operaciones"),
+        Position(id=1, name="Profesional"),
+    ])
+    db.add_all([
+        User(
+            id=idx,
+            name=f"Empleado {idx}",
+            unit_id=1,
+            position_id=1,
+            phone_number=f"300000000{idx}",
+            email=f"empleado{idx}@telefonica.com"
+        )
+        for idx in (1, 2, 3)
+    ])
+    db.add_all([
+        Guest(
+            id=idx,
+            document_id=f"1000{idx}",
+            name=f"Invitado {idx}",
+            eps_id=1,
+            arl_id=2,
+            company_id=3,
+            city_id=1,
+            phone_number=f"310000000{idx}",
+            email=f"invitado{idx}@contratista.com"
+        )
+        for idx in (1, 2, 3)
+    ])
+    db.add(EntranceRequest(
+        id=1,
+        branch_id=1,
+        entry_date=datetime(2025, 1, 10, 7, 0),
+        departure_date=datetime(2025, 1, 10, 17, 0),
+        reason="Mantenimiento",
+        status=RequestStatus.auth_pending,
+        creator_id=1,
+        authorizer_id=2,
+        security_id=3,
+    ))
+    db.add_all([
+        EntranceRequestGuest(entrance_request_id=1, guest_id=idx) for idx in (1, 2, 3)
+    ])
+    db.add_all([
+        Material(entrance_request_id=1, model="Router", serial="SN1", quantity=1),
+        Material(entrance_request_id=1, model="Switch", serial="SN2", quantity=2),
+    ])
+    now = datetime.now()
+    db.add(EntranceRequest(
+        id=2,
+        branch_id=2,
+        entry_date=now - timedelta(hours=1),
+        departure_date=now + timedelta(hours=8),
+        reason="Atención de emergencia",
+        status=RequestStatus.authorized,
+        creator_id=1,
+        authorizer_id=2,
+        security_id=3,
+    ))
+    db.add(EntranceRequestGuest(entrance_request_id=2, guest_id=1))
+    db.commit()
+    checkin_index.build(db)
+    # Los datos se recrean con los mismos IDs y versiones en cada prueba
+    request_cache.get_backend.cache_clear()
+    yield
+    db.close()
+
+
+def test_get_entrance_requests():
+    """Prueba para obtener las solicitudes con sus invitados."""
+    response = client.get("/api/entrances/requests")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert [guest["document_id"] for guest in data["items"][-1]["guests"]] == [
+        "10001", "10002", "10003"
+    ]
+
+
+def test_get_entrance_requests_by_status():
+    """Prueba de filtrado de solicitudes por estado."""
+    response = client.get("/api/entrances/requests?status=Autorizado")
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+    assert response.json()["items"][0]["id"] == 2
+
+
+def test_export_with_several_guests_and_materials(tmp_path):
+    """Prueba que el formato repita las filas de invitados y materiales."""
+    output_path = str(tmp_path / "output.xlsx")
+    db = TestingSessionLocal()
+    try:
+        export_entrance_requests_to_excel(
+            db, 1, "format_templates/PERMISO MOVISTAR.xlsx", output_path
+        )
+    finally:
+        db.close()
+    ws = load_workbook(output_path).active
+    assert [ws.cell(row=row, column=7).value for row in (15, 16, 17)] == [
+        "10001", "10002", "10003"
+    ]
+    assert "B16:C16" in ws.merged_cells
+    # La sección de materiales baja tantas filas como invitados adicionales
+    assert ws.cell(row=24, column=5).value == "Router"
+    assert ws.cell(row=25, column=5).value == "Switch"
+    assert ws.cell(row=31, column=3).value == "Empleado 1"
+
+
+def _sheet_cells(path):
+    ws = load_workbook(path).active
+    cells = {}
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column):
+        for cell in row:
+            value = (
+                cell.value if cell.value != "" else None, copy(cell.font), copy(cell.border),
+                copy(cell.fill), cell.number_format, copy(cell.alignment), copy(cell.protection),
+            )
+            # Las celdas vacías sin estilo son iguales a las que no existen
+            if value[0] is not None or cell.has_style:
+                cells[cell.coordinate] = value
+    return cells, {str(merged) for merged in ws.merged_cells.ranges}
+
+
+def test_xml_render_matches_openpyxl(tmp_path):
+    """Prueba celda por celda que el render XML coincida con el de openpyxl."""
+    db = TestingSessionLocal()
+    # Solicitud sin invitados para cubrir bloques vacíos
+    db.add(EntranceRequest(
+        id=3, branch_id=2, entry_date=datetime(2025, 2, 1, 8),
+        departure_date=datetime(2025, 2, 1, 9),
+        reason="Revisión <urgente> & rápida", status=RequestStatus.auth_pending,
+        creator_id=1, authorizer_id=2, security_id=3,
+    ))
+    db.add(Material(
+        entrance_request_id=3, model="Rack", serial=None, quantity=4, description="Gabinete"
+    ))
+    db.commit()
+    try:
+        for request_id, passes in ((1, {1: "P1", 2: "P2", 3: "P3"}), (2, None), (3, None)):
+            paths = {}
+            for engine in ("openpyxl", "xml"):
+                paths[engine] = str(tmp_path / f"{engine}_{request_id}.xlsx")
+                export_entrance_requests_to_excel(
+                    db, request_id, "format_templates/PERMISO MOVISTAR.xlsx", paths[engine],
+                    passes=passes, engine=engine,
+                )
+            assert _sheet_cells(paths["xml"]) == _sheet_cells(paths["openpyxl"])
+    finally:
+        db.close()
+
+    # El render XML conserva las demás partes y desplaza las referencias bajo las filas nuevas
+    with zipfile.ZipFile(tmp_path / "xml_1.xlsx") as archive:
+        assert "xl/media/image1.jpeg" in archive.namelist()
+        assert 'ref="H31"' in archive.read("xl/comments1.xml").decode()
+        assert "$B$1:$Q$36" in archive.read("xl/workbook.xml").decode()
+
+
+def test_format_download_uses_cache(monkeypatch, tmp_path):
+    """Prueba que las descargas repetidas salgan de la caché hasta que la solicitud cambie."""
+    backend = LocalDirectoryBackend(str(tmp_path), 10 ** 7, 3600)
+    monkeypatch.setattr("app.utils.format_cache.get_backend", lambda: backend)
+    renders = []
+
+    def get_layout(*args):
+        renders.append(args)
+        return layout(*args)
+
+    layout = create_format.get_layout
+    monkeypatch.setattr(create_format, "get_layout", get_layout)
+    hits = FORMAT_CACHE_REQUESTS.collect().get(("hit",), 0)
+
+    first = client.get("/api/entrances/requests/1/format")
+    assert first.status_code == 200
+    assert first.headers["content-disposition"] == 'attachment; filename="solicitud_1.xlsx"'
+    assert client.get("/api/entrances/requests/1/format").content == first.content
+    assert len(renders) == 1
+    assert FORMAT_CACHE_REQUESTS.collect().get(("hit",), 0) == hits + 1
+
+    # Editar la solicitud cambia la clave y obliga a generar de nuevo
+    update_request("/api/entrances/requests/1", json={"reason": "Mantenimiento correctivo"})
+    assert client.get("/api/entrances/requests/1/format").status_code == 200
+    assert len(renders) == 2
+    assert client.get("/api/entrances/requests/99/format").status_code == 404
+
+
+def test_authorized_format_download_includes_passes(monkeypatch, tmp_path):
+    """Prueba que la descarga de una solicitud autorizada incluya los pases y use la caché."""
+    backend = LocalDirectoryBackend(str(tmp_path), 10 ** 7, 3600)
+    monkeypatch.setattr("app.utils.format_cache.get_backend", lambda: backend)
+    monkeypatch.setattr(pass_revocations, "_revoked", {})
+    db = TestingSessionLocal()
+    try:
+        entrance_request = db.get(EntranceRequest, 1)
+        entrance_request.status = RequestStatus.authorized
+        db.commit()
+        passes = passes_for_format(entrance_request)
+    finally:
+        db.close()
+    hits = FORMAT_CACHE_REQUESTS.collect().get(("hit",), 0)
+
+    first = client.get("/api/entrances/requests/1/format")
+    assert first.status_code == 200
+    assert client.get("/api/entrances/requests/1/format").content == first.content
+    assert FORMAT_CACHE_REQUESTS.collect().get(("hit",), 0) == hits + 1
+    sheet = load_workbook(io.BytesIO(first.content)).active
+    values = {cell.value for row in sheet.iter_rows() for cell in row}
+    assert set(passes.values()) <= values
+
+
+def test_authorization_resend_reuses_passes(monkeypatch, tmp_path):
+    """Prueba que se reutilicen los pases de la misma versión mientras no estén revocados."""
+    monkeypatch.setattr(
+        "app.utils.format_cache.get_backend",
+        lambda: LocalDirectoryBackend(str(tmp_path), 10 ** 7, 3600),
+    )
+    monkeypatch.setattr(pass_revocations, "_revoked", {})
+    db = TestingSessionLocal()
+    try:
+        entrance_request = db.get(EntranceRequest, 1)
+        passes = passes_for_format(entrance_request)
+        assert sorted(passes) == [1, 2, 3]
+        assert passes_for_format(entrance_request) == passes
+        # Un pase revocado obliga a emitir pases nuevos
+        pass_revocations.revoke(1, datetime.now() + timedelta(days=1))
+        assert passes_for_format(entrance_request) != passes
+        assert decode_pass(passes_for_format(entrance_request)[1]) is not None
+    finally:
+        db.close()
+
+
+def test_cache_backends_are_abstract():
+    """Prueba que las bases de los backends de caché no se puedan instanciar."""
+    for backend in (format_cache.CacheBackend, request_cache.CacheBackend):
+        with pytest.raises(TypeError):
+            backend()
+
+
+def test_format_cache_backends(tmp_path):
+    """Prueba la expiración y el desalojo LRU del directorio local y el backend S3."""
+    backend = LocalDirectoryBackend(str(tmp_path), 250, 3600)
+    for key in ("aa1", "bb2"):
+        backend.put(key, b"x" * 100)
+    old = time.time() - 100
+    os.utime(backend._path("aa1"), (old, old))
+    os.utime(backend._path("bb2"), (old - 10, old))
+    assert backend.get("aa1") == b"x" * 100
+    # Al superar el límite sale la entrada usada hace más tiempo
+    backend.put("cc3", b"x" * 100)
+    assert backend.get("bb2") is None
+    assert backend.get("aa1") is not None and backend.get("cc3") is not None
+    # Las entradas vencidas no se leen y son las primeras en salir
+    expired = time.time() - 7200
+    os.utime(backend._path("cc3"), (time.time(), expired))
+    assert backend.get("cc3") is None
+    backend.put("dd4", b"x" * 100)
+    assert not os.path.exists(backend._path("cc3"))
+    assert backend.get("aa1") is not None
+
+    class MissingKey(Exception):
+        response = {"Error": {"Code": "NoSuchKey"}}
+
+    class FakeS3:
+        """Cliente en memoria con la interfaz de boto3."""
+
+        def __init__(self):
+            self.objects = {}
+
+        def put_object(self, Bucket, Key, Body):
+            self.objects[(Bucket, Key)] = (Body, datetime.now(timezone.utc))
+
+        def get_object(self, Bucket, Key):
+            if (Bucket, Key) not in self.objects:
+                raise MissingKey()
+            body, modified = self.objects[(Bucket, Key)]
+            return {"Body": io.BytesIO(body), "LastModified": modified}
+
+    s3 = FakeS3()
+    backend = S3Backend(s3, "formatos", "formats/", 3600)
+    backend.put("key", b"contenido")
+    assert ("formatos", "formats/key") in s3.objects
+    assert backend.get("key") == b"contenido"
+    assert backend.get("otra") is None
+    s3.objects[("formatos", "formats/key")] = (
+        b"contenido", datetime.now(timezone.utc) - timedelta(hours=2)
+    )
+    assert backend.get("key") is None
+
+
+def test_guest_edits_change_request_etag():
+    """Prueba que editar un invitado embebido cambie el ETag de sus solicitudes."""
+    url = "/api/entrances/requests/1"
+    etag = client.get(url).headers["ETag"]
+    response = client.put("/api/users/guests/1", json={"name": "Invitado Renombrado"})
+    assert response.status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["guests"][0]["name"] == "Invitado Renombrado"
+
+    # La carga masiva actualiza con una sentencia por lote y también cambia la versión
+    etag = response.headers["ETag"]
+    response = client.post("/api/users/guests", json={"guests": [{
+        "document_id": "10002", "name": "Invitado Dos", "eps_id": 1, "arl_id": 2,
+        "company_id": 3, "city_id": 1, "phone_number": "3100000002",
+        "email": "invitado2@contratista.com",
+    }]})
+    assert response.json()["updated_ids"] == [2]
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["guests"][1]["name"] == "Invitado Dos"
+    db = TestingSessionLocal()
+    rosters.save_chunk(db, {"10003": {"id": 3, "document_id": "10003", "name": "Invitado Tres"}})
+    db.close()
+    response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["guests"][2]["name"] == "Invitado Tres"
+
+
+def test_etag_and_optimistic_update(monkeypatch):
+    """Prueba el GET condicional y que el PUT rechace escrituras sobre una versión vieja."""
+    url = "/api/entrances/requests/1"
+    response = client.get(url)
+    assert response.headers["ETag"] == '"1"'
+    assert response.json()["version"] == 1
+    response = client.get(url, headers={"If-None-Match": 'W/"1"'})
+    assert (response.status_code, response.content) == (304, b"")
+
+    assert client.put(url, json={"reason": "Sin versión"}).status_code == 428
+    response = client.put(url, headers={"If-Match": '"7"'}, json={"reason": "Vieja"})
+    assert (response.status_code, response.headers["ETag"]) == (412, '"1"')
+
+    response = client.put(url, headers={"If-Match": '"1"'}, json={"reason": "Nueva"})
+    assert (response.status_code, response.headers["ETag"]) == (200, '"2"')
+    assert client.get(url, headers={"If-None-Match": '"1"'}).status_code == 200
+
+    # Los cambios de invitados y materiales también cambian la versión
+    response = client.put(url, headers={"If-Match": '"2"'}, json={"guests_ids": [1]})
+    assert response.headers["ETag"] == '"3"'
+    db = TestingSessionLocal()
+    db.add(Material(entrance_request_id=1, model="Escalera", quantity=1))
+    db.commit()
+    db.close()
+    assert client.get(url).headers["ETag"] == '"4"'
+    client.post("/api/entrances/requests/transitions", json={
+        "transitions": [{"id": 1, "status": "Rechazado"}]
+    })
+    assert client.get(url).headers["ETag"] == '"5"'
+
+    # Una escritura concurrente entre la lectura y el UPDATE gana y la otra recibe 412
+    def concurrent_write(*args):
+        other = TestingSessionLocal()
+        other.get(EntranceRequest, 1).reason = "Escritura concurrente"
+        other.commit()
+        other.close()
+        return []
+
+    monkeypatch.setattr("app.routers.entrances.check_guest_conflicts", concurrent_write)
+    response = client.put(url, headers={"If-Match": '"5"'}, json={
+        "status": "Pendiente por autorizador", "reason": "Perdida",
+    })
+    assert (response.status_code, response.headers["ETag"]) == (412, '"6"')
+    data = client.get(url).json()
+    assert (data["reason"], data["status"]) == ("Escritura concurrente", "Rechazado")
+
+
+def test_request_detail_cache_invalidation(monkeypatch):
+    """Prueba que el detalle salga de la caché y se invalide con las ediciones."""
+    loads = []
+    load = entrances_router.load_entrance_request_json
+    monkeypatch.setattr(
+        entrances_router, "load_entrance_request_json",
+        lambda db, request_id: loads.append(request_id) or load(db, request_id),
+    )
+    url = "/api/entrances/requests/1"
+    first = client.get(url)
+    assert client.get(url).json() == first.json()
+    assert loads == [1]
+
+    # La edición de un invitado embebido invalida la solicitud
+    client.put("/api/users/guests/2", json={"name": "Invitado renombrado"})
+    data = client.get(url).json()
+    assert "Invitado renombrado" in [guest["name"] for guest in data["guests"]]
+    assert loads == [1, 1]
+
+    # Una solicitud editada en otra sesión cambia de versión y no se sirve la entrada vieja
+    db = TestingSessionLocal()
+    db.get(EntranceRequest, 1).reason = "Cambio directo"
+    db.commit()
+    db.close()
+    response = client.get(url)
+    assert (response.json()["reason"], response.headers["ETag"]) == ("Cambio directo", '"3"')
+    update_request(url, json={"reason": "Cambio por la API"})
+    assert client.get(url).json()["reason"] == "Cambio por la API"
+    assert loads == [1, 1, 1, 1]
+
+
+def test_request_cache_redis_and_stampede(monkeypatch):
+    """Prueba el backend Redis con un cliente en memoria y la protección ante estampidas."""
+
+    class FakeRedis:
+        """Cliente en memoria con la interfaz de redis-py."""
+
+        def __init__(self):
+            self.values = {}
+
+        def get(self, key):
+            return self.values.get(key)
+
+        def set(self, key, value, ex=None, px=None, nx=False):
+            if nx and key in self.values:
+                return None
+            self.values[key] = value
+            return True
+
+        def delete(self, *keys):
+            for key in keys:
+                self.values.pop(key, None)
+
+    fake = FakeRedis()
+    monkeypatch.setattr(
+        request_cache, "get_backend", lambda: request_cache.RedisBackend(fake, 60, 1)
+    )
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(1)
+        return 3, b'{"id": 5}'
+
+    # Los hilos que fallan a la vez esperan la única carga en curso
+    with ThreadPoolExecutor(8) as pool:
+        futures = [
+            pool.submit(request_cache.get_or_load, 5, 3, load) for _ in range(8)
+        ]
+        time.sleep(0.2)
+        release.set()
+        results = [future.result() for future in futures]
+    assert results == [(3, b'{"id": 5}')] * 8
+    assert len(calls) == 1
+    assert fake.values == {"entrance_request:5": b'3\n{"id": 5}'}
+
+    # Si otro worker tiene el candado se espera su entrada en lugar de consultar la base
+    fake.values["entrance_request:6:lock"] = b"1"
+    threading.Timer(0.1, fake.set, ("entrance_request:6", b'4\n{"id": 6}')).start()
+    assert request_cache.get_or_load(6, 4, lambda: pytest.fail("Debía esperar")) == (
+        4, b'{"id": 6}'
+    )
+    # Una entrada de otra versión se recarga
+    assert request_cache.get_or_load(5, 4, lambda: (4, b"nuevo")) == (4, b"nuevo")
+    request_cache.invalidate_requests([5, 6])
+    assert set(fake.values) == {"entrance_request:6:lock"}
+
+
+def test_checkin_authorized_from_index():
+    """Prueba que un invitado autorizado se valide desde el índice en memoria."""
+    response = client.get("/api/entrances/checkin?branch_id=2&document_id=10001")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["authorized"] is True
+    assert data["entrance_request_id"] == 2
+    assert data["source"] == "index"
+
+
+def test_checkin_not_authorized_in_other_branch():
+    """Prueba que la autorización sea solo para la sede de la solicitud."""
+    response = client.get("/api/entrances/checkin?branch_id=1&document_id=10001")
+    assert response.status_code == 200
+    assert response.json()["authorized"] is False
+
+
+def test_checkin_updated_after_status_change():
+    """Prueba que el índice se actualice al rechazar la solicitud."""
+    response = update_request("/api/entrances/requests/2", json={"status": "Rechazado"})
+    assert response.status_code == 200
+    response = client.get("/api/entrances/checkin?branch_id=2&document_id=10001")
+    assert response.json()["authorized"] is False
+
+
+def test_checkin_changes_reach_other_workers():
+    """Prueba que otro worker deje de autorizar una solicitud rechazada o un invitado retirado."""
+    db = TestingSessionLocal()
+    db.add(EntranceRequestGuest(entrance_request_id=2, guest_id=2))
+    db.commit()
+    other_worker = CheckInIndex()
+    other_worker.build(db)
+    assert other_worker.lookup(db, 2, "10002")[1] == "index"
+
+    # Los cambios se hacen en este worker; el otro conserva su índice sin reconstruir
+    update_request("/api/entrances/requests/2", json={"guests_ids": [1]})
+    assert other_worker.lookup(db, 2, "10002") == (None, "database")
+    assert other_worker.lookup(db, 2, "10001")[1] == "index"
+    update_request("/api/entrances/requests/2", json={"status": "Rechazado"})
+    assert other_worker.lookup(db, 2, "10001") == (None, "database")
+    assert (2, "10001") not in other_worker._entries
+    db.close()
+
+
+def test_checkin_falls_back_to_database():
+    """Prueba que un documento fuera del índice se consulte en la base."""
+    db = TestingSessionLocal()
+    db.add(EntranceRequestGuest(entrance_request_id=2, guest_id=2))
+    db.commit()
+    db.close()
+    response = client.get("/api/entrances/checkin?branch_id=2&document_id=10002")
+    data = response.json()
+    assert data["authorized"] is True
+    assert data["source"] == "database"
+    response = client.get("/api/entrances/checkin?branch_id=2&document_id=10002")
+    assert response.json()["source"] == "index"
+
+
+def test_checkin_index_rebuilds_in_background(monkeypatch):
+    """Prueba que al vencer el TTL se responda con el índice actual mientras se reconstruye."""
+    release = threading.Event()
+    original_build = checkin_index.build
+
+    def slow_build(db, now=None):
+        release.wait(5)
+        return original_build(db, now)
+
+    monkeypatch.setattr(checkin_index, "build", slow_build)
+    monkeypatch.setattr(checkin_index, "built_at", 0.0)
+    start = time.monotonic()
+    response = client.get("/api/entrances/checkin?branch_id=2&document_id=10001")
+    assert time.monotonic() - start < 2
+    assert response.json()["source"] == "index"
+    thread = checkin_index._rebuild_thread
+    assert thread.is_alive()
+    # Mientras tanto no se inicia otra reconstrucción
+    assert checkin_index.rebuild_in_background(TestingSessionLocal()) is None
+    release.set()
+    thread.join(5)
+    assert checkin_index.built_at > start
+
+
+def test_sync_snapshot():
+    """Prueba la foto de solicitudes autorizadas de la sede."""
+    response = client.get("/api/entrances/sync?branch_id=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["snapshot"] is True
+    assert [item["id"] for item in data["requests"]] == [2]
+    assert [guest["document_id"] for guest in data["requests"][0]["guests"]] == ["10001"]
+    assert data["removed"] == []
+
+
+def test_sync_deltas_since_watermark(monkeypatch):
+    """Prueba que los cambios posteriores a la marca de agua se retornen como deltas."""
+    monkeypatch.setattr(settings, "SYNC_OVERLAP_SECONDS", 0)
+    watermark = client.get("/api/entrances/sync?branch_id=2").json()["watermark"]
+    response = client.get("/api/entrances/sync", params={"branch_id": 2, "since": watermark})
+    data = response.json()
+    assert data["snapshot"] is False
+    assert data["requests"] == [] and data["removed"] == []
+
+    # Un material nuevo actualiza la solicitud a la que pertenece
+    db = TestingSessionLocal()
+    db.add(Material(entrance_request_id=2, model="Planta", serial="SN3", quantity=1))
+    db.commit()
+    db.close()
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 2, "since": watermark}
+    ).json()
+    assert [item["id"] for item in data["requests"]] == [2]
+    assert data["requests"][0]["materials"][0]["serial"] == "SN3"
+
+    watermark = data["watermark"]
+    update_request("/api/entrances/requests/2", json={"status": "Rechazado"})
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 2, "since": watermark}
+    ).json()
+    assert data["requests"] == []
+    assert data["removed"] == [2]
+
+
+def test_sync_removes_request_moved_to_other_branch(monkeypatch):
+    """Prueba que la sede anterior reciba como eliminada una solicitud trasladada."""
+    monkeypatch.setattr(settings, "SYNC_OVERLAP_SECONDS", 0)
+    watermark = client.get("/api/entrances/sync?branch_id=2").json()["watermark"]
+    response = update_request("/api/entrances/requests/2", json={"branch_id": 1})
+    assert response.status_code == 200
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 2, "since": watermark}
+    ).json()
+    assert data["requests"] == []
+    assert data["removed"] == [2]
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 1, "since": watermark}
+    ).json()
+    assert [item["id"] for item in data["requests"]] == [2]
+
+
+def test_sync_requests_entering_and_leaving_window(monkeypatch):
+    """Prueba que al cambiar el día se envíen las solicitudes que entran o salen de la ventana."""
+    monkeypatch.setattr(settings, "SYNC_OVERLAP_SECONDS", 0)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    long_ago = today - timedelta(days=5)
+    db = TestingSessionLocal()
+    db.add_all([
+        EntranceRequest(
+            id=3, branch_id=2, entry_date=today + timedelta(minutes=30),
+            departure_date=today + timedelta(hours=23), reason="Visita",
+            status=RequestStatus.authorized, creator_id=1, updated_at=long_ago,
+        ),
+        EntranceRequest(
+            id=4, branch_id=2, entry_date=today - timedelta(hours=16),
+            departure_date=today - timedelta(hours=6), reason="Visita",
+            status=RequestStatus.authorized, creator_id=1, updated_at=long_ago,
+        ),
+    ])
+    db.commit()
+    db.close()
+    # La marca de ayer tenía una ventana de un día que terminaba hoy a medianoche
+    since = (today - timedelta(hours=1)).isoformat()
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 2, "since": since}
+    ).json()
+    assert [item["id"] for item in data["requests"]] == [2, 3]
+    assert data["removed"] == [4]
+    # En el mismo día la ventana no cambia y no se repiten
+    data = client.get(
+        "/api/entrances/sync", params={"branch_id": 2, "since": data["watermark"]}
+    ).json()
+    assert data["requests"] == [] and data["removed"] == []
+
+
+def test_entry_pass_verification():
+    """Prueba la emisión y validación de los pases de una solicitud autorizada."""
+    response = client.get("/api/entrances/requests/2/passes")
+    assert response.status_code == 200
+    passes = response.json()
+    assert [item["document_id"] for item in passes] == ["10001"]
+    token = passes[0]["token"]
+
+    data = client.post("/api/entrances/passes/verify", json={"token": token, "branch_id": 2}).json()
+    assert data["valid"] is True
+    assert data["entrance_request_id"] == 2
+    assert data["document_id"] == "10001"
+    data = client.post("/api/entrances/passes/verify", json={"token": token, "branch_id": 1}).json()
+    assert data["reason"] == "wrong_branch"
+    tampered = token.replace(".", "x.", 1)
+    data = client.post("/api/entrances/passes/verify", json={"token": tampered}).json()
+    assert data["valid"] is False
+    assert data["reason"] == "invalid"
+    # Una firma con caracteres que no son ASCII se rechaza en lugar de fallar
+    assert decode_pass("MTox.é") is None
+    response = client.post("/api/entrances/passes/verify", json={"token": "MTox.é"})
+    assert response.status_code == 200
+    assert response.json()["reason"] == "invalid"
+
+
+def test_entry_passes_require_authorization():
+    """Prueba que no se emitan pases de una solicitud pendiente."""
+    response = client.get("/api/entrances/requests/1/passes")
+    assert response.status_code == 409
+
+
+def test_refused_request_revokes_passes():
+    """Prueba que al rechazar la solicitud sus pases queden revocados."""
+    token = client.get("/api/entrances/requests/2/passes").json()[0]["token"]
+    update_request("/api/entrances/requests/2", json={"status": "Rechazado"})
+    data = client.post("/api/entrances/passes/verify", json={"token": token}).json()
+    assert data["valid"] is False
+    assert data["reason"] == "revoked"
+
+
+def test_revocations_reach_other_workers():
+    """Prueba que otro worker cargue desde la base la revocación al quitar un invitado."""
+    db = TestingSessionLocal()
+    db.add(EntranceRequestGuest(entrance_request_id=2, guest_id=2))
+    db.commit()
+    passes = client.get("/api/entrances/requests/2/passes").json()
+    token = next(item["token"] for item in passes if item["document_id"] == "10002")
+    response = update_request("/api/entrances/requests/2", json={"guests_ids": [1]})
+    assert response.status_code == 200
+
+    # La solicitud sigue autorizada, así que solo la tabla de revocaciones lo refleja
+    other_worker = RevocationList()
+    other_worker.load(db)
+    db.close()
+    assert other_worker.is_revoked(decode_pass(token))
+    new_token = client.get("/api/entrances/requests/2/passes").json()[0]["token"]
+    assert not other_worker.is_revoked(decode_pass(new_token))
+
+
+def test_authorization_sends_passes(monkeypatch):
+    """Prueba que el correo y el formato de aprobación incluyan los pases."""
+    sent = {}
+    monkeypatch.setattr(
+        "app.routers.entrances.send_email_with_attachments",
+        lambda **kwargs: sent.update(kwargs)
+    )
+    response = update_request("/api/entrances/requests/1", json={"status": "Autorizado"})
+    assert response.status_code == 200
+    try:
+        ws = load_workbook(sent["file_name"]).active
+    finally:
+        os.remove(sent["file_name"])
+    tokens = [ws.cell(row=row, column=18).value for row in (15, 16, 17)]
+    assert all(token in sent["body"] for token in tokens)
+    data = client.post("/api/entrances/passes/verify", json={"token": tokens[0]}).json()
+    assert data["reason"] == "expired"
+
+
+def test_idempotency_keys_are_scoped_by_user_id():
+    """Prueba que la misma llave de dos usuarios no choque y que se exija un usuario."""
+    payload = {
+        "branch_id": 1,
+        "guests_ids": [1],
+        "entry_date": "2025-03-01T07:00:00",
+        "departure_date": "2025-03-01T17:00:00",
+        "reason": "Inspección",
+        "creator_id": 1,
+        "authorizer_id": 2,
+    }
+    headers = {"Idempotency-Key": "movil-1"}
+    ids = []
+    try:
+        # Tokens con el mismo ``sub`` que solo se distinguen por ``user_id``
+        for user_id in (2, 3):
+            app.dependency_overrides[get_current_user] = lambda user_id=user_id: {
+                "sub": "movil", "user_id": user_id
+            }
+            response = client.post("/api/entrances/requests", json=payload, headers=headers)
+            assert response.status_code == 201
+            assert "Idempotent-Replayed" not in response.headers
+            ids.append(response.json()["id"])
+
+        app.dependency_overrides[get_current_user] = lambda: {"sub": "movil"}
+        response = client.post("/api/entrances/requests", json=payload, headers=headers)
+        assert response.status_code == 403
+        # Sin llave la petición se procesa normalmente
+        response = client.post("/api/entrances/requests", json=payload)
+        assert response.status_code == 201
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    assert ids[0] != ids[1]
+
+
+def test_create_with_idempotency_key(monkeypatch):
+    """Prueba que los reintentos con la misma llave repitan la respuesta sin duplicar."""
+    payload = {
+        "branch_id": 1,
+        "guests_ids": [1],
+        "entry_date": "2025-03-01T07:00:00",
+        "departure_date": "2025-03-01T17:00:00",
+        "reason": "Inspección",
+        "creator_id": 1,
+        "authorizer_id": 2,
+    }
+    headers = {"Idempotency-Key": "movil-1"}
+    first = client.post("/api/entrances/requests", json=payload, headers=headers)
+    assert first.status_code == 201
+    replay = client.post("/api/entrances/requests", json=payload, headers=headers)
+    assert (replay.status_code, replay.json()) == (201, first.json())
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.headers["ETag"] == first.headers["ETag"]
+    response = client.post(
+        "/api/entrances/requests", json={**payload, "reason": "Otra"}, headers=headers
+    )
+    assert response.status_code == 422
+    assert client.get("/api/entrances/requests").json()["total"] == 3
+
+    # Un duplicado concurrente espera a la original y repite su respuesta
+    calls = []
+
+    def slow_conflicts(*args):
+        calls.append(1)
+        time.sleep(0.3)
+        return []
+
+    monkeypatch.setattr("app.routers.entrances.check_guest_conflicts", slow_conflicts)
+    headers = {"Idempotency-Key": "movil-2"}
+    with ThreadPoolExecutor(2) as pool:
+        original = pool.submit(
+            client.post, "/api/entrances/requests", json=payload, headers=headers
+        )
+        time.sleep(0.1)
+        duplicate = pool.submit(
+            client.post, "/api/entrances/requests", json=payload, headers=headers
+        )
+        original, duplicate = original.result(), duplicate.result()
+    assert (original.status_code, duplicate.status_code) == (201, 201)
+    assert duplicate.json()["id"] == original.json()["id"]
+    assert "Idempotent-Replayed" not in original.headers
+    assert len(calls) == 1
+    assert client.get("/api/entrances/requests").json()["total"] == 4
+
+    # Las llaves vencidas se pueden reutilizar
+    db = TestingSessionLocal()
+    db.query(IdempotencyKey).update({"expires_at": datetime(2000, 1, 1)})
+    db.commit()
+    db.close()
+    response = client.post("/api/entrances/requests", json=payload, headers=headers)
+    assert response.json()["id"] != original.json()["id"]
+
+
+def test_create_and_status_change_publish_events(monkeypatch):
+    """Prueba que la creación y el cambio de estado publiquen eventos."""
+    events = []
+    monkeypatch.setattr(broker, "publish", events.append)
+    response = client.post("/api/entrances/requests", json={
+        "branch_id": 1,
+        "guests_ids": [1],
+        "entry_date": "2025-02-01T07:00:00",
+        "departure_date": "2025-02-01T17:00:00",
+        "reason": "Inspección",
+        "creator_id": 1,
+        "authorizer_id": 2,
+        "security_id": 3,
+    })
+    assert response.status_code == 201
+    request_id = response.json()["id"]
+    update_request(f"/api/entrances/requests/{request_id}", json={"reason": "Inspección anual"})
+    update_request(f"/api/entrances/requests/{request_id}", json={"status": "Rechazado"})
+    assert [(event["type"], event["id"]) for event in events] == [
+        ("created", request_id), ("status_changed", request_id)
+    ]
+    assert events[1]["previous_status"] == "Pendiente por autorizador"
+    assert events[1]["authorizer_id"] == 2
+
+
+def test_authorizer_inbox():
+    """Prueba la bandeja de pendientes del autorizador con el total del contador."""
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "auth", "id": 2}
+    try:
+        response = client.get("/api/entrances/inbox/authorizer")
+        counts = client.get("/api/entrances/inbox/counts").json()
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert [item["id"] for item in data["items"]] == [1]
+    assert counts == {"authorizer": 1, "security": 0}
+
+
+def test_pending_counters_follow_status_changes():
+    """Prueba que los contadores cambien con la solicitud en la misma transacción."""
+    update_request("/api/entrances/requests/1", json={"status": "Pendiente por seguridad"})
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "sec", "id": 3}
+    try:
+        counts = client.get("/api/entrances/inbox/counts").json()
+        inbox = client.get("/api/entrances/inbox/security").json()
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    assert counts == {"authorizer": 0, "security": 1}
+    assert [item["id"] for item in inbox["items"]] == [1]
+
+    db = TestingSessionLocal()
+    try:
+        expected = {
+            (counter.user_id, counter.role): counter.count for counter in db.query(PendingCounter)
+        }
+        rebuild_pending_counters(db.connection())
+        db.commit()
+        rebuilt = {
+            (counter.user_id, counter.role): counter.count for counter in db.query(PendingCounter)
+        }
+    finally:
+        db.close()
+    assert {key: count for key, count in expected.items() if count} == rebuilt
+
+
+def test_batch_transitions(monkeypatch):
+    """Prueba el cambio de estado en lote con resultados por solicitud y correo resumen."""
+    sent = []
+    monkeypatch.setattr("app.utils.email.SENDER_EMAIL", "permisos@telefonica.com")
+    monkeypatch.setattr(
+        "app.utils.notifications.send_messages", lambda messages: sent.extend(messages) or 2
+    )
+    response = client.post("/api/entrances/requests/transitions", json={"transitions": [
+        {"id": 1, "status": "Autorizado", "expected_status": "Pendiente por autorizador"},
+        {"id": 2, "status": "Rechazado", "expected_status": "Pendiente por seguridad"},
+        {"id": 1, "status": "Rechazado"},
+        {"id": 99, "status": "Autorizado"},
+    ]})
+    if os.path.exists("output_1.xlsx"):
+        os.remove("output_1.xlsx")
+    assert response.status_code == 200
+    data = response.json()
+    assert [(item["id"], item["result"]) for item in data["results"]] == [
+        (1, "applied"), (2, "conflict"), (1, "duplicated"), (99, "not_found")
+    ]
+    assert data["emails_sent"] == 2
+    assert sorted(message["To"] for message in sent) == [
+        "empleado1@telefonica.com", "empleado2@telefonica.com"
+    ]
+    assert "Solicitud 1" in sent[0].get_body().get_content()
+
+    response = client.get("/api/entrances/requests/1")
+    assert response.json()["status"] == "Autorizado"
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "auth", "id": 2}
+    try:
+        counts = client.get("/api/entrances/inbox/counts").json()
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    assert counts["authorizer"] == 0
+    response = client.get("/api/entrances/checkin?branch_id=1&document_id=10001")
+    assert response.json()["authorized"] is False
+
+
+def test_batch_transitions_report_render_errors(monkeypatch):
+    """Prueba que una falla al generar un formato se reporte sin afectar a las demás solicitudes."""
+    sent = []
+    monkeypatch.setattr("app.utils.email.SENDER_EMAIL", "permisos@telefonica.com")
+    monkeypatch.setattr(
+        "app.utils.notifications.send_messages", lambda messages: sent.extend(messages) or 2
+    )
+    export = notifications.export_entrance_requests_to_excel
+
+    def failing_export(db, request_id, *args, **kwargs):
+        if request_id == 3:
+            raise ValueError("plantilla dañada")
+        return export(db, request_id, *args, **kwargs)
+
+    monkeypatch.setattr(notifications, "export_entrance_requests_to_excel", failing_export)
+    db = TestingSessionLocal()
+    db.add(EntranceRequest(
+        id=3, branch_id=1, entry_date=datetime(2025, 1, 11, 7, 0),
+        departure_date=datetime(2025, 1, 11, 17, 0), reason="Visita",
+        status=RequestStatus.auth_pending, creator_id=1, authorizer_id=2, security_id=3,
+    ))
+    db.commit()
+    db.close()
+    response = client.post("/api/entrances/requests/transitions", json={"transitions": [
+        {"id": 1, "status": "Autorizado"},
+        {"id": 3, "status": "Autorizado"},
+    ]})
+    if os.path.exists("output_1.xlsx"):
+        os.remove("output_1.xlsx")
+    assert response.status_code == 200
+    data = response.json()
+    assert [(item["id"], item["result"]) for item in data["results"]] == [
+        (1, "applied"), (3, "applied")
+    ]
+    assert data["results"][0]["error"] is None
+    assert "plantilla dañada" in data["results"][1]["error"]
+    assert data["emails_sent"] == 2
+    body = sent[0].get_body().get_content()
+    assert "Solicitud 1" in body and "Solicitud 3" not in body
+    assert client.get("/api/entrances/requests/3").json()["status"] == "Autorizado"
+
+
+def test_recurring_requests():
+    """Prueba la creación de las solicitudes de lunes a viernes de dos semanas."""
+    response = client.post("/api/entrances/requests/recurring", json={
+        "request": {
+            "branch_id": 2,
+            "guests_ids": [1, 2],
+            "entry_date": "2025-03-03T07:00:00",
+            "departure_date": "2025-03-03T17:00:00",
+            "reason": "Mantenimiento preventivo",
+            "creator_id": 1,
+            "authorizer_id": 2,
+            "security_id": 3,
+            "materials": [{"model": "Escalera", "quantity": 1}],
+        },
+        "rule": {"weekdays": [0, 1, 2, 3, 4], "until": "2025-03-14"},
+    })
+    assert response.status_code == 201
+    ids = response.json()["ids"]
+    assert len(ids) == 10
+
+    response = client.get(f"/api/entrances/requests/{ids[-1]}")
+    data = response.json()
+    assert data["entry_date"] == "2025-03-14T07:00:00"
+    assert data["departure_date"] == "2025-03-14T17:00:00"
+    assert [guest["id"] for guest in data["guests"]] == [1, 2]
+    assert [material["model"] for material in data["materials"]] == ["Escalera"]
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "auth", "id": 2}
+    try:
+        assert client.get("/api/entrances/inbox/counts").json()["authorizer"] == 11
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+    response = client.get("/api/reports/requests", params={
+        "start": "2025-03-01", "end": "2025-03-31", "group_by": ["branch", "status"],
+    })
+    assert response.json() == [
+        {"branch_id": 2, "status": "Pendiente por autorizador", "count": 10}
+    ]
+
+
+def test_recurring_requests_validate_guests():
+    """Prueba que la regla no cree solicitudes si falta un invitado."""
+    response = client.post("/api/entrances/requests/recurring", json={
+        "request": {
+            "branch_id": 2,
+            "guests_ids": [1, 42],
+            "entry_date": "2025-03-03T07:00:00",
+            "departure_date": "2025-03-03T17:00:00",
+            "reason": "Mantenimiento preventivo",
+            "creator_id": 1,
+            "authorizer_id": 2,
+        },
+        "rule": {"weekdays": [0], "until": "2025-03-31"},
+    })
+    assert response.status_code == 404
+    assert client.get("/api/entrances/requests").json()["total"] == 2
+
+
+def test_create_stores_aware_dates_in_local_time():
+    """Prueba que una ventana con otra zona horaria se guarde en hora local para portería."""
+    now = datetime.now().replace(microsecond=0)
+    offset = timezone(now.astimezone().utcoffset() - timedelta(hours=10))
+    entry = (now - timedelta(hours=1)).astimezone(offset).isoformat()
+    departure = (now + timedelta(hours=1)).astimezone(offset).isoformat()
+    response = client.post("/api/entrances/requests", json={
+        "branch_id": 1,
+        "guests_ids": [3],
+        "entry_date": entry,
+        "departure_date": departure,
+        "reason": "Visita técnica",
+        "status": "Autorizado",
+        "creator_id": 1,
+        "authorizer_id": 2,
+    })
+    assert response.status_code == 201
+    request_id = response.json()["id"]
+    assert response.json()["entry_date"] == (now - timedelta(hours=1)).isoformat()
+
+    data = client.get("/api/entrances/checkin?branch_id=1&document_id=10003").json()
+    assert data["authorized"] is True
+    assert data["entrance_request_id"] == request_id
+    response = client.get("/api/entrances/conflicts", params={
+        "guest_ids": [3], "entry_date": entry, "departure_date": departure, "branch_id": 1,
+    })
+    assert [c["entrance_request_id"] for c in response.json()] == [request_id]
+
+
+def test_create_reports_guest_conflicts():
+    """Prueba que la creación advierta los cruces del invitado con otras solicitudes."""
+    now = datetime.now().replace(microsecond=0)
+    response = client.post("/api/entrances/requests", json={
+        "branch_id": 1,
+        "guests_ids": [1, 3],
+        "entry_date": (now + timedelta(hours=2)).isoformat(),
+        "departure_date": (now + timedelta(hours=12)).isoformat(),
+        "reason": "Visita técnica",
+        "creator_id": 1,
+        "authorizer_id": 2,
+    })
+    assert response.status_code == 201
+    conflicts = response.json()["conflicts"]
+    assert [(c["guest_id"], c["entrance_request_id"]) for c in conflicts] == [(1, 2)]
+    assert conflicts[0]["branch_id"] == 2
+    assert conflicts[0]["same_branch"] is False
+
+    # Una ventana contigua no se cruza
+    response = client.get("/api/entrances/conflicts", params={
+        "guest_ids": [1, 3],
+        "entry_date": (now + timedelta(hours=12)).isoformat(),
+        "departure_date": (now + timedelta(hours=20)).isoformat(),
+        "branch_id": 1,
+        "exclude_id": 2,
+    })
+    assert response.json() == []
+
+    # Una ventana con otra zona horaria se compara en la hora local con que se guardan las fechas
+    offset = timezone(now.astimezone().utcoffset() - timedelta(hours=10))
+    response = client.get("/api/entrances/conflicts", params={
+        "guest_ids": [1],
+        "entry_date": now.astimezone(offset).isoformat(),
+        "departure_date": (now + timedelta(hours=1)).astimezone(offset).isoformat(),
+        "branch_id": 1,
+    })
+    assert [c["entrance_request_id"] for c in response.json()] == [2]
+
+
+def test_guest_conflicts_rejected_by_policy(monkeypatch):
+    """Prueba que la política ``reject`` impida crear la solicitud que se cruza."""
+    monkeypatch.setattr(settings, "GUEST_OVERLAP_POLICY", "reject")
+    response = client.post("/api/entrances/requests", json={
+        "branch_id": 1,
+        "guests_ids": [2],
+        "entry_date": "2025-01-10T12:00:00",
+        "departure_date": "2025-01-10T19:00:00",
+        "reason": "Visita técnica",
+        "creator_id": 1,
+        "authorizer_id": 2,
+    })
+    assert response.status_code == 409
+    conflicts = response.json()["detail"]["conflicts"]
+    assert [(c["guest_id"], c["entrance_request_id"], c["same_branch"]) for c in conflicts] == [
+        (2, 1, True)
+    ]
+    assert client.get("/api/entrances/requests").json()["total"] == 2
+
+
+def test_update_keeps_guest_windows_in_sync():
+    """Prueba que al mover la solicitud se detecten cruces con la nueva ventana."""
+    now = datetime.now().replace(microsecond=0)
+    response = update_request("/api/entrances/requests/1", json={
+        "entry_date": now.isoformat(),
+        "departure_date": (now + timedelta(hours=4)).isoformat(),
+    })
+    assert response.status_code == 200
+    assert [(c["guest_id"], c["entrance_request_id"]) for c in response.json()["conflicts"]] == [
+        (1, 2)
+    ]
+    # La ventana copiada a los invitados sigue a la solicitud
+    response = client.get("/api/entrances/conflicts", params={
+        "guest_ids": [3],
+        "entry_date": (now + timedelta(hours=3)).isoformat(),
+        "departure_date": (now + timedelta(hours=5)).isoformat(),
+        "branch_id": 1,
+    })
+    assert [c["entrance_request_id"] for c in response.json()] == [1]
+
+    # Las solicitudes rechazadas no generan cruces
+    update_request("/api/entrances/requests/2", json={"status": "Rechazado"})
+    response = update_request("/api/entrances/requests/1", json={"reason": "Mantenimiento"})
+    assert response.json()["conflicts"] == []
+    response = update_request("/api/entrances/requests/1", json={"guests_ids": [1, 2]})
+    assert response.json()["conflicts"] == []
+
+
+def test_branch_occupancy():
+    """Prueba la ocupación por hora y por día de las solicitudes autorizadas."""
+    db = TestingSessionLocal()
+    for request_id, entry_hour, departure_hour, status, guest_ids in (
+        (10, 8, 12, RequestStatus.authorized, (1, 2)),
+        (11, 12, 14, RequestStatus.authorized, (3,)),
+        (12, 9, 11, RequestStatus.refused, (3,)),
+    ):
+        db.add(EntranceRequest(
+            id=request_id,
+            branch_id=1,
+            entry_date=datetime(2025, 5, 5, entry_hour),
+            departure_date=datetime(2025, 5, 5, departure_hour),
+            reason="Mantenimiento",
+            status=status,
+            creator_id=1,
+            authorizer_id=2,
+        ))
+        db.add_all([
+            EntranceRequestGuest(entrance_request_id=request_id, guest_id=guest_id)
+            for guest_id in guest_ids
+        ])
+    db.commit()
+    db.close()
+
+    response = client.get("/api/entrances/occupancy", params={
+        "branch_ids": [1, 2], "start": "2025-05-05T00:30:00", "days": 1,
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["start"] == "2025-05-05T00:00:00"
+    assert data["end"] == "2025-05-06T00:00:00"
+    branch, other = data["branches"]
+    assert branch["peak"] == 2
+    # El relevo de las 12:00 no suma los invitados que salen con los que llegan
+    assert [(item["peak"], item["arrivals"]) for item in branch["buckets"][7:15]] == [
+        (0, 0), (2, 2), (2, 0), (2, 0), (2, 0), (1, 1), (1, 0), (0, 0)
+    ]
+    assert (other["branch_id"], other["peak"], len(other["buckets"])) == (2, 0, 24)
+
+    response = client.get("/api/entrances/occupancy", params={
+        "start": "2025-05-05T10:00:00", "days": 2, "bucket": "day",
+    })
+    assert [
+        (branch["branch_id"], [(item["peak"], item["arrivals"]) for item in branch["buckets"]])
+        for branch in response.json()["branches"]
+    ] == [(1, [(2, 3), (0, 0)])]
+
+
+def test_migrate_adds_columns_to_existing_tables(tmp_path):
+    """Prueba que la migración agregue las columnas nuevas a tablas creadas sin ellas."""
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=old_engine)
+    dropped = [
+        ("entrance_requests", "updated_at"),
+        ("entrance_requests", "version"),
+        ("entrance_requests_guests", "updated_at"),
+        ("entrance_requests_guests", "entry_date"),
+        ("entrance_requests_guests", "departure_date"),
+        ("entrance_materials", "updated_at"),
+    ]
+    with old_engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_entrance_requests_branch_updated"))
+        conn.execute(text("DROP INDEX ix_entrance_requests_guests_guest_window"))
+        for table, column in dropped:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text(
+            "INSERT INTO entrance_requests (id, branch_id, entry_date, departure_date, reason,"
+            " status) VALUES (1, 1, '2026-01-01 08:00:00', '2026-01-01 18:00:00', 'Visita',"
+            " 'authorized')"
+        ))
+        conn.execute(text(
+            "INSERT INTO entrance_requests_guests (entrance_request_id, guest_id) VALUES (1, 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO entrance_materials (entrance_request_id, model, quantity)"
+            " VALUES (1, 'Portátil', 1)"
+        ))
+    with old_engine.begin() as conn:
+        added = migrate(conn)
+    assert sorted(added) == sorted(f"{table}.{column}" for table, column in dropped)
+    with old_engine.connect() as conn:
+        request = conn.execute(text("SELECT version, updated_at FROM entrance_requests")).one()
+        link = conn.execute(text(
+            "SELECT entry_date, departure_date, updated_at FROM entrance_requests_guests"
+        )).one()
+        material = conn.execute(text("SELECT updated_at FROM entrance_materials")).one()
+        assert migrate(conn) == []
+        indexes = {index["name"] for index in inspect(conn).get_indexes("entrance_requests")}
+    assert request.version == 1 and request.updated_at
+    assert link.entry_date.startswith("2026-01-01 08:00") and link.updated_at
+    assert material.updated_at
+    assert "ix_entrance_requests_branch_updated" in indexes
+    old_engine.dispose()
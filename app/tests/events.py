@@ -0,0 +1,70 @@
+"""Tests unitarios para la publicación de eventos de solicitudes."""
+import asyncio
+import threading
+
+from app.utils.events import EventHub, MemoryBroker, SQLiteBroker, event_stream
+
+
+class ConnectedRequest:
+    """Emula una petición cuyo cliente sigue conectado."""
+
+    async def is_disconnected(self):
+        return False
+
+
+def test_memory_broker_fans_out_from_other_thread():
+    """Prueba que un evento publicado desde otro hilo llegue a todos los suscriptores."""
+    async def scenario():
+        hub = EventHub()
+        broker = MemoryBroker(hub)
+        first, second = hub.subscribe(), hub.subscribe()
+        thread = threading.Thread(target=broker.publish, args=({"type": "created", "id": 1},))
+        thread.start()
+        thread.join()
+        events = [await first.get(1), await second.get(1)]
+        first.close()
+        second.close()
+        return events, len(hub)
+
+    events, subscribers = asyncio.run(scenario())
+    assert [event["id"] for event in events] == [1, 1]
+    assert events[0]["sequence"] == 1
+    assert subscribers == 0
+
+
+def test_event_stream_applies_filters():
+    """Prueba que el stream solo envíe los eventos de la sede filtrada."""
+    async def scenario():
+        hub = EventHub()
+        broker = MemoryBroker(hub)
+        subscription = hub.subscribe()
+        stream = event_stream(ConnectedRequest(), subscription, {"branch_id": 2})
+        assert await anext(stream) == "retry: 3000\n\n"
+        broker.publish({"type": "created", "id": 1, "branch_id": 1})
+        broker.publish({"type": "status_changed", "id": 2, "branch_id": 2})
+        chunk = await anext(stream)
+        await stream.aclose()
+        return chunk, len(hub)
+
+    chunk, subscribers = asyncio.run(scenario())
+    assert chunk.startswith("id: 2\nevent: status_changed\n")
+    assert '"id": 2' in chunk
+    assert subscribers == 0
+
+
+def test_sqlite_broker_shares_events_between_processes(tmp_path):
+    """Prueba que dos brokers sobre la misma base reciban los mismos eventos."""
+    async def scenario():
+        path = str(tmp_path / "events.db")
+        publisher = SQLiteBroker(EventHub(), path, poll_interval=0.1, retention_seconds=60)
+        hub = EventHub()
+        consumer = SQLiteBroker(hub, path, poll_interval=0.1, retention_seconds=60)
+        subscription = hub.subscribe()
+        publisher.publish({"type": "created", "id": 7})
+        assert consumer.poll() == 1
+        assert consumer.poll() == 0
+        return await subscription.get(1)
+
+    event = asyncio.run(scenario())
+    assert event["id"] == 7
+    assert event["sequence"] == 1
@@ -0,0 +1,122 @@
+"""Tests unitarios para el endpoint de métricas."""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base, get_db
+from app.auth.dependencies import get_current_user
+from app.main import app
+from app.utils.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+# Crear una BD para pruebas
+SQLALCHEMY_DATABASE_URL = "sqlite:///./unit_test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Sobrescribe la función get_db para usar la BD de pruebas."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def override_get_current_user():
+    """Emula la función get_current_user para pruebas."""
+    return {
+        "sub": "testuser",
+        "id": 1,
+        "role": "admin",
+    }
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Crear tablas
+Base.metadata.create_all(bind=engine)
+
+
+def test_metrics_exposition_format():
+    """Prueba que el endpoint exponga la latencia por plantilla de ruta."""
+    client.get("/api/places/departments")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/api/places/departments",'
+        'status="200"}'
+    ) in body
+    assert "# TYPE http_requests_in_flight gauge" in body
+    assert "db_pool_connections" in body
+
+
+def test_metric_subclass_requires_collect():
+    """Prueba que una métrica sin ``collect`` falle al crearse y no al hacer el scrape."""
+    class Incomplete(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incompleta", "Métrica sin collect", registry=Registry())
+
+
+def test_counter_merges_thread_shards():
+    """Prueba que los fragmentos por hilo se combinen al hacer scrape."""
+    counter = Counter("test_thread_shards_total", "Prueba.", ("kind",), registry=Registry())
+    threads = [
+        threading.Thread(target=lambda: [counter.inc(kind="a") for _ in range(100)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.collect() == {("a",): 400.0}
+
+
+def test_registry_merges_worker_snapshots(tmp_path):
+    """Prueba que el scrape combine las instantáneas de otros procesos."""
+    local = Registry(str(tmp_path))
+    histogram = Histogram("test_merge_seconds", "Prueba.", registry=local, buckets=(1.0,))
+    histogram.observe(0.5)
+    # Instantánea de otro worker (pid 1 siempre existe)
+    with open(os.path.join(tmp_path, "1.json"), "w", encoding="utf-8") as f:
+        json.dump({"test_merge_seconds": [[[], [0.0, 2.0, 4.0, 2.0]]]}, f)
+    body = local.render()
+    assert 'test_merge_seconds_bucket{le="1"} 1' in body
+    assert 'test_merge_seconds_bucket{le="+Inf"} 3' in body
+    assert "test_merge_seconds_count 3" in body
+
+
+def test_registry_folds_dead_worker_snapshots(tmp_path):
+    """Prueba que las instantáneas de procesos terminados se sumen al agregado y se borren."""
+    local = Registry(str(tmp_path))
+    counter = Counter("test_fold_total", "Prueba.", ("kind",), registry=local)
+    gauge = Gauge("test_fold_in_flight", "Prueba.", registry=local)
+    counter.inc(kind="a")
+    # Un pid que ya terminó
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    with open(os.path.join(tmp_path, f"{dead.pid}.json"), "w", encoding="utf-8") as f:
+        json.dump({"test_fold_total": [[["a"], 2.0]], "test_fold_in_flight": [[[], 5.0]]}, f)
+    for _ in range(2):
+        body = local.render()
+        assert 'test_fold_total{kind="a"} 3' in body
+        assert "test_fold_in_flight 0" not in body and "test_fold_in_flight 5" not in body
+    assert sorted(os.listdir(tmp_path)) == ["aggregate.json", "aggregate.lock"]
+    gauge.inc()
+    assert "test_fold_in_flight 1" in local.render()
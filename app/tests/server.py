@@ -0,0 +1,97 @@
+"""Tests unitarios para el servidor de producción con varios workers."""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from jose import jwt
+
+from app.config.settings import settings
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(tmp_path, **env) -> tuple[subprocess.Popen, str]:
+    """Inicia ``python -m app.server`` y espera a que responda."""
+    port = free_port()
+    environment = {
+        **os.environ,
+        "DB_HOST": "sqlite",
+        "DB_NAME_LOCAL": str(tmp_path / "server.db"),
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_MAX_REQUESTS_JITTER": "0",
+        **env,
+    }
+    environment.pop("METRICS_DIR", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server"],
+        env=environment,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/metrics", timeout=1)
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise AssertionError(process.communicate()[0])
+
+
+def test_workers_recycle_and_shut_down(tmp_path):
+    """Prueba que los workers se reciclen sin cortar peticiones y que SIGTERM los apague."""
+    process, url = start_server(tmp_path, SERVER_WORKERS="2", SERVER_MAX_REQUESTS="2")
+    try:
+        statuses = []
+        for _ in range(10):
+            statuses.append(httpx.get(f"{url}/metrics", timeout=10).status_code)
+            time.sleep(0.2)
+        assert statuses == [200] * 10
+    finally:
+        process.send_signal(signal.SIGTERM)
+        output = process.communicate(timeout=30)[0]
+    assert process.returncode == 0
+    assert "reemplazándolo" in output
+    assert output.count("Application shutdown complete") >= 2
+
+
+def test_shutdown_ends_event_streams(tmp_path):
+    """Prueba que al apagarse el worker cierre los streams de eventos sin esperar el límite."""
+    process, url = start_server(tmp_path, SERVER_WORKERS="1", SERVER_GRACEFUL_TIMEOUT="60")
+    token = jwt.encode(
+        {"sub": "testuser", "id": 1, "role": "admin",
+         "exp": datetime.now(timezone.utc) + timedelta(minutes=5)},
+        settings.SECRET_KEY, algorithm="HS256",
+    )
+    try:
+        with httpx.stream(
+            "GET", f"{url}/api/entrances/events",
+            headers={"Authorization": f"Bearer {token}"}, timeout=10,
+        ) as response:
+            assert response.status_code == 200
+            chunks = response.iter_text()
+            assert next(chunks).startswith("retry:")
+            start = time.monotonic()
+            process.send_signal(signal.SIGTERM)
+            # El stream termina en lugar de quedarse esperando el siguiente evento
+            for _ in chunks:
+                pass
+        assert process.wait(timeout=20) == 0
+        assert time.monotonic() - start < 20
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.communicate()
@@ -0,0 +1,308 @@
+"""Tests unitarios para los endpoints de usuarios e invitados."""
+import asyncio
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import settings
+from app.db.database import Base, get_db
+from app.auth.dependencies import get_current_user
+from app.models.entrances import EntranceRequestGuest
+from app.models.idempotency import IdempotencyKey
+from app.models.places import Department, Municipality
+from app.models.users import Company, Guest
+from app.main import app
+from app.utils import rosters
+
+# Crear una BD para pruebas
+SQLALCHEMY_DATABASE_URL = "sqlite:///./unit_test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Sobrescribe la función get_db para usar la BD de pruebas."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def override_get_current_user():
+    """Emula la función get_current_user para pruebas."""
+    return {
+        "sub": "testuser",
+        "id": 1,
+        "role": "admin",
+    }
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Crear tablas
+Base.metadata.create_all(bind=engine)
+
+HEADER = ["Documento", "Nombre", "EPS", "ARL", "Empresa", "Municipio", "Teléfono", "Correo"]
+
+
+@pytest.fixture(scope="function", autouse=True)
+def setup_data():
+    """Configura los datos necesarios para las pruebas."""
+    db = TestingSessionLocal()
+    for model in (
+        IdempotencyKey, EntranceRequestGuest, Guest, Company, Municipality, Department
+    ):
+        db.query(model).delete()
+    db.add_all([
+        Department(id=1, name="Antioquia", cod_dane="05"),
+        Department(id=2, name="Tolima", cod_dane="73"),
+        Municipality(id=1, name="Medellín", cod_dane="05001", department_id=1),
+        Municipality(id=2, name="San Luis", cod_dane="05660", department_id=1),
+        Municipality(id=3, name="San Luis", cod_dane="73678", department_id=2),
+        Company(id=1, name="Sura", is_eps=True, is_arl=True),
+        Company(id=2, name="Positiva", is_arl=True),
+        Company(id=3, name="Contratista SAS", nit="900123456"),
+        Guest(
+            id=1, document_id="1001", name="Invitado 1", eps_id=1, arl_id=1, company_id=3,
+            city_id=1, phone_number="3000000001", email="invitado1@correo.com",
+        ),
+    ])
+    db.commit()
+    yield
+    db.close()
+
+
+def test_create_guests_with_idempotency_key():
+    """Prueba que el reintento de la carga de invitados repita la primera respuesta."""
+    guest = {
+        "document_id": "5001", "name": "Invitado", "eps_id": 1, "arl_id": 2, "company_id": 3,
+        "city_id": 1, "phone_number": "3000000005", "email": "invitado5@correo.com",
+    }
+    payload = {"guests": [guest, {**guest, "document_id": "1001", "name": "Invitado Uno"}]}
+    headers = {"Idempotency-Key": "carga-1"}
+    first = client.post("/api/users/guests", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert first.json()["updated_ids"] == [1]
+    with patch("app.routers.users.Guest", side_effect=AssertionError("No debía procesar")):
+        replay = client.post("/api/users/guests", json=payload, headers=headers)
+    assert (replay.json(), replay.headers["Idempotent-Replayed"]) == (first.json(), "true")
+
+    db = TestingSessionLocal()
+    assert db.query(Guest).filter(Guest.document_id == "5001").count() == 1
+    db.close()
+
+
+def test_import_guests_csv():
+    """Prueba la importación de un CSV con altas, actualizaciones y filas con errores."""
+    body = "\n".join([
+        ";".join(HEADER),
+        "1001;Invitado Uno;sura;SURA;Contratista SAS;medellin;300 000 0009;uno@correo.com",
+        "1002;Invitado 2;Sura;Positiva;900123456;05660;3000000002;dos@correo.com",
+        "1003;Invitado 3;Positiva;Sura;Contratista SAS;San Luis;123;tres",
+        "",
+        ";Invitado 4;Sura;Sura;Otra;Medellin;3000000004;cuatro@correo.com",
+    ]).encode("utf-8-sig")
+    response = client.post(
+        "/api/users/guests/import", content=body, headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["inserted"], data["updated"], data["failed"]) == (1, 1, 2)
+    assert data["errors"] == [
+        {"row": 4, "errors": [
+            "EPS 'Positiva' no existe",
+            "Municipio 'San Luis' es ambiguo; use el código DANE",
+            "El teléfono debe tener entre 10 y 15 dígitos",
+            "El correo no es válido",
+        ]},
+        {"row": 6, "errors": [
+            "El campo document_id es obligatorio",
+            "Empresa 'Otra' no existe",
+        ]},
+    ]
+
+    db = TestingSessionLocal()
+    guests = {guest.document_id: guest for guest in db.query(Guest)}
+    assert guests["1001"].name == "Invitado Uno"
+    assert guests["1001"].phone_number == "3000000009"
+    assert (guests["1002"].arl_id, guests["1002"].company_id, guests["1002"].city_id) == (2, 3, 2)
+    db.close()
+
+
+def test_import_guests_xlsx():
+    """Prueba la importación de un libro de Excel con documentos numéricos."""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for number in range(5):
+        sheet.append([
+            2000 + number, f"Invitado {number}", "Sura", "Positiva", "Contratista SAS",
+            "Medellín", 3100000000 + number, f"invitado{number}@correo.com",
+        ])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    response = client.post("/api/users/guests/import", content=buffer.getvalue())
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 5, "updated": 0, "failed": 0, "errors": []}
+
+    db = TestingSessionLocal()
+    guest = db.query(Guest).filter(Guest.document_id == "2004").one()
+    assert guest.phone_number == "3100000004"
+    db.close()
+
+
+def test_import_guests_missing_columns():
+    """Prueba que el encabezado incompleto se rechace."""
+    response = client.post("/api/users/guests/import", content=b"Documento,Nombre\n1,Uno\n")
+    assert response.status_code == 400
+    assert "eps" in response.json()["detail"]
+
+
+def test_ingest_guests_ndjson():
+    """Prueba la ingesta NDJSON por lotes con líneas inválidas."""
+    guest = {
+        "name": "Invitado", "company_id": 3, "eps_id": 1, "arl_id": 2, "city_id": 1,
+        "phone_number": "3000000002", "email": "Invitado@correo.com",
+    }
+    lines = [json.dumps({**guest, "document_id": str(3000 + number)}) for number in range(5)]
+    lines[1] = json.dumps({**guest, "document_id": "1001", "name": "Invitado Uno"})
+    lines[2] = '{"document_id": "3002", '
+    lines[3] = json.dumps({**guest, "document_id": "3003", "eps_id": 2, "email": "x"})
+    body = "\n".join(["", *lines]).encode()
+
+    with patch.object(settings, "ROSTER_CHUNK_SIZE", 2):
+        response = client.post(
+            "/api/users/guests/ingest",
+            content=iter([body[:30], body[30:70], body[70:]]),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["chunk"], r["line"], r["inserted"], r["updated"]) for r in records[:-1]] == [
+        (1, 3, 1, 1), (2, 5, 0, 0), (3, 6, 1, 0),
+    ]
+    assert records[1]["errors"][0]["row"] == 4
+    assert records[1]["errors"][1] == {
+        "row": 5, "errors": ["eps_id 2 no existe", "El correo no es válido"],
+    }
+    assert records[-1] == {"done": True, "lines": 6, "inserted": 2, "updated": 1, "failed": 2}
+
+    db = TestingSessionLocal()
+    assert db.query(Guest).filter(Guest.document_id == "1001").one().name == "Invitado Uno"
+    assert db.query(Guest).filter(Guest.document_id == "3004").one().email == "invitado@correo.com"
+    db.close()
+
+
+def ingest_lines(*numbers: int) -> bytes:
+    """Líneas NDJSON de invitados válidos con los documentos indicados."""
+    guest = {
+        "name": "Invitado", "company_id": 3, "eps_id": 1, "arl_id": 2, "city_id": 1,
+        "phone_number": "3000000002", "email": "invitado@correo.com",
+    }
+    return b"".join(
+        json.dumps({**guest, "document_id": str(number)}).encode() + b"\n" for number in numbers
+    )
+
+
+def call_ingest(receive, sent: list[dict]) -> None:
+    """Llama a la ingesta por ASGI 2.3, como uvicorn, y guarda en ``sent`` las líneas enviadas."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/api/users/guests/ingest", "raw_path": b"",
+        "root_path": "", "query_string": b"", "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/x-ndjson")],
+    }
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            sent.extend(json.loads(line) for line in message["body"].splitlines())
+
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), timeout=10))
+
+
+def test_ingest_streams_progress_while_reading():
+    """Prueba que el avance de cada lote se envíe antes de terminar de leer el cuerpo."""
+    parts = [ingest_lines(4001, 4002), ingest_lines(4003)]
+    sent, sent_before_last_part = [], []
+
+    async def receive():
+        if not parts:
+            # Con el cuerpo completo uvicorn solo responde al desconectarse el cliente
+            await asyncio.sleep(3600)
+        if len(parts) == 1:
+            # El resto del cuerpo llega después de que se haya podido enviar el primer lote
+            for _ in range(100):
+                if sent:
+                    break
+                await asyncio.sleep(0.01)
+            sent_before_last_part.extend(sent)
+        return {"type": "http.request", "body": parts.pop(0), "more_body": bool(parts)}
+
+    with patch.object(settings, "ROSTER_CHUNK_SIZE", 2):
+        call_ingest(receive, sent)
+    assert [record["chunk"] for record in sent_before_last_part] == [1]
+    assert [record.get("chunk") for record in sent] == [1, 2, None]
+    assert sent[-1] == {"done": True, "lines": 3, "inserted": 3, "updated": 0, "failed": 0}
+
+
+def test_ingest_stops_when_client_disconnects():
+    """Prueba que la ingesta se detenga sin guardar más lotes si el cliente se desconecta."""
+    messages = [
+        {"type": "http.request", "body": ingest_lines(4001, 4002), "more_body": True},
+        {"type": "http.disconnect"},
+    ]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Tras desconectarse, uvicorn sigue respondiendo ``http.disconnect``
+        return {"type": "http.disconnect"}
+
+    with patch.object(settings, "ROSTER_CHUNK_SIZE", 2):
+        call_ingest(receive, sent)
+    assert [record.get("chunk") for record in sent] == [1]
+    db = TestingSessionLocal()
+    assert db.query(Guest).filter(Guest.document_id.in_(["4001", "4002"])).count() == 2
+    db.close()
+
+
+def test_ingest_reports_committed_totals_on_error():
+    """Prueba que un error a mitad del cuerpo reporte lo que ya se confirmó."""
+    messages = [
+        {"type": "http.request", "body": ingest_lines(4001, 4002), "more_body": True},
+        {"type": "http.request", "body": b"x" * 64, "more_body": False},
+    ]
+    records = []
+
+    async def receive():
+        if not messages:
+            await asyncio.sleep(3600)
+        return messages.pop(0)
+
+    with patch.object(settings, "ROSTER_CHUNK_SIZE", 2), \
+            patch.object(rosters, "MAX_LINE_BYTES", 32):
+        call_ingest(receive, records)
+    assert records[0]["chunk"] == 1
+    assert records[-1] == {
+        "done": False, "error": "La línea 3 es demasiado larga", "line": 2,
+        "inserted": 2, "updated": 0, "failed": 0,
+    }
+
+
+def test_ingest_guests_requires_ndjson():
+    """Prueba que la ingesta rechace otros tipos de contenido."""
+    response = client.post("/api/users/guests/ingest", json={"guests": []})
+    assert response.status_code == 415
@@ -0,0 +1,276 @@
+"""Control de admisión y descarte de carga según la capacidad del threadpool y del pool de BD.
+
+Cada petición se clasifica por método y ruta en una prioridad: portería (``critical``),
+lecturas, escrituras y rutas pesadas (formatos, exportaciones, cargas masivas y
+reconstrucciones). Se admiten a lo sumo ``ADMISSION_MAX_IN_FLIGHT`` peticiones a la vez (por
+defecto el menor entre ``THREADPOOL_SIZE`` y ``DB_POOL_SIZE + DB_MAX_OVERFLOW``), las pesadas
+ocupan como máximo ``ADMISSION_HEAVY_SHARE`` de esa capacidad y cada ruta de
+``ADMISSION_ROUTE_LIMITS`` tiene su propio límite. Las demás esperan en una cola por prioridad
+de ``ADMISSION_MAX_QUEUE`` puestos durante ``ADMISSION_QUEUE_TIMEOUT`` segundos; si la cola está
+llena una petición desplaza a la de menor prioridad y, si no puede, o si se vence la espera,
+recibe un 503 inmediato con ``Retry-After``.
+
+El estado vive en el event loop del worker, así que no necesita candados; con varios workers
+cada uno aplica los límites por separado sobre su propio threadpool y pool de conexiones.
+"""
+import asyncio
+import heapq
+import itertools
+import re
+import time
+
+from fastapi.responses import JSONResponse
+
+from app.config.settings import settings
+from app.utils.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTIONS
+
+CRITICAL, READ, WRITE, HEAVY = range(4)
+PRIORITY_NAMES = ("critical", "read", "write", "heavy")
+
+# Rutas sin control: el scrape, la documentación y el stream de eventos, que dura horas
+EXEMPT_ROUTES = (
+    ("GET", "/metrics"),
+    ("GET", "/docs"),
+    ("GET", "/redoc"),
+    ("GET", "/openapi.json"),
+    ("GET", "/api/entrances/events"),
+)
+CRITICAL_ROUTES = (
+    ("GET", "/api/entrances/checkin"),
+    ("POST", "/api/entrances/passes/verify"),
+    ("GET", "/api/entrances/sync"),
+)
+HEAVY_ROUTES = (
+    ("GET", "/api/entrances/requests/{request_id}/format"),
+    ("GET", "/api/reports/requests/export"),
+    ("POST", "/api/entrances/requests/transitions"),
+    ("POST", "/api/entrances/requests/recurring"),
+    ("POST", "/api/users/guests"),
+    ("POST", "/api/users/guests/import"),
+    ("POST", "/api/users/guests/ingest"),
+    ("POST", "/api/admin/pending-counters/rebuild"),
+    ("POST", "/api/admin/request-summary/rebuild"),
+)
+
+
+def _compile(path: str) -> re.Pattern:
+    """Convierte la plantilla de una ruta (``/requests/{request_id}``) en una expresión regular."""
+    parts = re.split(r"\{[^/]+\}", path.rstrip("/"))
+    return re.compile("^" + "[^/]+".join(re.escape(part) for part in parts) + "/?$")
+
+
+def _rules(routes) -> list[tuple[str, re.Pattern, str]]:
+    return [(method, _compile(path), f"{method} {path}") for method, path in routes]
+
+
+def parse_route_limits(value: str) -> dict[str, int]:
+    """Lee ``ADMISSION_ROUTE_LIMITS``: ``"GET /api/reports/requests/export=2,..."``."""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        route, _, limit = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        limits[f"{method.upper()} {path.strip()}"] = int(limit)
+    return limits
+
+
+class RouteClassifier:
+    """Asigna la prioridad y la ruta con límite propio de cada petición."""
+
+    def __init__(self, route_limits: dict[str, int]):
+        self.exempt = _rules(EXEMPT_ROUTES)
+        self.critical = _rules(CRITICAL_ROUTES)
+        self.heavy = _rules(HEAVY_ROUTES)
+        self.limited = _rules(route.split(" ", 1) for route in route_limits)
+
+    @staticmethod
+    def _match(rules, method: str, path: str) -> str | None:
+        for rule_method, pattern, route in rules:
+            if rule_method == method and pattern.match(path):
+                return route
+        return None
+
+    def classify(self, method: str, path: str) -> tuple[int | None, str | None]:
+        """Retorna la prioridad (``None`` si la ruta no pasa por el control) y la ruta limitada."""
+        method = "GET" if method == "HEAD" else method
+        if self._match(self.exempt, method, path):
+            return None, None
+        route = self._match(self.limited, method, path)
+        if self._match(self.critical, method, path):
+            return CRITICAL, route
+        if self._match(self.heavy, method, path):
+            return HEAVY, route
+        return (READ if method == "GET" else WRITE), route
+
+
+class AdmissionController:
+    """Semáforo con cola por prioridad, límite para las rutas pesadas y límites por ruta."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        heavy_limit: int,
+        route_limits: dict[str, int] | None = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.heavy_limit = heavy_limit
+        self.route_limits = route_limits or {}
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self.route_in_flight: dict[str, int] = {}
+        # (prioridad, orden de llegada, ruta, futuro que se resuelve al admitir o desplazar)
+        self._waiters: list[tuple[int, int, str | None, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _fits(self, priority: int, route: str | None) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        if priority == HEAVY and self.heavy_in_flight >= self.heavy_limit:
+            return False
+        limit = self.route_limits.get(route)
+        return limit is None or self.route_in_flight.get(route, 0) < limit
+
+    def _admit(self, priority: int, route: str | None) -> None:
+        self.in_flight += 1
+        if priority == HEAVY:
+            self.heavy_in_flight += 1
+        if route in self.route_limits:
+            self.route_in_flight[route] = self.route_in_flight.get(route, 0) + 1
+
+    def _wake(self) -> None:
+        """Admite, en orden de prioridad, a los que esperan y ya caben."""
+        admitted = False
+        for waiter in sorted(self._waiters):
+            if self.in_flight >= self.max_in_flight:
+                break
+            priority, _, route, future = waiter
+            if self._fits(priority, route):
+                self._admit(priority, route)
+                future.set_result(True)
+                self._waiters.remove(waiter)
+                admitted = True
+        if admitted:
+            heapq.heapify(self._waiters)
+
+    def _abandon(self, waiter) -> None:
+        """Saca de la cola a quien dejó de esperar, devolviendo el cupo si alcanzó a recibirlo."""
+        priority, _, route, future = waiter
+        if future.done():
+            if future.result():
+                self.release(priority, route)
+            return
+        future.cancel()
+        self._waiters.remove(waiter)
+        heapq.heapify(self._waiters)
+
+    async def acquire(self, priority: int, route: str | None = None) -> str | None:
+        """Espera un cupo; retorna ``None`` al ser admitida o el motivo del rechazo.
+
+        Una petición que sale de aquí con ``None`` debe llamar a ``release``.
+        """
+        # Tras cada liberación ``_wake`` ya admitió a todos los que cabían, así que quien cabe
+        # ahora no se adelanta a nadie que pudiera pasar
+        if self._fits(priority, route):
+            self._admit(priority, route)
+            return None
+        if self.max_queue <= 0 or self.queue_timeout <= 0:
+            return "queue_full"
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                return "queue_full"
+            # La cola llena descarta primero a la petición de menor prioridad
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[3].set_result(False)
+
+        waiter = (
+            priority, next(self._sequence), route, asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait((waiter[3],), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if waiter[3].done():
+            return None if waiter[3].result() else "queue_full"
+        self._abandon(waiter)
+        return "timeout"
+
+    def release(self, priority: int, route: str | None = None) -> None:
+        """Devuelve el cupo y admite a los siguientes en la cola."""
+        self.in_flight -= 1
+        if priority == HEAVY:
+            self.heavy_in_flight -= 1
+        if route in self.route_limits:
+            self.route_in_flight[route] -= 1
+        self._wake()
+
+
+def max_in_flight() -> int:
+    """Capacidad global: la configurada o la menor entre el threadpool y el pool de BD."""
+    if settings.ADMISSION_MAX_IN_FLIGHT > 0:
+        return settings.ADMISSION_MAX_IN_FLIGHT
+    return max(1, min(settings.THREADPOOL_SIZE, settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW))
+
+
+def build_controller() -> AdmissionController:
+    """Construye el controlador con los límites configurados."""
+    capacity = max_in_flight()
+    return AdmissionController(
+        max_in_flight=capacity,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        heavy_limit=max(1, int(capacity * settings.ADMISSION_HEAVY_SHARE)),
+        route_limits=parse_route_limits(settings.ADMISSION_ROUTE_LIMITS),
+    )
+
+
+admission_controller = build_controller()
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI que admite, encola o rechaza con 503 cada petición HTTP."""
+
+    def __init__(self, app, controller: AdmissionController | None = None):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.classifier = RouteClassifier(self.controller.route_limits)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority, route = self.classifier.classify(scope["method"], scope["path"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        reason = await self.controller.acquire(priority, route)
+        ADMISSION_QUEUE_WAIT.observe(
+            time.perf_counter() - start, priority=PRIORITY_NAMES[priority]
+        )
+        if reason is not None:
+            ADMISSION_REJECTIONS.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+            response = JSONResponse(
+                {"detail": "El servidor está saturado, intenta de nuevo en unos segundos"},
+                status_code=503,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, route)
@@ -0,0 +1,212 @@
+"""Índice en memoria de los invitados autorizados para el control en portería.
+
+El índice guarda, por ``(branch_id, document_id)``, las ventanas de ingreso de las
+solicitudes autorizadas que siguen vigentes o empiezan dentro de
+``CHECKIN_INDEX_HORIZON_HOURS``. Se construye al iniciar la aplicación, se actualiza
+cuando una solicitud cambia y se reconstruye cada ``CHECKIN_INDEX_TTL_SECONDS`` para
+recoger las solicitudes nuevas de otros workers. La reconstrucción corre en un hilo aparte y
+las consultas siguen usando el índice anterior hasta que el nuevo lo reemplaza.
+
+El índice solo elige las solicitudes candidatas: cada respuesta positiva se confirma con una
+consulta por llave primaria, porque otro worker pudo rechazar la solicitud, cambiar su
+ventana o quitar al invitado. Si la confirmación falla o el documento no está en el índice se
+consulta la base de datos.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.settings import settings
+from app.models.entrances import EntranceRequest, EntranceRequestGuest, RequestStatus
+from app.models.users import Guest
+
+logger = logging.getLogger(__name__)
+
+
+class CheckInEntry(NamedTuple):
+    """Ventana de ingreso autorizada de un invitado en una sede."""
+    entrance_request_id: int
+    guest_id: int
+    entry_date: datetime
+    departure_date: datetime
+
+
+def _authorized_query(db: Session):
+    return (
+        db.query(
+            EntranceRequest.branch_id,
+            Guest.document_id,
+            EntranceRequest.id,
+            Guest.id,
+            EntranceRequest.entry_date,
+            EntranceRequest.departure_date,
+        )
+        .join(EntranceRequestGuest, EntranceRequestGuest.entrance_request_id == EntranceRequest.id)
+        .join(Guest, Guest.id == EntranceRequestGuest.guest_id)
+        .filter(EntranceRequest.status == RequestStatus.authorized)
+    )
+
+
+class CheckInIndex:
+    """Índice de ventanas autorizadas por sede y documento."""
+
+    def __init__(self):
+        self._entries: dict[tuple[int, str], tuple[CheckInEntry, ...]] = {}
+        self._keys_by_request: dict[int, set[tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_thread: threading.Thread | None = None
+        # Solicitudes actualizadas mientras se construye el índice; se vuelven a leer al final
+        self._building = False
+        self._touched: set[int] = set()
+        self.built_at = 0.0
+
+    def _add(self, key: tuple[int, str], entry: CheckInEntry) -> None:
+        self._entries[key] = self._entries.get(key, ()) + (entry,)
+        self._keys_by_request.setdefault(entry.entrance_request_id, set()).add(key)
+
+    def _remove_request(self, request_id: int) -> None:
+        for key in self._keys_by_request.pop(request_id, ()):
+            remaining = tuple(
+                entry for entry in self._entries.get(key, ())
+                if entry.entrance_request_id != request_id
+            )
+            if remaining:
+                self._entries[key] = remaining
+            else:
+                self._entries.pop(key, None)
+
+    def build(self, db: Session, now: datetime | None = None) -> int:
+        """Reconstruye el índice completo y retorna la cantidad de entradas."""
+        now = now or datetime.now()
+        horizon = now + timedelta(hours=settings.CHECKIN_INDEX_HORIZON_HOURS)
+        with self._lock:
+            self._building = True
+            self._touched = set()
+        try:
+            rows = _authorized_query(db).filter(
+                EntranceRequest.departure_date >= now,
+                EntranceRequest.entry_date <= horizon,
+            ).all()
+        except BaseException:
+            with self._lock:
+                self._building = False
+            raise
+        entries: dict[tuple[int, str], tuple[CheckInEntry, ...]] = {}
+        keys_by_request: dict[int, set[tuple[int, str]]] = {}
+        for branch_id, document_id, request_id, guest_id, entry_date, departure_date in rows:
+            key = (branch_id, document_id)
+            entries[key] = entries.get(key, ()) + (
+                CheckInEntry(request_id, guest_id, entry_date, departure_date),
+            )
+            keys_by_request.setdefault(request_id, set()).add(key)
+        with self._lock:
+            self._entries = entries
+            self._keys_by_request = keys_by_request
+            self.built_at = time.monotonic()
+            self._building = False
+            touched = list(self._touched)
+        # Los cambios que llegaron después de la consulta no están en el índice nuevo
+        self.refresh_requests(db, touched)
+        return len(rows)
+
+    def _rebuild(self, make_session: sessionmaker) -> None:
+        """Reconstruye el índice con su propia sesión; corre en un hilo aparte."""
+        db = make_session()
+        try:
+            self.build(db)
+        except SQLAlchemyError as e:
+            # Se reintenta tras otro TTL; mientras tanto se sigue usando el índice anterior
+            logger.warning(f"No fue posible reconstruir el índice de portería: {e}")
+            self.built_at = time.monotonic()
+        finally:
+            db.close()
+            self._rebuild_lock.release()
+
+    def rebuild_in_background(self, db: Session) -> threading.Thread | None:
+        """Inicia la reconstrucción si no hay otra en curso; retorna el hilo iniciado."""
+        if not self._rebuild_lock.acquire(blocking=False):
+            return None
+        # La sesión de la petición no se comparte entre hilos; se abre otra sobre el mismo motor
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild, args=(sessionmaker(bind=db.get_bind()),), daemon=True
+        )
+        self._rebuild_thread.start()
+        return self._rebuild_thread
+
+    def refresh_request(self, db: Session, request_id: int) -> None:
+        """Actualiza las entradas de una solicitud tras un cambio de estado o invitados."""
+        self.refresh_requests(db, [request_id])
+
+    def refresh_requests(self, db: Session, request_ids: list[int]) -> None:
+        """Actualiza las entradas de varias solicitudes con una sola consulta."""
+        if not request_ids:
+            return
+        rows = _authorized_query(db).filter(EntranceRequest.id.in_(request_ids)).all()
+        with self._lock:
+            if self._building:
+                self._touched.update(request_ids)
+            for request_id in request_ids:
+                self._remove_request(request_id)
+            for branch_id, document_id, request_id, guest_id, entry_date, departure_date in rows:
+                self._add(
+                    (branch_id, document_id),
+                    CheckInEntry(request_id, guest_id, entry_date, departure_date),
+                )
+
+    def refresh_guest(self, db: Session, guest_id: int) -> None:
+        """Actualiza las solicitudes indexadas de un invitado (p. ej. si cambia su documento)."""
+        request_ids = {
+            entry.entrance_request_id
+            for entries in list(self._entries.values())
+            for entry in entries
+            if entry.guest_id == guest_id
+        }
+        for request_id in request_ids:
+            self.refresh_request(db, request_id)
+
+    def lookup(
+        self, db: Session, branch_id: int, document_id: str, now: datetime | None = None
+    ) -> tuple[CheckInEntry | None, str]:
+        """Busca la ventana vigente del documento en la sede.
+
+        Retorna la entrada (o ``None``) y la fuente de la respuesta: ``index`` o ``database``.
+        """
+        now = now or datetime.now()
+        if time.monotonic() - self.built_at > settings.CHECKIN_INDEX_TTL_SECONDS:
+            # Esta consulta y las siguientes responden con el índice actual hasta el reemplazo
+            self.rebuild_in_background(db)
+        current = _authorized_query(db).filter(
+            EntranceRequest.branch_id == branch_id,
+            Guest.document_id == document_id,
+            EntranceRequest.entry_date <= now,
+            EntranceRequest.departure_date >= now,
+        )
+        candidates = [
+            entry.entrance_request_id
+            for entry in self._entries.get((branch_id, document_id), ())
+            if entry.entry_date <= now <= entry.departure_date
+        ]
+        if candidates:
+            # Otro worker pudo cambiar la solicitud; se confirma por llave primaria
+            row = current.filter(EntranceRequest.id.in_(candidates)).first()
+            if row is not None:
+                return CheckInEntry(*row[2:]), "index"
+            self.refresh_requests(db, candidates)
+
+        row = current.first()
+        if row is None:
+            return None, "database"
+        entry = CheckInEntry(*row[2:])
+        with self._lock:
+            if entry not in self._entries.get((branch_id, document_id), ()):
+                self._add((branch_id, document_id), entry)
+        return entry, "database"
+
+
+checkin_index = CheckInIndex()
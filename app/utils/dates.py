@@ -0,0 +1,9 @@
+"""Conversión de las fechas recibidas a la hora local sin zona con que se guardan."""
+from datetime import datetime
+
+
+def to_local_naive(value: datetime) -> datetime:
+    """Convierte una fecha con zona horaria a la hora local y le quita la zona."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
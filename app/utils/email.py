@@ -2,11 +2,14 @@
 import os
 import smtplib
 import logging
+import time
 from email.message import EmailMessage
 from email.mime.application import MIMEApplication
 from email.utils import formataddr
+from html import escape
 
 from app.config.settings import settings
+from app.utils.metrics import EMAIL_SEND_DURATION, EMAIL_SEND_FAILURES
 
 logger = logging.getLogger(__name__)
 ATTACH_FILE_TYPE = ['pdf']
@@ -29,9 +32,70 @@ def allowed_file(filename: str, extensions=ATTACH_FILE_TYPE) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
 
 
+def _passes_table(guests: list[tuple[str, str, str]]) -> str:
+    rows = "".join(
+        f"<tr><td>{escape(name)}</td><td>{escape(document_id)}</td>"
+        f"<td><code>{escape(token)}</code></td></tr>"
+        for name, document_id, token in guests
+    )
+    return f"<table><tr><th>Nombre</th><th>Documento</th><th>Pase</th></tr>{rows}</table>"
+
+
+def build_approval_body(guests: list[tuple[str, str, str]]) -> str:
+    """Arma el cuerpo del correo de aprobación con el pase de cada invitado.
+
+    :param guests: tuplas de nombre, documento y pase de cada invitado
+    :return: cuerpo HTML del correo
+    """
+    return f"{BODY}<p>Pases de ingreso para presentar en portería:</p>{_passes_table(guests)}"
+
+
+def build_digest_body(requests: list[tuple[str, list[tuple[str, str, str]]]]) -> str:
+    """Arma el cuerpo del correo que resume varias solicitudes aprobadas.
+
+    :param requests: tuplas de título de la solicitud y pases de sus invitados
+    :return: cuerpo HTML del correo
+    """
+    sections = "".join(
+        f"<h4>{escape(title)}</h4>{_passes_table(guests)}" for title, guests in requests
+    )
+    return (
+        "<p>Estimado usuario, los siguientes permisos de ingreso han sido aprobados.</p>"
+        f"{sections}"
+    )
+
+
+def build_message(
+    file_names: list[str],
+    recipients: list | str,
+    body: str = BODY,
+    subject: str = SUBJECT,
+) -> EmailMessage:
+    """Arma un correo HTML con los archivos adjuntos permitidos."""
+    if isinstance(recipients, list):
+        recipients = ', '.join(recipients)
+    msg = EmailMessage()
+    msg['From'] = formataddr((SENDER_NAME, SENDER_EMAIL))
+    msg['To'] = recipients
+    msg['Subject'] = subject
+
+    # Format the email body to be sent as HTML
+    msg.add_alternative(body, subtype="html")
+    # Attach files from the specified directory
+    for file_name in file_names:
+        if os.path.isfile(file_name) and allowed_file(file_name):
+            with open(file_name, 'rb') as f:
+                content = f.read()
+                part = MIMEApplication(content, _subtype=ATTACH_FILE_TYPE[-1])
+                part.add_header('Content-Disposition', 'attachment', filename=file_name)
+                msg.attach(part)
+    return msg
+
+
 def send_email_with_attachments(
     file_name: str,
     recipients: list | str,
+    body: str = BODY,
 ) -> bool:
     """
     Send an email with HTML body and attached files
@@ -39,34 +103,49 @@ def send_email_with_attachments(
     Args:
         recipients (list): List of recipients.
         dir_files (str): attached files path.
+        body (str): HTML body of the email.
 
     Returns:
         dict: Email service response.
     """
     try:
-        if isinstance(recipients, list):
-            recipients = ', '.join(recipients)
-        msg = EmailMessage()
-        msg['From'] = formataddr((SENDER_NAME, SENDER_EMAIL))
-        msg['To'] = recipients
-        msg['Subject'] = SUBJECT
-
-        # Format the email body to be sent as HTML
-        msg.add_alternative(BODY, subtype="html")
-        # Attach files from the specified directory
-        if os.path.isfile(file_name) and allowed_file(file_name):
-            with open(file_name, 'rb') as f:
-                content = f.read()
-                part = MIMEApplication(content, _subtype=ATTACH_FILE_TYPE[-1])
-                part.add_header('Content-Disposition', 'attachment', filename=file_name)
-                msg.attach(part)
+        msg = build_message([file_name], recipients, body)
 
         # Send the email
+        start = time.perf_counter()
         with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as s:
             s.send_message(msg)
+        EMAIL_SEND_DURATION.observe(time.perf_counter() - start)
         logger.info('Correo electrónico enviado correctamente')
         return True
 
     except TimeoutError as e:
+        EMAIL_SEND_FAILURES.inc(reason="timeout")
         logger.error(f"Error al enviar correo: {e}")
         return False
+    except Exception:
+        EMAIL_SEND_FAILURES.inc(reason="error")
+        raise
+
+
+def send_messages(messages: list[EmailMessage]) -> int:
+    """Envía varios correos por una sola sesión SMTP y retorna cuántos se enviaron.
+
+    Un error con un correo no detiene el envío de los demás.
+    """
+    if not messages:
+        return 0
+    sent = 0
+    with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as s:
+        for msg in messages:
+            start = time.perf_counter()
+            try:
+                s.send_message(msg)
+            except smtplib.SMTPException as e:
+                EMAIL_SEND_FAILURES.inc(reason="error")
+                logger.error(f"Error al enviar correo a {msg['To']}: {e}")
+                continue
+            EMAIL_SEND_DURATION.observe(time.perf_counter() - start)
+            sent += 1
+    logger.info(f'{sent} correos electrónicos enviados en una sesión SMTP')
+    return sent
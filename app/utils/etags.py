@@ -0,0 +1,28 @@
+"""Etiquetas de entidad (ETag) a partir de la versión de un recurso."""
+
+
+def entity_tag(version: int) -> str:
+    """ETag fuerte de la versión indicada."""
+    return f'"{version}"'
+
+
+def etag_matches(header: str | None, version: int, weak: bool = False) -> bool:
+    """Indica si la versión coincide con alguna etiqueta de ``If-Match`` o ``If-None-Match``.
+
+    ``If-Match`` usa la comparación fuerte (una etiqueta débil nunca coincide) e
+    ``If-None-Match`` la débil (se ignora el prefijo ``W/``).
+    """
+    if not header:
+        return False
+    current = entity_tag(version)
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == current:
+            return True
+    return False
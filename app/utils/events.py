@@ -0,0 +1,264 @@
+"""Publicación de eventos de solicitudes de ingreso para los tableros en vivo.
+
+Los handlers publican los eventos en el broker configurado con ``EVENT_BROKER`` después
+de confirmar la transacción. Cada proceso reparte los eventos a sus suscriptores a través
+de un ``EventHub`` local:
+
+- ``memory``: los eventos solo llegan a los suscriptores del mismo proceso.
+- ``sqlite``: los eventos se guardan en la base SQLite ``EVENT_BROKER_PATH`` y un hilo de
+  cada proceso la consulta cada ``EVENT_POLL_INTERVAL`` segundos, de modo que varios
+  workers del mismo servidor reciben los mismos eventos.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    insert,
+    select
+)
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config.settings import settings
+from app.models.entrances import EntranceRequest
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Cola de eventos de un suscriptor, atada al event loop que la creó."""
+
+    def __init__(self, hub: "EventHub", maxsize: int):
+        self._hub = hub
+        self._loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def _put(self, event: dict) -> None:
+        if self.queue.full():
+            # Un suscriptor lento pierde los eventos más antiguos
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: dict) -> None:
+        """Entrega el evento desde cualquier hilo."""
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Espera el siguiente evento, o retorna ``None`` si vence ``timeout`` o se termina."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def end(self) -> None:
+        """Termina el stream de la suscripción desde cualquier hilo."""
+        self._loop.call_soon_threadsafe(self._end)
+
+    def _end(self) -> None:
+        self.closed = True
+        # Despierta al stream que espera el siguiente evento
+        self._put(None)
+
+    def close(self) -> None:
+        """Cancela la suscripción."""
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """Reparte los eventos a los suscriptores del proceso."""
+
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, maxsize: int = 100) -> Subscription:
+        """Crea una suscripción; debe llamarse dentro del event loop."""
+        subscription = Subscription(self, maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Elimina una suscripción."""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def dispatch(self, event: dict) -> None:
+        """Entrega el evento a todos los suscriptores."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # El event loop del suscriptor ya se cerró
+                self.unsubscribe(subscription)
+
+    def close_all(self) -> None:
+        """Termina los streams de todos los suscriptores, p. ej. al apagar el worker."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.end()
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+
+class MemoryBroker:
+    """Broker en memoria para un solo proceso."""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict) -> None:
+        """Publica un evento a los suscriptores del proceso."""
+        with self._lock:
+            self._sequence += 1
+            event = {**event, "sequence": self._sequence}
+        self.hub.dispatch(event)
+
+    def start(self) -> None:
+        """No requiere preparación."""
+
+
+class SQLiteBroker:
+    """Broker sobre una base SQLite compartida por los workers del servidor."""
+
+    def __init__(self, hub: EventHub, path: str, poll_interval: float, retention_seconds: int):
+        self.hub = hub
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.engine = create_engine(
+            f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 5}
+        )
+        metadata = MetaData()
+        self.table = Table(
+            "entrance_events",
+            metadata,
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            Column("created_at", Integer, nullable=False, index=True),
+            Column("payload", String, nullable=False),
+        )
+        metadata.create_all(self.engine)
+        self._last_id = 0
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict) -> None:
+        """Guarda el evento; los hilos de sondeo lo reparten en cada proceso."""
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table).values(
+                created_at=int(time.time()), payload=json.dumps(event)
+            ))
+
+    def start(self) -> None:
+        """Inicia el hilo de sondeo desde el último evento existente."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            with self.engine.connect() as conn:
+                self._last_id = conn.execute(select(self.table.c.id).order_by(
+                    self.table.c.id.desc()
+                ).limit(1)).scalar() or 0
+            self._thread = threading.Thread(target=self._poll_forever, daemon=True)
+            self._thread.start()
+
+    def poll(self) -> int:
+        """Reparte los eventos nuevos y retorna cuántos se encontraron."""
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                select(self.table.c.id, self.table.c.payload)
+                .where(self.table.c.id > self._last_id)
+                .order_by(self.table.c.id)
+            ).all()
+            conn.execute(delete(self.table).where(
+                self.table.c.created_at < int(time.time()) - self.retention_seconds
+            ))
+        for event_id, payload in rows:
+            self._last_id = event_id
+            self.hub.dispatch({**json.loads(payload), "sequence": event_id})
+        return len(rows)
+
+    def _poll_forever(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except SQLAlchemyError as e:
+                logger.warning(f"No fue posible consultar los eventos: {e}")
+            time.sleep(self.poll_interval)
+
+
+hub = EventHub()
+
+
+def create_broker():
+    """Crea el broker configurado en ``EVENT_BROKER``."""
+    if settings.EVENT_BROKER == "sqlite":
+        return SQLiteBroker(
+            hub, settings.EVENT_BROKER_PATH, settings.EVENT_POLL_INTERVAL,
+            settings.EVENT_RETENTION_SECONDS
+        )
+    return MemoryBroker(hub)
+
+
+broker = create_broker()
+
+
+def publish_request_event(
+    event_type: str, entrance_request: EntranceRequest, previous_status=None
+) -> None:
+    """Publica un evento de la solicitud sin afectar la respuesta si el broker falla."""
+    event = {
+        "type": event_type,
+        "id": entrance_request.id,
+        "branch_id": entrance_request.branch_id,
+        "status": entrance_request.status.value if entrance_request.status else None,
+        "previous_status": previous_status.value if previous_status else None,
+        "creator_id": entrance_request.creator_id,
+        "authorizer_id": entrance_request.authorizer_id,
+        "security_id": entrance_request.security_id,
+        "timestamp": datetime.now().isoformat(),
+    }
+    try:
+        broker.publish(event)
+    except SQLAlchemyError as e:
+        logger.warning(f"No fue posible publicar el evento de la solicitud: {e}")
+
+
+def format_event(event: dict) -> str:
+    """Serializa un evento en el formato de Server-Sent Events."""
+    return f"id: {event['sequence']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(request, subscription: Subscription, filters: dict):
+    """Genera los eventos que cumplen los filtros hasta que el cliente se desconecta."""
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            event = await subscription.get(settings.EVENT_HEARTBEAT_SECONDS)
+            if event is None and subscription.closed:
+                break
+            if event is None:
+                # Comentario para mantener abierta la conexión a través de proxies
+                yield ": keep-alive\n\n"
+            elif all(event.get(key) == value for key, value in filters.items()):
+                yield format_event(event)
+    finally:
+        subscription.close()
@@ -0,0 +1,144 @@
+"""Exportación masiva de solicitudes de ingreso en CSV o XLSX.
+
+Las solicitudes se recorren con ``yield_per`` (cursor del lado del servidor en PostgreSQL)
+en lotes de ``EXPORT_BATCH_SIZE``; por cada lote se consultan sus invitados y materiales, y
+las filas se escriben a medida que se leen. El CSV se envía lote a lote; el XLSX se arma
+con el modo de solo escritura de openpyxl en un archivo temporal que luego se envía por
+partes. En ambos casos la memoria no depende de la cantidad de solicitudes.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, time
+from typing import Iterator
+
+from openpyxl import Workbook
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from app.config.settings import settings
+from app.models.branches import Branch
+from app.models.entrances import EntranceRequest, EntranceRequestGuest, Material, RequestStatus
+from app.models.users import Company, Guest, User
+
+HEADERS = [
+    "Solicitud", "Código sede", "Sede", "Ingreso", "Salida", "Estado", "Motivo", "Solicitante",
+    "Autorizador", "Documento invitado", "Invitado", "Empresa", "Materiales",
+]
+CHUNK_SIZE = 64 * 1024
+
+
+def request_filters(
+    status: RequestStatus | None = None,
+    security_id: int | None = None,
+    creator_id: int | None = None,
+    authorizer_id: int | None = None,
+    branch_ids: list[int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> list:
+    """Condiciones de los filtros del listado y de la exportación de solicitudes."""
+    conditions = []
+    if status:
+        conditions.append(EntranceRequest.status == status)
+    if security_id:
+        conditions.append(EntranceRequest.security_id == security_id)
+    if creator_id:
+        conditions.append(EntranceRequest.creator_id == creator_id)
+    if authorizer_id:
+        conditions.append(EntranceRequest.authorizer_id == authorizer_id)
+    if branch_ids:
+        conditions.append(EntranceRequest.branch_id.in_(branch_ids))
+    if start:
+        conditions.append(EntranceRequest.entry_date >= datetime.combine(start, time.min))
+    if end:
+        conditions.append(EntranceRequest.entry_date <= datetime.combine(end, time.max))
+    return conditions
+
+
+def _material_label(model: str, serial: str | None, quantity: int) -> str:
+    label = f"{model} ({serial})" if serial else model
+    return f"{label} x{quantity}"
+
+
+def iter_export_rows(db: Session, conditions: list) -> Iterator[list]:
+    """Genera una fila por invitado de cada solicitud, en orden de ID."""
+    creator, authorizer = aliased(User), aliased(User)
+    requests = (
+        select(
+            EntranceRequest.id,
+            Branch.code,
+            Branch.name,
+            EntranceRequest.entry_date,
+            EntranceRequest.departure_date,
+            EntranceRequest.status,
+            EntranceRequest.reason,
+            creator.name,
+            authorizer.name,
+        )
+        .join(Branch, Branch.id == EntranceRequest.branch_id)
+        .outerjoin(creator, creator.id == EntranceRequest.creator_id)
+        .outerjoin(authorizer, authorizer.id == EntranceRequest.authorizer_id)
+        .where(*conditions)
+        .order_by(EntranceRequest.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    for batch in db.execute(requests).partitions():
+        ids = [row[0] for row in batch]
+        guests: dict[int, list] = {}
+        for request_id, document_id, name, company in db.execute(
+            select(EntranceRequestGuest.entrance_request_id, Guest.document_id, Guest.name,
+                   Company.name)
+            .join(Guest, Guest.id == EntranceRequestGuest.guest_id)
+            .outerjoin(Company, Company.id == Guest.company_id)
+            .where(EntranceRequestGuest.entrance_request_id.in_(ids))
+            .order_by(EntranceRequestGuest.entrance_request_id, EntranceRequestGuest.id)
+        ):
+            guests.setdefault(request_id, []).append([document_id, name, company])
+        materials: dict[int, list[str]] = {}
+        for request_id, model, serial, quantity in db.execute(
+            select(Material.entrance_request_id, Material.model, Material.serial,
+                   Material.quantity)
+            .where(Material.entrance_request_id.in_(ids))
+            .order_by(Material.entrance_request_id, Material.id)
+        ):
+            materials.setdefault(request_id, []).append(_material_label(model, serial, quantity))
+        for request_id, *values in batch:
+            status = values[4]
+            values[4] = status.value if status else None
+            request_materials = "; ".join(materials.get(request_id, ()))
+            for guest in guests.get(request_id) or [[None, None, None]]:
+                yield [request_id, *values, *guest, request_materials]
+
+
+def stream_csv(rows: Iterator[list]) -> Iterator[str]:
+    """Serializa las filas en CSV y las entrega en bloques."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_xlsx(rows: Iterator[list]) -> Iterator[bytes]:
+    """Escribe las filas en un libro de solo escritura y lo entrega por partes."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Solicitudes")
+    sheet.append(HEADERS)
+    for row in rows:
+        sheet.append(row)
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as file:
+            while chunk := file.read(CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
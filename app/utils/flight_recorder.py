@@ -0,0 +1,190 @@
+"""Registro de peticiones lentas con las sentencias SQL ejecutadas.
+
+Durante cada petición se guarda en memoria la línea de tiempo de las sentencias
+SQL. Solo cuando la petición supera ``SLOW_REQUEST_THRESHOLD_MS`` se arma una
+entrada en el buffer circular; en el resto de casos la línea de tiempo se descarta.
+Los valores de los parámetros nunca se almacenan en el buffer, solo su tipo.
+"""
+import logging
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_current_timeline: ContextVar["Timeline | None"] = ContextVar(
+    "flight_recorder_timeline", default=None
+)
+
+slow_requests: deque = deque(maxlen=settings.SLOW_REQUEST_BUFFER_SIZE)
+
+# Parámetros de la URL que pueden llevar credenciales
+SENSITIVE_PARAM = re.compile(r"token|password|passwd|secret|key|signature|auth|jwt", re.I)
+
+
+class Timeline(list):
+    """Sentencias de la petición; pasado el límite solo se cuentan las demás y su tiempo."""
+
+    def __init__(self):
+        super().__init__()
+        self.dropped = 0
+        self.dropped_time = 0.0
+
+    def record(self, statement, parameters, duration: float, engine) -> None:
+        if len(self) >= settings.SLOW_REQUEST_MAX_STATEMENTS:
+            self.dropped += 1
+            self.dropped_time += duration
+            return
+        self.append((statement, parameters, duration, engine))
+
+
+def _redact_query(query_string: bytes) -> dict:
+    """Parámetros de la URL con los valores sensibles ocultos."""
+    return {
+        key: "[oculto]" if SENSITIVE_PARAM.search(key) else value
+        for key, value in parse_qsl(query_string.decode("latin-1"))
+    }
+
+
+def _redact(parameters) -> list | dict | None:
+    """Reemplaza los valores de los parámetros por el nombre de su tipo."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: solo se reporta la cantidad de filas
+            return [f"{len(parameters)} filas"]
+        return [type(value).__name__ for value in parameters]
+    return [type(parameters).__name__]
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_timeline.get() is not None:
+        conn.info.setdefault("flight_recorder_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timeline = _current_timeline.get()
+    if timeline is None:
+        return
+    starts = conn.info.get("flight_recorder_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    timeline.record(statement, parameters, duration, conn.engine)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Una sentencia que falla no llega a after_cursor_execute; sin esto el inicio quedaría en la
+    # pila de la conexión y las siguientes sentencias medirían contra el inicio equivocado
+    if context.connection is None or context.execution_context is None:
+        return
+    starts = context.connection.info.get("flight_recorder_start")
+    if starts:
+        starts.pop()
+
+
+def _explain(engine: Engine, statement: str, parameters) -> list[str] | None:
+    """Obtiene el plan de ejecución de una sentencia SELECT."""
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with engine.connect() as conn:
+            # Se usa el cursor DBAPI para reutilizar los parámetros tal como se ejecutaron
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters or ())
+                return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning(f"No fue posible obtener el plan de ejecución: {e}")
+        return None
+
+
+def _build_entry(scope: dict, status: int, duration: float, timeline: Timeline) -> dict:
+    """Arma la entrada del buffer a partir de la línea de tiempo de la petición."""
+    route = scope.get("route")
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "method": scope["method"],
+        "route": getattr(route, "path", scope["path"]),
+        "path": scope["path"],
+        "path_params": {k: str(v) for k, v in scope.get("path_params", {}).items()},
+        "query_params": _redact_query(scope.get("query_string", b"")),
+        "status": status,
+        "duration_ms": round(duration * 1000, 3),
+        "sql_time_ms": round(
+            (sum(item[2] for item in timeline) + timeline.dropped_time) * 1000, 3
+        ),
+        "statements_dropped": timeline.dropped,
+        "statements": [
+            {
+                "statement": statement,
+                "parameters": _redact(parameters),
+                "duration_ms": round(elapsed * 1000, 3),
+            }
+            for statement, parameters, elapsed, _ in timeline
+        ],
+        "explain": None,
+    }
+    if settings.SLOW_REQUEST_EXPLAIN and timeline:
+        statement, parameters, _, engine = max(timeline, key=lambda item: item[2])
+        entry["explain"] = {
+            "statement": statement,
+            "plan": _explain(engine, statement, parameters),
+        }
+    return entry
+
+
+class FlightRecorderMiddleware:
+    """Middleware ASGI que guarda las peticiones lentas en el buffer circular."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = dict(message.get("headers", []))
+                status["stream"] = headers.get(b"content-type", b"").startswith(
+                    b"text/event-stream"
+                )
+            await send(message)
+
+        timeline = Timeline()
+        token = _current_timeline.set(timeline)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current_timeline.reset(token)
+            # Las conexiones de eventos duran lo que el cliente quiera; no son lentas
+            if duration * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS and not status["stream"]:
+                entry = await run_in_threadpool(
+                    _build_entry, scope, status["code"], duration, timeline
+                )
+                slow_requests.append(entry)
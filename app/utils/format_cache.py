@@ -0,0 +1,263 @@
+"""Caché de formatos Excel renderizados, direccionada por contenido.
+
+La clave de un formato es el hash de la plantilla, el motor de render, la versión de la
+solicitud (``updated_at``) y todos los valores que se escriben (invitados, materiales y
+pases), así que cualquier edición genera una clave nueva y nunca se invalida nada. Los
+pases emitidos para una versión también se guardan, para que reenviar el mismo formato
+sea una lectura de la caché mientras sus pases sigan vigentes.
+
+El almacenamiento pasa por un ``CacheBackend``: un directorio local con expiración por
+edad y desalojo LRU por tamaño, o un bucket compatible con S3 (la expiración se revisa al
+leer y el tamaño se controla con las reglas de ciclo de vida del bucket). Una falla del
+backend solo se registra y se trata como un fallo de caché.
+"""
+import abc
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from app.config.settings import settings
+from app.models.entrances import EntranceRequest
+from app.utils.metrics import FORMAT_CACHE_REQUESTS
+from app.utils.passes import decode_pass, issue_passes, pass_revocations
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(abc.ABC):
+    """Almacenamiento de bytes por clave."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """Obtiene los bytes guardados en ``key`` o ``None`` si no existen o vencieron."""
+
+    @abc.abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        """Guarda ``data`` en ``key``."""
+
+
+class LocalDirectoryBackend(CacheBackend):
+    """Archivos en un directorio local con expiración por edad y desalojo LRU por tamaño.
+
+    La fecha de modificación marca la escritura y la de acceso (actualizada en cada lectura)
+    el último uso. Al superar ``max_bytes`` se borran las entradas vencidas y luego las
+    menos usadas hasta bajar al 90 % del límite.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.max_age:
+                return None
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Se escribe aparte y se renombra para que un lector nunca vea un archivo a medias
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _entries(self) -> list[tuple[str, os.stat_result, int]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat, stat.st_size))
+        return entries
+
+    def evict(self) -> None:
+        """Borra las entradas vencidas y las menos usadas hasta bajar del límite."""
+        now = time.time()
+        entries = self._entries()
+        size = sum(entry_size for _, _, entry_size in entries)
+        target = self.max_bytes * 0.9
+        for path, stat, entry_size in sorted(
+            entries, key=lambda entry: (now - entry[1].st_mtime <= self.max_age, entry[1].st_atime)
+        ):
+            if size <= target and now - stat.st_mtime <= self.max_age:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+
+
+def _error_code(error: Exception) -> str | None:
+    response = getattr(error, "response", None) or {}
+    return str(response.get("Error", {}).get("Code")) if isinstance(response, dict) else None
+
+
+class S3Backend(CacheBackend):
+    """Objetos en un bucket compatible con S3, a través de un cliente como el de boto3."""
+
+    def __init__(self, client, bucket: str, prefix: str, max_age: float):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_age = max_age
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if _error_code(e) not in ("NoSuchKey", "404"):
+                raise
+            return None
+        modified = response.get("LastModified")
+        if modified is not None:
+            age = datetime.now(timezone.utc) - modified.astimezone(timezone.utc)
+            if age.total_seconds() > self.max_age:
+                return None
+        return response["Body"].read()
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> CacheBackend | None:
+    """Backend configurado en ``FORMAT_CACHE_BACKEND`` ("local", "s3" o vacío)."""
+    if settings.FORMAT_CACHE_BACKEND == "local":
+        return LocalDirectoryBackend(
+            settings.FORMAT_CACHE_DIR, settings.FORMAT_CACHE_MAX_BYTES,
+            settings.FORMAT_CACHE_MAX_AGE,
+        )
+    if settings.FORMAT_CACHE_BACKEND == "s3":
+        import boto3
+
+        client = boto3.client("s3", endpoint_url=settings.FORMAT_CACHE_S3_ENDPOINT or None)
+        return S3Backend(
+            client, settings.FORMAT_CACHE_BUCKET, settings.FORMAT_CACHE_PREFIX,
+            settings.FORMAT_CACHE_MAX_AGE,
+        )
+    return None
+
+
+def cache_get(key: str) -> bytes | None:
+    """Lee una entrada; las fallas del backend cuentan como fallo de caché."""
+    backend = get_backend()
+    if backend is None:
+        return None
+    try:
+        return backend.get(key)
+    except Exception as e:
+        logger.warning(f"No fue posible leer la caché de formatos: {e}")
+        return None
+
+
+def cache_put(key: str, data: bytes) -> None:
+    """Guarda una entrada; las fallas del backend solo se registran."""
+    backend = get_backend()
+    if backend is None:
+        return
+    try:
+        backend.put(key, data)
+    except Exception as e:
+        logger.warning(f"No fue posible escribir la caché de formatos: {e}")
+
+
+@lru_cache(maxsize=8)
+def _template_digest(template_path: str, mtime: float) -> str:
+    with open(template_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def format_key(
+    template_path: str, engine: str, entrance_request: EntranceRequest, cells: dict, blocks: dict
+) -> str:
+    """Clave del formato a partir de la plantilla, la versión y los valores a escribir."""
+    payload = json.dumps([
+        _template_digest(template_path, os.path.getmtime(template_path)),
+        engine,
+        entrance_request.id,
+        entrance_request.updated_at.isoformat() if entrance_request.updated_at else None,
+        sorted([row, column, value] for (row, column), value in cells.items()),
+        sorted([row, [sorted(values.items()) for values in rows]] for row, rows in blocks.items()),
+    ], default=str, ensure_ascii=False)
+    return "format-" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fetch_format(key: str, output_path: str) -> bool:
+    """Escribe el formato guardado en ``output_path``; retorna si estaba en la caché."""
+    data = cache_get(key)
+    FORMAT_CACHE_REQUESTS.inc(result="hit" if data is not None else "miss")
+    if data is None:
+        return False
+    with open(output_path, "wb") as file:
+        file.write(data)
+    return True
+
+
+def store_format(key: str, output_path: str) -> None:
+    """Guarda en la caché el formato recién generado."""
+    if get_backend() is None:
+        return
+    with open(output_path, "rb") as file:
+        cache_put(key, file.read())
+
+
+def passes_for_format(entrance_request: EntranceRequest) -> dict[int, str]:
+    """Reutiliza los pases emitidos para la misma versión de la solicitud o emite nuevos."""
+    if get_backend() is None:
+        return issue_passes(entrance_request)
+    guests = sorted((link.guest.id, link.guest.document_id) for link in entrance_request.guests)
+    version = json.dumps([
+        entrance_request.id,
+        entrance_request.updated_at.isoformat() if entrance_request.updated_at else None,
+        guests,
+    ])
+    key = "passes-" + hashlib.sha256(version.encode("utf-8")).hexdigest()
+    data = cache_get(key)
+    if data is not None:
+        passes = {int(guest_id): token for guest_id, token in json.loads(data).items()}
+        entry_passes = [decode_pass(token) for token in passes.values()]
+        if set(passes) == {guest_id for guest_id, _ in guests} and all(
+            entry_pass is not None and not pass_revocations.is_revoked(entry_pass)
+            for entry_pass in entry_passes
+        ):
+            return passes
+    passes = issue_passes(entrance_request)
+    cache_put(key, json.dumps(passes).encode("utf-8"))
+    return passes
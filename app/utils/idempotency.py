@@ -0,0 +1,118 @@
+"""Llaves de idempotencia (encabezado ``Idempotency-Key``) para los POST que crean datos.
+
+La llave se inserta en la misma transacción que hace el trabajo y la respuesta se guarda
+antes del commit, así que la llave y sus filas se confirman o se descartan juntas. Un
+duplicado concurrente choca con la llave primaria y la base lo detiene hasta que la petición
+original termina: si confirmó, el duplicado repite la respuesta guardada; si se revirtió, el
+duplicado hace el trabajo. Las respuestas duran ``IDEMPOTENCY_TTL_SECONDS``; los errores no
+se guardan y un reintento los vuelve a evaluar.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.idempotency import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+_purge_lock = threading.Lock()
+_purged_at = 0.0
+
+
+def idempotency_scope(endpoint: str, user_id: int) -> str:
+    """Ámbito de las llaves por endpoint y ID de usuario: el mismo valor de dos usuarios no
+    choca. El ID se obtiene con ``get_current_user_id``, que rechaza los tokens sin usuario."""
+    return f"{endpoint}:{user_id}"
+
+
+def _fingerprint(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def _purge_expired(db: Session, now: datetime) -> None:
+    """Borra las llaves vencidas como máximo cada ``IDEMPOTENCY_PURGE_SECONDS`` por proceso."""
+    global _purged_at
+    with _purge_lock:
+        if time.monotonic() - _purged_at < settings.IDEMPOTENCY_PURGE_SECONDS:
+            return
+        _purged_at = time.monotonic()
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+
+
+def begin_idempotent(db: Session, scope: str, key: str, payload: BaseModel) -> Response | None:
+    """Reserva la llave en la transacción de ``db``.
+
+    Retorna ``None`` si la petición es nueva y debe procesarse, o la respuesta guardada si la
+    llave ya se usó con el mismo cuerpo. Debe ser la primera escritura de la transacción.
+    """
+    fingerprint = _fingerprint(payload)
+    now = datetime.now()
+    _purge_expired(db, now)
+    for _ in range(2):
+        try:
+            db.execute(insert(IdempotencyKey).values(
+                scope=scope, key=key, fingerprint=fingerprint, status_code=0, body=b"",
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+            ))
+            return None
+        except IntegrityError:
+            # La original ya confirmó; se descarta la transacción que solo tenía la llave
+            db.rollback()
+        stored = db.execute(
+            select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        ).scalar_one_or_none()
+        if stored is None:
+            continue
+        if stored.expires_at < now:
+            db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at < now,
+            ))
+            continue
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail=f"La llave {IDEMPOTENCY_HEADER} ya se usó con otro contenido",
+            )
+        headers = json.loads(stored.headers) if stored.headers else {}
+        return Response(
+            stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={**headers, REPLAYED_HEADER: "true"},
+        )
+    raise HTTPException(
+        status_code=409, detail=f"No fue posible reservar la llave {IDEMPOTENCY_HEADER}"
+    )
+
+
+def store_response(
+    db: Session,
+    scope: str,
+    key: str,
+    status_code: int,
+    payload: BaseModel,
+    headers: dict | None = None,
+) -> None:
+    """Guarda la respuesta de la llave en la transacción, antes del commit del trabajo."""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        .values(
+            status_code=status_code,
+            body=payload.model_dump_json(by_alias=True).encode("utf-8"),
+            headers=json.dumps(headers) if headers else None,
+        )
+    )
@@ -0,0 +1,456 @@
+"""Modulo de métricas en formato de exposición de texto de Prometheus.
+
+Cada métrica guarda sus valores en un fragmento por hilo, de modo que registrar
+una observación no toma ningún lock; los fragmentos se combinan al momento del
+scrape. Con ``METRICS_DIR`` configurado, cada proceso worker deja una
+instantánea en ese directorio y el scrape combina las de todos los procesos; las
+de los procesos terminados se suman a un agregado y se borran.
+"""
+import abc
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+from app.config.settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(float(4 ** i * 1024) for i in range(1, 9))
+# Suma de los procesos terminados dentro de ``METRICS_DIR``
+AGGREGATE_FILE = "aggregate.json"
+AGGREGATE_LOCK = "aggregate.lock"
+
+
+def _format_value(value: float) -> str:
+    """Formatea un valor numérico según el formato de exposición."""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames: Iterable[str], labelvalues: Iterable[str], **extra) -> str:
+    """Construye el bloque de etiquetas ``{a="b",...}`` de una muestra."""
+    pairs = list(zip(labelnames, labelvalues)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    """Escapa un valor de etiqueta."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric(abc.ABC):
+    """Base de las métricas con almacenamiento fragmentado por hilo."""
+    type_name = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple = (),
+        registry: "Registry | None" = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _shard(self) -> dict:
+        """Obtiene el fragmento del hilo actual, creándolo la primera vez."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def collect(self) -> dict:
+        """Combina los fragmentos de todos los hilos."""
+
+    @staticmethod
+    def merge(total: dict, values: dict) -> None:
+        """Suma ``values`` sobre ``total`` (ambos indexados por etiquetas)."""
+        for key, value in values.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def render(self, values: dict) -> list[str]:
+        """Genera las líneas de exposición para los valores combinados."""
+        lines = []
+        for key, value in sorted(values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """Contador monotónico."""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Incrementa el contador para las etiquetas dadas."""
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def collect(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            self.merge(total, dict(shard))
+        return total
+
+
+class Gauge(Counter):
+    """Medidor que sube y baja, o que se calcula al momento del scrape."""
+    type_name = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple = (),
+        registry: "Registry | None" = None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self._function: Callable[[], dict | float] | None = None
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        """Decrementa el medidor para las etiquetas dadas."""
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], dict | float]) -> None:
+        """Calcula el valor en cada scrape en lugar de acumularlo.
+
+        La función retorna un número o un diccionario de tuplas de etiquetas a valores.
+        """
+        self._function = function
+
+    def collect(self) -> dict:
+        if self._function is None:
+            return super().collect()
+        value = self._function()
+        if isinstance(value, dict):
+            return dict(value)
+        return {(): float(value)}
+
+
+class Histogram(Metric):
+    """Histograma acumulativo con buckets fijos."""
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple = (),
+        registry: "Registry | None" = None, buckets: tuple = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        """Registra una observación."""
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [conteo por bucket..., suma, conteo]
+            state = shard[key] = [0.0] * (len(self.buckets) + 2)
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[idx] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    def collect(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            self.merge(total, {key: list(state) for key, state in dict(shard).items()})
+        return total
+
+    @staticmethod
+    def merge(total: dict, values: dict) -> None:
+        for key, state in values.items():
+            if key in total:
+                total[key] = [a + b for a, b in zip(total[key], state)]
+            else:
+                total[key] = list(state)
+
+    def render(self, values: dict) -> list[str]:
+        lines = []
+        for key, state in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """Registro de métricas del proceso."""
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        """Agrega una métrica al registro."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        """Valores combinados de todos los hilos del proceso actual."""
+        return {
+            name: [[list(key), value] for key, value in metric.collect().items()]
+            for name, metric in self._metrics.items()
+        }
+
+    def flush(self) -> None:
+        """Escribe la instantánea del proceso en el directorio compartido."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path: str) -> dict | None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _fold(self, paths: list[str]) -> None:
+        """Suma las instantáneas de procesos terminados al agregado y las borra.
+
+        Solo se conservan contadores e histogramas; los medidores de un proceso terminado ya
+        no representan nada. Un candado de archivo evita que dos workers sumen la misma.
+        """
+        aggregate_path = os.path.join(self.directory, AGGREGATE_FILE)
+        with open(os.path.join(self.directory, AGGREGATE_LOCK), "a", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            aggregate = {
+                name: {tuple(key): value for key, value in samples}
+                for name, samples in (self._read(aggregate_path) or {}).items()
+            }
+            for path in paths:
+                # Si otro worker ya la sumó, el archivo ya no existe
+                snapshot = self._read(path) or {}
+                for name, samples in snapshot.items():
+                    metric = self._metrics.get(name)
+                    if metric is None or metric.type_name == "gauge":
+                        continue
+                    metric.merge(
+                        aggregate.setdefault(name, {}),
+                        {tuple(key): value for key, value in samples},
+                    )
+            tmp_path = f"{aggregate_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    name: [[list(key), value] for key, value in samples.items()]
+                    for name, samples in aggregate.items()
+                }, f)
+            os.replace(tmp_path, aggregate_path)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _snapshots(self) -> Iterable[tuple[int, dict]]:
+        """Instantáneas de todos los procesos, incluida la del actual.
+
+        Las de procesos terminados se suman al agregado y se borran, para que el directorio
+        no crezca con cada worker reciclado; el agregado se retorna con el pid ``0``.
+        """
+        yield os.getpid(), self.snapshot()
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        dead = []
+        for file_name in os.listdir(self.directory):
+            pid, ext = os.path.splitext(file_name)
+            if ext != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.directory, file_name)
+            if not _pid_alive(int(pid)):
+                dead.append(path)
+                continue
+            snapshot = self._read(path)
+            if snapshot is not None:
+                yield int(pid), snapshot
+        if dead:
+            self._fold(dead)
+        aggregate = self._read(os.path.join(self.directory, AGGREGATE_FILE))
+        if aggregate is not None:
+            yield 0, aggregate
+
+    def render(self) -> str:
+        """Genera el texto de exposición combinando todos los procesos."""
+        merged: dict[str, dict] = {name: {} for name in self._metrics}
+        for pid, snapshot in self._snapshots():
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                # Los medidores de procesos terminados ya no representan nada
+                if metric.type_name == "gauge" and (pid == 0 or not _pid_alive(pid)):
+                    continue
+                metric.merge(merged[name], {tuple(key): value for key, value in samples})
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    """Indica si un proceso sigue vivo."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+REGISTRY = Registry(settings.METRICS_DIR)
+atexit.register(REGISTRY.flush)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta y estado.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Peticiones HTTP en curso.",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Conexiones del pool de base de datos por estado.",
+    ("state",),
+)
+EXPORT_DURATION = Histogram(
+    "format_export_duration_seconds",
+    "Duración de la generación del formato Excel de ingreso.",
+)
+EXPORT_SIZE = Histogram(
+    "format_export_size_bytes",
+    "Tamaño del formato Excel de ingreso generado.",
+    buckets=SIZE_BUCKETS,
+)
+FORMAT_CACHE_REQUESTS = Counter(
+    "format_cache_requests_total",
+    "Consultas a la caché de formatos Excel por resultado.",
+    ("result",),
+)
+REQUEST_CACHE_REQUESTS = Counter(
+    "request_cache_requests_total",
+    "Consultas a la caché del detalle de solicitudes por resultado (hit, miss, coalesced).",
+    ("result",),
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Peticiones rechazadas con 503 por el control de admisión, por prioridad y motivo.",
+    ("priority", "reason"),
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Espera en la cola del control de admisión por prioridad.",
+    ("priority",),
+)
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds",
+    "Duración del envío de correos por SMTP.",
+)
+EMAIL_SEND_FAILURES = Counter(
+    "email_send_failures_total",
+    "Correos que no se pudieron enviar por SMTP.",
+    ("reason",),
+)
+
+
+def track_db_pool(engine) -> None:
+    """Expone el estado del pool de conexiones del motor en cada scrape."""
+    def pool_status() -> dict:
+        status = {}
+        for state, attr in (
+            ("size", "size"),
+            ("checked_out", "checkedout"),
+            ("checked_in", "checkedin"),
+            ("overflow", "overflow"),
+        ):
+            # No todos los pools (p. ej. los de SQLite) exponen todos los contadores
+            method = getattr(engine.pool, attr, None)
+            if callable(method):
+                status[(state,)] = float(method())
+        return status
+
+    DB_POOL_CONNECTIONS.set_function(pool_status)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide la latencia y las peticiones en curso."""
+
+    def __init__(self, app):
+        self.app = app
+        self._last_flush = time.monotonic()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                # Se usa la plantilla de la ruta para no crear una serie por ID
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
+            self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        """Publica la instantánea del proceso cada ``METRICS_FLUSH_INTERVAL`` segundos."""
+        if not REGISTRY.directory:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self._last_flush = now
+            REGISTRY.flush()
@@ -0,0 +1,123 @@
+"""Notificación de solicitudes aprobadas en lote.
+
+Los formatos de las solicitudes se generan en paralelo, cada uno con su propia sesión,
+y cada destinatario recibe un solo correo con todas sus solicitudes. Todos los correos
+se envían por una misma sesión SMTP. Una solicitud cuyo formato falla se reporta y se
+excluye de los correos sin afectar a las demás.
+"""
+import logging
+import smtplib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+
+from app.config.settings import settings
+from app.models.entrances import EntranceRequest, EntranceRequestGuest
+from app.scripts.create_format import export_entrance_requests_to_excel
+from app.utils.email import build_digest_body, build_message, send_messages
+from app.utils.format_cache import passes_for_format
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = "format_templates/PERMISO MOVISTAR.xlsx"
+DIGEST_SUBJECT = "Permisos de ingreso aprobados"
+
+
+def render_formats(
+    db: Session, entrance_requests: list, passes: dict[int, dict]
+) -> tuple[dict[int, str], dict[int, str]]:
+    """Genera en paralelo el formato de cada solicitud.
+
+    Retorna el archivo por ID de las solicitudes generadas y el error por ID de las que fallaron.
+    """
+    # Las sesiones no se comparten entre hilos; cada formato abre la suya sobre el mismo motor
+    make_session = sessionmaker(bind=db.get_bind())
+
+    def render(request_id: int) -> str:
+        file_name = f"output_{request_id}.xlsx"
+        session = make_session()
+        try:
+            export_entrance_requests_to_excel(
+                session, request_id, TEMPLATE_PATH, file_name, passes=passes[request_id]
+            )
+        finally:
+            session.close()
+        return file_name
+
+    files, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=settings.TRANSITION_RENDER_WORKERS) as pool:
+        futures = {
+            entrance_request.id: pool.submit(render, entrance_request.id)
+            for entrance_request in entrance_requests
+        }
+        for request_id, future in futures.items():
+            try:
+                files[request_id] = future.result()
+            except Exception as e:
+                # Los cambios de estado ya están confirmados; la falla se reporta por solicitud
+                logger.exception(f"No fue posible generar el formato de la solicitud {request_id}")
+                errors[request_id] = f"No fue posible generar el formato: {e}"
+    return files, errors
+
+
+def notify_authorized_requests(
+    db: Session, request_ids: list[int]
+) -> tuple[int, dict[int, str]]:
+    """Genera los formatos y envía un correo por destinatario.
+
+    Retorna los correos enviados y el error por ID de las solicitudes que no se notificaron.
+    """
+    if not request_ids:
+        return 0, {}
+    entrance_requests = (
+        db.query(EntranceRequest)
+        .options(
+            selectinload(EntranceRequest.branch),
+            selectinload(EntranceRequest.guests).selectinload(EntranceRequestGuest.guest),
+            selectinload(EntranceRequest.creator),
+            selectinload(EntranceRequest.authorizer),
+        )
+        .filter(EntranceRequest.id.in_(request_ids))
+        .order_by(EntranceRequest.id)
+        .all()
+    )
+    passes = {
+        entrance_request.id: passes_for_format(entrance_request)
+        for entrance_request in entrance_requests
+    }
+    files, errors = render_formats(db, entrance_requests, passes)
+
+    # Solicitudes de cada destinatario (solicitante y autorizador)
+    by_recipient = defaultdict(list)
+    for entrance_request in entrance_requests:
+        if entrance_request.id in errors:
+            continue
+        for user in (entrance_request.creator, entrance_request.authorizer):
+            if user is not None and entrance_request not in by_recipient[user.email]:
+                by_recipient[user.email].append(entrance_request)
+
+    messages = []
+    for email, requests in by_recipient.items():
+        body = build_digest_body([
+            (
+                f"Solicitud {entrance_request.id} - {entrance_request.branch.name} "
+                f"({entrance_request.entry_date:%d/%m/%Y %H:%M} a "
+                f"{entrance_request.departure_date:%d/%m/%Y %H:%M})",
+                [
+                    (guest.name, guest.document_id, passes[entrance_request.id][guest.id])
+                    for guest in entrance_request.guest_list
+                ],
+            )
+            for entrance_request in requests
+        ])
+        messages.append(build_message(
+            [files[entrance_request.id] for entrance_request in requests],
+            [email], body, subject=DIGEST_SUBJECT
+        ))
+    try:
+        return send_messages(messages), errors
+    except (OSError, smtplib.SMTPException) as e:
+        # Los cambios de estado ya están confirmados; solo se reporta la falla del envío
+        logger.error(f"No fue posible enviar los correos de aprobación: {e}")
+        return 0, errors
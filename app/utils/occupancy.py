@@ -0,0 +1,112 @@
+"""Ocupación esperada de las sedes a partir de las solicitudes autorizadas.
+
+Las ventanas se leen en una sola consulta y cada sede se procesa con un barrido: las
+llegadas y salidas se ordenan por instante (las salidas primero en caso de empate) y una
+suma acumulada da la cantidad de invitados presentes en cada momento. De cada intervalo
+(hora o día) se reporta el máximo de invitados simultáneos y las llegadas.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.entrances import EntranceRequest, EntranceRequestGuest, RequestStatus
+
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+class OccupancyBucket(NamedTuple):
+    """Ocupación de una sede en un intervalo."""
+    start: datetime
+    peak: int
+    arrivals: int
+
+
+def bucket_start(value: datetime, bucket: str) -> datetime:
+    """Trunca la fecha al inicio de su intervalo."""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if bucket == "day" else value
+
+
+def authorized_windows(
+    db: Session, start: datetime, end: datetime, branch_ids: Iterable[int] | None = None
+) -> list[tuple[int, datetime, datetime, int]]:
+    """Retorna sede, ingreso, salida e invitados de las solicitudes autorizadas del rango."""
+    query = (
+        db.query(
+            EntranceRequest.branch_id,
+            EntranceRequest.entry_date,
+            EntranceRequest.departure_date,
+            func.count(EntranceRequestGuest.id),
+        )
+        .join(EntranceRequestGuest, EntranceRequestGuest.entrance_request_id == EntranceRequest.id)
+        .filter(
+            EntranceRequest.status == RequestStatus.authorized,
+            EntranceRequest.entry_date < end,
+            EntranceRequest.departure_date > start,
+        )
+        .group_by(
+            EntranceRequest.id,
+            EntranceRequest.branch_id,
+            EntranceRequest.entry_date,
+            EntranceRequest.departure_date,
+        )
+    )
+    if branch_ids is not None:
+        query = query.filter(EntranceRequest.branch_id.in_(list(branch_ids)))
+    return query.all()
+
+
+def sweep(
+    windows: list[tuple[datetime, datetime, int]], start: datetime, step: timedelta, size: int
+) -> list[OccupancyBucket]:
+    """Calcula la ocupación de ``size`` intervalos de ``step`` desde ``start``."""
+    end = start + step * size
+    events = []
+    arrivals = [0] * size
+    for entry_date, departure_date, guests in windows:
+        events.append((max(entry_date, start), guests))
+        events.append((min(departure_date, end), -guests))
+        if start <= entry_date < end:
+            arrivals[(entry_date - start) // step] += guests
+    # Con el mismo instante las salidas van primero para no contar dos veces un relevo
+    events.sort()
+
+    buckets, present, idx = [], 0, 0
+    for position in range(size):
+        limit = start + step * position
+        while idx < len(events) and events[idx][0] <= limit:
+            present += events[idx][1]
+            idx += 1
+        peak = present
+        limit += step
+        while idx < len(events) and events[idx][0] < limit:
+            present += events[idx][1]
+            peak = max(peak, present)
+            idx += 1
+        buckets.append(OccupancyBucket(start + step * position, peak, arrivals[position]))
+    return buckets
+
+
+def branch_occupancy(
+    db: Session,
+    start: datetime,
+    size: int,
+    bucket: str = "hour",
+    branch_ids: list[int] | None = None,
+) -> dict[int, list[OccupancyBucket]]:
+    """Calcula la ocupación por sede; sin ``branch_ids`` incluye las sedes con solicitudes."""
+    step = BUCKETS[bucket]
+    start = bucket_start(start, bucket)
+    windows: dict[int, list[tuple[datetime, datetime, int]]] = {
+        branch_id: [] for branch_id in branch_ids or ()
+    }
+    for branch_id, entry_date, departure_date, guests in authorized_windows(
+        db, start, start + step * size, branch_ids
+    ):
+        windows.setdefault(branch_id, []).append((entry_date, departure_date, guests))
+    return {
+        branch_id: sweep(branch_windows, start, step, size)
+        for branch_id, branch_windows in sorted(windows.items())
+    }
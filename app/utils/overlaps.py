@@ -0,0 +1,73 @@
+"""Detección de traslapes entre las ventanas de ingreso de un mismo invitado.
+
+Cada vínculo de invitado guarda una copia de la ventana de su solicitud, indexada por
+``(guest_id, departure_date, entry_date)``. La búsqueda recorre el índice de cada
+invitado desde la primera salida posterior al ingreso pedido, así que el costo depende
+de las reservas vigentes del invitado y no de todo su historial. Las solicitudes
+rechazadas no generan traslapes.
+"""
+from datetime import datetime
+from typing import Iterable, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.models.entrances import EntranceRequest, EntranceRequestGuest, RequestStatus
+from app.utils.dates import to_local_naive
+
+
+class GuestConflict(NamedTuple):
+    """Solicitud existente cuya ventana se cruza con la pedida para un invitado."""
+    guest_id: int
+    entrance_request_id: int
+    branch_id: int
+    entry_date: datetime
+    departure_date: datetime
+    same_branch: bool
+
+
+def find_guest_conflicts(
+    db: Session,
+    guest_ids: Iterable[int],
+    windows: list[tuple[datetime, datetime]],
+    branch_id: int,
+    exclude_ids: Iterable[int] = (),
+) -> list[GuestConflict]:
+    """Busca las solicitudes de los invitados que se cruzan con alguna de las ventanas."""
+    guest_ids = list(dict.fromkeys(guest_ids))
+    if not guest_ids or not windows:
+        return []
+    windows = [
+        (to_local_naive(entry), to_local_naive(departure)) for entry, departure in windows
+    ]
+    start = min(entry for entry, _ in windows)
+    end = max(departure for _, departure in windows)
+    query = (
+        db.query(
+            EntranceRequestGuest.guest_id,
+            EntranceRequestGuest.entrance_request_id,
+            EntranceRequest.branch_id,
+            EntranceRequestGuest.entry_date,
+            EntranceRequestGuest.departure_date,
+        )
+        .join(EntranceRequest, EntranceRequest.id == EntranceRequestGuest.entrance_request_id)
+        .filter(
+            EntranceRequestGuest.guest_id.in_(guest_ids),
+            EntranceRequestGuest.departure_date > start,
+            EntranceRequestGuest.entry_date < end,
+            EntranceRequest.status != RequestStatus.refused,
+        )
+    )
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        query = query.filter(EntranceRequestGuest.entrance_request_id.not_in(exclude_ids))
+    conflicts = []
+    for guest_id, request_id, request_branch_id, entry_date, departure_date in query.order_by(
+        EntranceRequestGuest.guest_id, EntranceRequestGuest.entry_date
+    ):
+        # La consulta cubre el rango de todas las ventanas; se descartan los huecos entre ellas
+        if any(entry < departure_date and departure > entry_date for entry, departure in windows):
+            conflicts.append(GuestConflict(
+                guest_id, request_id, request_branch_id, entry_date, departure_date,
+                request_branch_id == branch_id,
+            ))
+    return conflicts
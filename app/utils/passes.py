@@ -0,0 +1,189 @@
+"""Pases de ingreso firmados que se validan sin consultar la base de datos.
+
+Cada pase lleva la solicitud, la sede, el documento del invitado, la ventana de ingreso
+y el instante de emisión, firmados con HMAC usando ``SECRET_KEY``. La validación solo
+revisa la firma, la ventana y un conjunto en memoria de solicitudes revocadas: un pase
+queda revocado si se emitió antes de la revocación de su solicitud. Las revocaciones se
+guardan en ``pass_revocations`` en la misma transacción del cambio; el conjunto se carga al
+iniciar y se refresca cada ``PASS_REVOCATION_TTL_SECONDS`` para recoger las de otros workers.
+"""
+import base64
+import binascii
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.auth.jwt import sign_value, verify_signature
+from app.config.settings import settings
+from app.models.entrances import EntranceRequest, PassRevocation, RequestStatus
+
+
+class EntryPass(NamedTuple):
+    """Datos firmados de un pase de ingreso."""
+    entrance_request_id: int
+    branch_id: int
+    document_id: str
+    entry_date: datetime
+    departure_date: datetime
+    issued_at: int
+
+
+def _timestamp_us(value: datetime) -> int:
+    return int(value.timestamp() * 1_000_000)
+
+
+def create_pass(
+    entrance_request_id: int,
+    branch_id: int,
+    document_id: str,
+    entry_date: datetime,
+    departure_date: datetime,
+) -> str:
+    """Crea el pase firmado de un invitado."""
+    payload = ":".join(str(value) for value in (
+        entrance_request_id,
+        branch_id,
+        document_id,
+        int(entry_date.timestamp()),
+        int(departure_date.timestamp()),
+        time.time_ns() // 1000,
+    ))
+    encoded = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    return f"{encoded}.{sign_value(f'pass:{payload}')}"
+
+
+def issue_passes(entrance_request: EntranceRequest) -> dict[int, str]:
+    """Emite los pases de los invitados de una solicitud, por ID de invitado."""
+    return {
+        link.guest.id: create_pass(
+            entrance_request.id,
+            entrance_request.branch_id,
+            link.guest.document_id,
+            entrance_request.entry_date,
+            entrance_request.departure_date,
+        )
+        for link in entrance_request.guests
+    }
+
+
+def decode_pass(token: str) -> EntryPass | None:
+    """Valida la firma del pase y retorna sus datos, o ``None`` si no es válida."""
+    encoded, _, signature = token.partition(".")
+    try:
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    if not verify_signature(f"pass:{payload}", signature):
+        return None
+    request_id, branch_id, rest = payload.split(":", 2)
+    document_id, entry, departure, issued_at = rest.rsplit(":", 3)
+    return EntryPass(
+        int(request_id),
+        int(branch_id),
+        document_id,
+        datetime.fromtimestamp(int(entry)),
+        datetime.fromtimestamp(int(departure)),
+        int(issued_at),
+    )
+
+
+class RevocationList:
+    """Solicitudes revocadas con el instante de revocación y su vencimiento."""
+
+    def __init__(self):
+        self._revoked: dict[int, tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.loaded_at = 0.0
+        self._synced_until: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def revoke(
+        self, entrance_request_id: int, expires_at: datetime, revoked_at: datetime | None = None
+    ) -> None:
+        """Revoca los pases emitidos hasta ``revoked_at`` para la solicitud."""
+        revoked_us = _timestamp_us(revoked_at) if revoked_at else time.time_ns() // 1000
+        with self._lock:
+            current = self._revoked.get(entrance_request_id)
+            if current is None:
+                self._revoked[entrance_request_id] = (revoked_us, expires_at)
+            else:
+                # Se conserva el vencimiento mayor para no liberar pases de una ventana anterior
+                self._revoked[entrance_request_id] = (
+                    max(current[0], revoked_us), max(current[1], expires_at)
+                )
+
+    def is_revoked(self, entry_pass: EntryPass) -> bool:
+        """Indica si el pase se emitió antes de la revocación de su solicitud."""
+        revoked = self._revoked.get(entry_pass.entrance_request_id)
+        return revoked is not None and entry_pass.issued_at <= revoked[0]
+
+    def load(self, db: Session, now: datetime | None = None) -> int:
+        """Carga las revocaciones vigentes y las solicitudes no autorizadas modificadas desde la
+        última carga."""
+        now = now or datetime.now()
+        # Las solicitudes que dejaron de estar autorizadas sin pasar por la API también se revocan
+        query = db.query(
+            EntranceRequest.id, EntranceRequest.updated_at, EntranceRequest.departure_date
+        ).filter(
+            EntranceRequest.status != RequestStatus.authorized,
+            EntranceRequest.departure_date >= now,
+        )
+        revocations = db.query(
+            PassRevocation.entrance_request_id, PassRevocation.revoked_at, PassRevocation.expires_at
+        ).filter(PassRevocation.expires_at >= now)
+        if self._synced_until is not None:
+            # Margen para no perder transacciones confirmadas después de la última carga
+            since = self._synced_until - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+            query = query.filter(EntranceRequest.updated_at >= since)
+            revocations = revocations.filter(PassRevocation.revoked_at >= since)
+        rows = query.all() + revocations.all()
+        for request_id, revoked_at, expires_at in rows:
+            self.revoke(request_id, expires_at, revoked_at)
+        with self._lock:
+            self._revoked = {
+                request_id: revoked
+                for request_id, revoked in self._revoked.items()
+                if revoked[1] >= now
+            }
+            self._synced_until = now
+            self.loaded_at = time.monotonic()
+        return len(rows)
+
+    def refresh(self, db: Session) -> None:
+        """Recarga las revocaciones si ya venció ``PASS_REVOCATION_TTL_SECONDS``."""
+        if time.monotonic() - self.loaded_at <= settings.PASS_REVOCATION_TTL_SECONDS:
+            return
+        # Solo un hilo recarga; los demás validan con el conjunto actual
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self.load(db)
+            finally:
+                self._refresh_lock.release()
+
+
+pass_revocations = RevocationList()
+
+
+def verify_pass(
+    token: str, branch_id: int | None = None, now: datetime | None = None
+) -> tuple[EntryPass | None, str]:
+    """Valida un pase y retorna sus datos junto con el resultado de la validación."""
+    now = now or datetime.now()
+    entry_pass = decode_pass(token)
+    if entry_pass is None:
+        return None, "invalid"
+    if pass_revocations.is_revoked(entry_pass):
+        return entry_pass, "revoked"
+    if branch_id is not None and entry_pass.branch_id != branch_id:
+        return entry_pass, "wrong_branch"
+    if now < entry_pass.entry_date:
+        return entry_pass, "not_yet_valid"
+    if now > entry_pass.departure_date:
+        return entry_pass, "expired"
+    return entry_pass, "valid"
@@ -0,0 +1,218 @@
+"""Perfilado bajo demanda de peticiones individuales.
+
+Una petición se perfila cuando trae un encabezado ``X-Profile-Token`` firmado con la
+llave secreta, o cuando un administrador activa el muestreo por un tiempo limitado.
+El resultado se guarda como estadísticas de cProfile (``.prof``) en ``PROFILE_DIR``.
+
+Solo se registra el trabajo de la petición: en el event loop el perfilador se activa en cada
+paso de la corrutina del handler y en el threadpool durante el endpoint síncrono, así que lo
+que otras peticiones ejecutan en ese tiempo queda fuera. Desde Python 3.12 cProfile observa
+todos los hilos a la vez, por lo que en esas versiones se usa el perfilador de ``profile``
+(más lento, pero por hilo); las estadísticas tienen el mismo formato.
+"""
+import asyncio
+import cProfile
+import functools
+import os
+import profile
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from app.auth.jwt import sign_value, verify_signature
+from app.config.settings import settings
+
+PROFILE_HEADER = b"x-profile-token"
+
+# Solo se perfila una petición a la vez por proceso
+_profile_lock = threading.Lock()
+
+sampling = {"rate": 0.0, "until": 0.0}
+
+
+def _new_profiler():
+    """Perfilador que se activa solo en el hilo que lo usa."""
+    return cProfile.Profile() if sys.version_info < (3, 12) else profile.Profile()
+
+
+class _ProfileSession:
+    """Perfiles de una petición; guarda el archivo y libera el candado al terminar el handler."""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.profilers: list = []
+        self.finished = False
+
+    async def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            if self.profilers:
+                await run_in_threadpool(_dump_profile, self.file_name, self.profilers)
+        finally:
+            _profile_lock.release()
+
+
+_current_session: ContextVar[_ProfileSession | None] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def create_profile_token(expires_in: int = 300) -> str:
+    """Crea un token firmado para perfilar peticiones durante ``expires_in`` segundos."""
+    expires = int(time.time()) + expires_in
+    return f"{expires}.{sign_value(f'profile:{expires}')}"
+
+
+def is_valid_profile_token(token: str) -> bool:
+    """Valida la firma y la vigencia de un token de perfilado."""
+    expires, _, signature = token.partition(".")
+    if not (expires.isascii() and expires.isdigit()) or int(expires) < time.time():
+        return False
+    return verify_signature(f"profile:{expires}", signature)
+
+
+def set_sampling(rate: float, duration_seconds: int) -> dict:
+    """Activa el muestreo de peticiones, limitado por ``PROFILE_MAX_SAMPLE_RATE``."""
+    sampling["rate"] = min(max(rate, 0.0), settings.PROFILE_MAX_SAMPLE_RATE)
+    sampling["until"] = time.time() + duration_seconds if sampling["rate"] else 0.0
+    return get_sampling()
+
+
+def get_sampling() -> dict:
+    """Obtiene el estado actual del muestreo."""
+    active = sampling["until"] > time.time()
+    return {
+        "rate": sampling["rate"] if active else 0.0,
+        "remaining_seconds": max(int(sampling["until"] - time.time()), 0),
+    }
+
+
+def _should_profile(scope: dict) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return is_valid_profile_token(value.decode("latin-1"))
+    if sampling["until"] <= time.time():
+        return False
+    return random.random() < sampling["rate"]  # nosec B311
+
+
+def _profile_file_name(scope: dict) -> str:
+    """Nombre del archivo de perfil a partir del método y la ruta de la petición."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+    return (
+        f"{time.strftime('%Y%m%dT%H%M%S')}_{scope['method']}_{slug}_{uuid.uuid4().hex[:8]}.prof"
+    )
+
+
+def _dump_profile(file_name: str, profilers: list) -> None:
+    """Combina los perfiles de la petición y los guarda en el directorio configurado."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.dump_stats(os.path.join(settings.PROFILE_DIR, file_name))
+
+
+class _ProfiledCoroutine:
+    """Ejecuta una corrutina activando el perfilador solo mientras avanza cada paso."""
+
+    def __init__(self, coroutine, profiler):
+        self.coroutine = coroutine
+        self.profiler = profiler
+
+    def __await__(self):
+        step, value = self.coroutine.send, None
+        while True:
+            try:
+                yielded = self.profiler.runcall(step, value)
+            except StopIteration as e:
+                return e.value
+            try:
+                value = yield yielded
+                step = self.coroutine.send
+            except BaseException as e:
+                step, value = self.coroutine.throw, e
+
+
+def _profile_in_thread(call):
+    """Envuelve un endpoint síncrono para perfilarlo en el hilo del threadpool que lo ejecuta."""
+    @functools.wraps(call)
+    def profiled_call(*args, **kwargs):
+        session = _current_session.get()
+        if session is None or session.finished:
+            return call(*args, **kwargs)
+        profiler = _new_profiler()
+        session.profilers.append(profiler)
+        return profiler.runcall(call, *args, **kwargs)
+
+    profiled_call.profiled = True
+    return profiled_call
+
+
+class ProfiledRoute(APIRoute):
+    """Ruta que perfila el handler: dependencias, endpoint y serialización de la respuesta.
+
+    El cuerpo de las respuestas en stream se envía después de que el handler retorna; ese
+    tiempo no se perfila ni retiene el candado de perfilado.
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if not asyncio.iscoroutinefunction(call) and not getattr(call, "profiled", False):
+            self.dependant.call = _profile_in_thread(call)
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            session = _current_session.get()
+            if session is None or session.finished:
+                return await handler(request)
+            profiler = _new_profiler()
+            session.profilers.append(profiler)
+            try:
+                return await _ProfiledCoroutine(handler(request), profiler)
+            finally:
+                await session.finish()
+
+        return profiled_handler
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que activa el perfilado de las peticiones seleccionadas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        session = _ProfileSession(_profile_file_name(scope))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and session.profilers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.file_name.encode())
+                ]
+            await send(message)
+
+        token = _current_session.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_session.reset(token)
+            # Si la petición no llegó a una ruta perfilada el candado se libera aquí
+            await session.finish()
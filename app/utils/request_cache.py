@@ -0,0 +1,278 @@
+"""Caché de lectura del detalle serializado de las solicitudes de ingreso.
+
+Cada entrada guarda el JSON de ``EntranceRequestSchema`` con la versión de la solicitud con
+la que se generó; si la versión ya no es la vigente la entrada cuenta como fallo, así que un
+llenado que se cruza con una edición nunca sirve la solicitud vieja. Los handlers invalidan
+las entradas después del commit, incluidas las de las solicitudes que embeben a un invitado
+editado; un llenado que se cruza con la edición de un invitado dura a lo sumo
+``REQUEST_CACHE_TTL``.
+
+El backend ``memory`` es un LRU por proceso y sirve para un solo worker; con varios workers
+se usa ``redis``, compartido, para que las invalidaciones lleguen a todos. Ante fallos
+simultáneos de la misma clave solo un hilo del proceso consulta la base de datos y los demás
+esperan su resultado; con Redis además un candado ``SET NX`` deja a un solo worker llenando
+la entrada mientras los otros sondean la caché hasta ``REQUEST_CACHE_LOCK_TIMEOUT``.
+"""
+import abc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Iterable
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.entrances import EntranceRequestGuest
+from app.utils.metrics import REQUEST_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Versión de la solicitud y su JSON serializado
+Entry = tuple[int, bytes]
+POLL_INTERVAL = 0.05
+INVALIDATE_BATCH = 500
+
+
+class CacheBackend(abc.ABC):
+    """Almacenamiento de bytes por clave con candado opcional entre procesos."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """Obtiene el valor de ``key`` o ``None`` si no existe o venció."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        """Guarda ``value`` en ``key`` con el vencimiento del backend."""
+
+    @abc.abstractmethod
+    def delete(self, keys: list[str]) -> None:
+        """Borra las claves ``keys``."""
+
+    def lock(self, key: str) -> bool:
+        """Intenta tomar el candado de llenado de la clave; sin candado compartido siempre."""
+        return True
+
+    def unlock(self, key: str) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """LRU en memoria del proceso con vencimiento por entrada."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    """Entradas compartidas en un servidor con el protocolo de Redis (cliente ``redis-py``)."""
+
+    def __init__(self, client, ttl: float, lock_timeout: float):
+        self.client = client
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(key, value, ex=int(self.ttl))
+
+    def delete(self, keys: list[str]) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def lock(self, key: str) -> bool:
+        return bool(self.client.set(
+            f"{key}:lock", b"1", nx=True, px=int(self.lock_timeout * 1000)
+        ))
+
+    def unlock(self, key: str) -> None:
+        self.client.delete(f"{key}:lock")
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> CacheBackend | None:
+    """Backend configurado en ``REQUEST_CACHE_BACKEND`` ("memory", "redis" o vacío)."""
+    if settings.REQUEST_CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.REQUEST_CACHE_MAX_ENTRIES, settings.REQUEST_CACHE_TTL)
+    if settings.REQUEST_CACHE_BACKEND == "redis":
+        import redis
+
+        return RedisBackend(
+            redis.Redis.from_url(settings.REQUEST_CACHE_REDIS_URL),
+            settings.REQUEST_CACHE_TTL,
+            settings.REQUEST_CACHE_LOCK_TIMEOUT,
+        )
+    return None
+
+
+def cache_key(request_id: int) -> str:
+    return f"{settings.REQUEST_CACHE_PREFIX}{request_id}"
+
+
+def encode_entry(version: int, payload: bytes) -> bytes:
+    return b"%d\n" % version + payload
+
+
+def decode_entry(data: bytes | None) -> Entry | None:
+    if not data:
+        return None
+    version, _, payload = data.partition(b"\n")
+    return int(version), payload
+
+
+class _Flight:
+    """Carga en curso de una clave a la que se suman los demás hilos que fallan."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry: Entry | None = None
+
+
+_flights: dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _read(backend: CacheBackend, key: str) -> Entry | None:
+    try:
+        return decode_entry(backend.get(key))
+    except Exception as e:
+        logger.warning(f"No fue posible leer la caché de solicitudes: {e}")
+        return None
+
+
+def _wait_for_fill(backend: CacheBackend, key: str, version: int) -> Entry | None:
+    """Sondea la caché mientras otro worker llena la entrada."""
+    deadline = time.monotonic() + settings.REQUEST_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _read(backend, key)
+        if entry is not None and entry[0] == version:
+            return entry
+    return None
+
+
+def _write(backend: CacheBackend, key: str, entry: Entry) -> None:
+    try:
+        backend.set(key, encode_entry(*entry))
+    except Exception as e:
+        logger.warning(f"No fue posible escribir la caché de solicitudes: {e}")
+
+
+def _fill(backend: CacheBackend, key: str, version: int, load: Callable[[], Entry | None]):
+    """Carga la entrada desde la base de datos, salvo que otro worker ya la esté llenando."""
+    try:
+        locked = backend.lock(key)
+    except Exception as e:
+        logger.warning(f"No fue posible tomar el candado de la caché de solicitudes: {e}")
+        locked = False
+    else:
+        if not locked:
+            entry = _wait_for_fill(backend, key, version)
+            if entry is not None:
+                return entry
+    try:
+        entry = load()
+        if entry is not None:
+            _write(backend, key, entry)
+        return entry
+    finally:
+        if locked:
+            try:
+                backend.unlock(key)
+            except Exception as e:
+                logger.warning(f"No fue posible liberar el candado de la caché de solicitudes: {e}")
+
+
+def get_or_load(request_id: int, version: int, load: Callable[[], Entry | None]) -> Entry | None:
+    """Retorna la versión y el JSON de la solicitud desde la caché o desde ``load``.
+
+    ``version`` es la versión vigente leída de la base de datos; ``load`` retorna la versión
+    y el JSON cargados, o ``None`` si la solicitud ya no existe.
+    """
+    backend = get_backend()
+    if backend is None:
+        return load()
+    key = cache_key(request_id)
+    entry = _read(backend, key)
+    if entry is not None and entry[0] == version:
+        REQUEST_CACHE_REQUESTS.inc(result="hit")
+        return entry
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait(settings.REQUEST_CACHE_LOCK_TIMEOUT)
+        if flight.entry is not None and flight.entry[0] == version:
+            REQUEST_CACHE_REQUESTS.inc(result="coalesced")
+            return flight.entry
+        REQUEST_CACHE_REQUESTS.inc(result="miss")
+        return load()
+
+    REQUEST_CACHE_REQUESTS.inc(result="miss")
+    try:
+        flight.entry = _fill(backend, key, version, load)
+        return flight.entry
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def invalidate_requests(request_ids: Iterable[int]) -> None:
+    """Borra las entradas de las solicitudes; se llama después del commit."""
+    backend = get_backend()
+    if backend is None:
+        return
+    keys = [cache_key(request_id) for request_id in set(request_ids)]
+    try:
+        for start in range(0, len(keys), INVALIDATE_BATCH):
+            backend.delete(keys[start:start + INVALIDATE_BATCH])
+    except Exception as e:
+        logger.warning(f"No fue posible invalidar la caché de solicitudes: {e}")
+
+
+def invalidate_guest_requests(db: Session, guest_ids: Iterable[int]) -> None:
+    """Invalida las solicitudes que embeben a los invitados indicados."""
+    if get_backend() is None:
+        return
+    guest_ids = list(set(guest_ids))
+    request_ids = set()
+    for start in range(0, len(guest_ids), INVALIDATE_BATCH):
+        request_ids.update(
+            request_id for request_id, in db.query(EntranceRequestGuest.entrance_request_id)
+            .filter(EntranceRequestGuest.guest_id.in_(guest_ids[start:start + INVALIDATE_BATCH]))
+            .distinct()
+        )
+    invalidate_requests(request_ids)
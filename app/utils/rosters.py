@@ -0,0 +1,347 @@
+"""Importación de planillas de invitados desde Excel o CSV.
+
+El archivo se recorre fila a fila (openpyxl en modo de solo lectura o ``csv.reader``), así
+que la memoria no depende de la cantidad de filas. Los nombres de EPS, ARL, empresa y
+municipio se resuelven con diccionarios que se arman una sola vez por importación. Las
+filas válidas se guardan por lotes de ``ROSTER_CHUNK_SIZE``: una consulta por lote busca
+los documentos existentes, y luego se hace una inserción y una actualización masivas.
+
+La ingesta NDJSON sigue el mismo camino: cada línea se valida con un ``TypeAdapter`` de
+``GuestCreateSchema`` creado una sola vez y los IDs se comprueban contra los mismos
+diccionarios, de modo que la memoria depende del tamaño del lote y no del cuerpo.
+"""
+import csv
+import io
+import json
+import re
+import unicodedata
+import zipfile
+from typing import IO, AsyncIterator, Awaitable, Callable, Iterator, NamedTuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.entrances import touch_guest_requests
+from app.models.places import Municipality
+from app.models.users import Company, Guest
+from app.schemas.users import GuestCreateSchema
+from app.utils.request_cache import invalidate_guest_requests
+
+XLSX_SIGNATURE = b"PK\x03\x04"
+PHONE_PATTERN = re.compile(r"[0-9]{10,15}")
+EMAIL_PATTERN = re.compile(r".+@.+\..+")
+GUEST_ADAPTER = TypeAdapter(GuestCreateSchema)
+MAX_LINE_BYTES = 1024 * 1024
+
+# Encabezados aceptados para cada campo, ya normalizados
+COLUMNS = {
+    "document_id": ("documento", "cedula", "document_id"),
+    "name": ("nombre", "name"),
+    "eps": ("eps",),
+    "arl": ("arl",),
+    "company": ("empresa", "company"),
+    "city": ("municipio", "ciudad", "city"),
+    "phone_number": ("telefono", "celular", "phone_number"),
+    "email": ("correo", "email"),
+}
+
+
+class RowError(NamedTuple):
+    """Errores de una fila de la planilla."""
+    row: int
+    errors: list[str]
+
+
+class RosterResult(NamedTuple):
+    """Resultado de una importación."""
+    inserted: int
+    updated: int
+    failed: int
+    errors: list[RowError]
+
+
+def normalize(value) -> str:
+    """Pasa a minúsculas, quita tildes y espacios repetidos."""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def _cell(value) -> str:
+    # Excel guarda documentos y teléfonos como números
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value).strip()
+
+
+def iter_csv(file: IO[bytes]) -> Iterator[list]:
+    """Recorre las filas de un CSV en UTF-8 (con o sin BOM) separado por comas o punto y coma."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    delimiter = ";" if sample.count(";") > sample.count(",") else ","
+    yield from csv.reader(text, delimiter=delimiter)
+
+
+def iter_xlsx(file: IO[bytes]) -> Iterator[tuple]:
+    """Recorre las filas de la primera hoja de un libro de Excel."""
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, KeyError, zipfile.BadZipFile):
+        raise ValueError("El archivo de Excel no es válido")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(file: IO[bytes]) -> Iterator:
+    """Detecta el formato por la firma del archivo y recorre sus filas."""
+    signature = file.read(len(XLSX_SIGNATURE))
+    file.seek(0)
+    return iter_xlsx(file) if signature == XLSX_SIGNATURE else iter_csv(file)
+
+
+def map_headers(header) -> dict[str, int]:
+    """Ubica la columna de cada campo; falla si falta alguna."""
+    aliases = {alias: field for field, names in COLUMNS.items() for alias in names}
+    positions = {}
+    for idx, value in enumerate(header):
+        field = aliases.get(normalize(value)) if value is not None else None
+        if field and field not in positions:
+            positions[field] = idx
+    missing = [field for field in COLUMNS if field not in positions]
+    if missing:
+        raise ValueError(f"Faltan las columnas: {', '.join(missing)}")
+    return positions
+
+
+class Lookups:
+    """Diccionarios de nombre normalizado a ID para resolver las columnas de texto."""
+
+    def __init__(self, db: Session):
+        self.eps, self.arl, self.companies = {}, {}, {}
+        self.ids: dict[str, set[int]] = {
+            "eps_id": set(), "arl_id": set(), "company_id": set(), "city_id": set()
+        }
+        for company_id, name, nit, is_eps, is_arl in db.query(
+            Company.id, Company.name, Company.nit, Company.is_eps, Company.is_arl
+        ).order_by(Company.id):
+            self.ids["company_id"].add(company_id)
+            if is_eps:
+                self.ids["eps_id"].add(company_id)
+            if is_arl:
+                self.ids["arl_id"].add(company_id)
+            for key in filter(None, (normalize(name), nit and normalize(nit))):
+                self.companies.setdefault(key, company_id)
+                if is_eps:
+                    self.eps.setdefault(key, company_id)
+                if is_arl:
+                    self.arl.setdefault(key, company_id)
+        # Hay municipios homónimos en distintos departamentos; esos se piden por código DANE
+        self.cities: dict[str, int | None] = {}
+        for city_id, name, cod_dane in db.query(
+            Municipality.id, Municipality.name, Municipality.cod_dane
+        ):
+            self.ids["city_id"].add(city_id)
+            key = normalize(name)
+            self.cities[key] = None if key in self.cities else city_id
+            if cod_dane:
+                self.cities[normalize(cod_dane)] = city_id
+
+    def resolve(self, values: dict[str, str], errors: list[str]) -> dict[str, int]:
+        """Convierte los nombres de la fila en IDs y agrega los errores encontrados."""
+        ids = {}
+        for field, table, label in (
+            ("eps_id", self.eps, "EPS"),
+            ("arl_id", self.arl, "ARL"),
+            ("company_id", self.companies, "Empresa"),
+            ("city_id", self.cities, "Municipio"),
+        ):
+            value = values[field[:-3]]
+            key = normalize(value)
+            if not key:
+                continue
+            if key in table and table[key] is None:
+                errors.append(f"{label} '{value}' es ambiguo; use el código DANE")
+            elif key not in table:
+                errors.append(f"{label} '{value}' no existe")
+            else:
+                ids[field] = table[key]
+        return ids
+
+    def check_ids(self, guest: dict, errors: list[str]) -> None:
+        """Agrega un error por cada ID que no corresponde a un registro válido."""
+        for field, valid in self.ids.items():
+            if guest[field] not in valid:
+                errors.append(f"{field} {guest[field]} no existe")
+
+
+def check_contact(phone_number: str, email: str, errors: list[str]) -> dict[str, str]:
+    """Normaliza el teléfono y el correo con las reglas de las restricciones de la tabla."""
+    phone_number = re.sub(r"[\s\-()+]", "", phone_number)
+    if phone_number and not PHONE_PATTERN.fullmatch(phone_number):
+        errors.append("El teléfono debe tener entre 10 y 15 dígitos")
+    if email and not EMAIL_PATTERN.fullmatch(email):
+        errors.append("El correo no es válido")
+    return {"phone_number": phone_number, "email": email.lower()}
+
+
+def parse_row(values: dict[str, str], lookups: Lookups) -> tuple[dict | None, list[str]]:
+    """Valida una fila y retorna los datos del invitado o sus errores."""
+    errors = [f"El campo {field} es obligatorio" for field, value in values.items() if not value]
+    guest = lookups.resolve(values, errors)
+    contact = check_contact(values["phone_number"], values["email"], errors)
+    if errors:
+        return None, errors
+    guest.update(document_id=values["document_id"], name=values["name"], **contact)
+    return guest, []
+
+
+def save_chunk(db: Session, guests: dict[str, dict]) -> tuple[int, int]:
+    """Inserta o actualiza por documento un lote de invitados; retorna insertados y actualizados."""
+    existing = dict(
+        db.query(Guest.document_id, Guest.id).filter(Guest.document_id.in_(list(guests)))
+    )
+    updates = [
+        {"id": existing[document_id], **guest}
+        for document_id, guest in guests.items() if document_id in existing
+    ]
+    inserts = [guest for document_id, guest in guests.items() if document_id not in existing]
+    if updates:
+        db.execute(update(Guest), updates)
+        touch_guest_requests(db.connection(), [guest["id"] for guest in updates])
+    if inserts:
+        db.execute(insert(Guest), inserts)
+    db.commit()
+    invalidate_guest_requests(db, [guest["id"] for guest in updates])
+    return len(inserts), len(updates)
+
+
+def import_roster(db: Session, file: IO[bytes]) -> RosterResult:
+    """Importa la planilla de invitados por lotes y retorna el resumen con los errores por fila."""
+    rows = iter_rows(file)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("El archivo está vacío")
+    positions = map_headers(header)
+    lookups = Lookups(db)
+
+    inserted = updated = failed = 0
+    errors: list[RowError] = []
+    chunk: dict[str, dict] = {}
+    # La fila 1 es el encabezado
+    for number, row in enumerate(rows, start=2):
+        if not row or all(value in (None, "") for value in row):
+            continue
+        values = {
+            field: _cell(row[idx]) if idx < len(row) else ""
+            for field, idx in positions.items()
+        }
+        guest, row_errors = parse_row(values, lookups)
+        if row_errors:
+            failed += 1
+            if len(errors) < settings.ROSTER_MAX_ERRORS:
+                errors.append(RowError(number, row_errors))
+            continue
+        # Si un documento se repite en el lote queda la última fila
+        chunk[guest["document_id"]] = guest
+        if len(chunk) >= settings.ROSTER_CHUNK_SIZE:
+            counts = save_chunk(db, chunk)
+            inserted, updated = inserted + counts[0], updated + counts[1]
+            chunk = {}
+    if chunk:
+        counts = save_chunk(db, chunk)
+        inserted, updated = inserted + counts[0], updated + counts[1]
+    return RosterResult(inserted, updated, failed, errors)
+
+
+def ingest_chunk(
+    db: Session, lines: list[tuple[int, bytes]], lookups: Lookups
+) -> tuple[int, int, list[RowError]]:
+    """Valida y guarda un lote de líneas NDJSON; retorna insertados, actualizados y errores."""
+    guests: dict[str, dict] = {}
+    errors = []
+    for number, line in lines:
+        try:
+            guest = GUEST_ADAPTER.validate_json(line).model_dump()
+        except ValidationError as e:
+            errors.append(RowError(number, [
+                f"{'.'.join(map(str, error['loc'])) or 'línea'}: {error['msg']}"
+                for error in e.errors(include_url=False)
+            ]))
+            continue
+        row_errors = [
+            f"El campo {field} es obligatorio" for field, value in guest.items() if value == ""
+        ]
+        lookups.check_ids(guest, row_errors)
+        guest.update(check_contact(guest["phone_number"], guest["email"], row_errors))
+        if row_errors:
+            errors.append(RowError(number, row_errors))
+        else:
+            guests[guest["document_id"]] = guest
+    inserted, updated = save_chunk(db, guests) if guests else (0, 0)
+    return inserted, updated, errors
+
+
+async def ingest_ndjson(
+    db: Session,
+    body: AsyncIterator[bytes],
+    totals: dict[str, int],
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> AsyncIterator[dict]:
+    """Ingesta las líneas del cuerpo por lotes y entrega el avance de cada lote confirmado.
+
+    ``totals`` acumula las líneas leídas y lo confirmado, así que sirve de resumen aunque la
+    ingesta se interrumpa. Mientras llega el cuerpo una desconexión se detecta al leerlo; con
+    el cuerpo completo se consulta ``is_disconnected`` antes de guardar el último lote (antes
+    de eso la consulta podría consumir parte del cuerpo).
+    """
+    lookups = await run_in_threadpool(Lookups, db)
+    totals.update(lines=0, inserted=0, updated=0, failed=0)
+    chunk_number = 0
+
+    async def flush(lines: list[tuple[int, bytes]]) -> dict:
+        nonlocal chunk_number
+        inserted, updated, errors = await run_in_threadpool(ingest_chunk, db, lines, lookups)
+        chunk_number += 1
+        totals["inserted"] += inserted
+        totals["updated"] += updated
+        totals["failed"] += len(errors)
+        return {
+            "chunk": chunk_number,
+            "line": lines[-1][0],
+            "inserted": inserted,
+            "updated": updated,
+            "failed": len(errors),
+            "errors": [error._asdict() for error in errors],
+        }
+
+    pending, lines = b"", []
+    async for data in body:
+        *complete, pending = (pending + data).split(b"\n")
+        if len(pending) > MAX_LINE_BYTES:
+            raise ValueError(f"La línea {totals['lines'] + len(complete) + 1} es demasiado larga")
+        for line in complete:
+            totals["lines"] += 1
+            if line.strip():
+                lines.append((totals["lines"], line))
+            if len(lines) >= settings.ROSTER_CHUNK_SIZE:
+                yield await flush(lines)
+                lines = []
+    if pending.strip():
+        totals["lines"] += 1
+        lines.append((totals["lines"], pending))
+    if lines and not (is_disconnected and await is_disconnected()):
+        yield await flush(lines)
+
+
+def progress_line(record: dict) -> bytes:
+    """Serializa un registro de avance como una línea NDJSON."""
+    return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
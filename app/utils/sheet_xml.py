@@ -0,0 +1,396 @@
+"""Render directo de formatos de Excel sobre el XML de la hoja.
+
+La plantilla se compila una sola vez en un ``SheetLayout``: las filas y celdas de la hoja
+quedan separadas en fragmentos de texto, las celdas combinadas en una lista y cada
+referencia a una fila (rangos, validaciones, comentarios, anclas de dibujos y nombres
+definidos) en una posición que se reemplaza al renderizar. Las partes que nunca cambian se
+escriben una vez en un ZIP base y cada render copia esos bytes y agrega solo las partes
+modificadas.
+
+Las filas prototipo se repiten tantas veces como filas de datos reciban, igual que al
+insertar filas con openpyxl: las filas siguientes bajan y las referencias que quedan por
+debajo del prototipo se desplazan. Los textos se escriben como cadenas en línea para no
+reescribir la tabla de cadenas compartidas.
+"""
+import io
+import os
+import posixpath
+import re
+import zipfile
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import column_index_from_string
+
+ROW_PATTERN = re.compile(r"<row ([^>]*?)(?:/>|>(.*?)</row>)", re.S)
+CELL_PATTERN = re.compile(r"<c ([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+REF_PATTERN = re.compile(r"(\$?[A-Z]{1,3}\$?)(\d+)")
+ATTR_PATTERN = re.compile(r'\b(ref|sqref|activeCell|topLeftCell)="([^"]*)"')
+MERGE_PATTERN = re.compile(r'<mergeCells count="\d+">(.*?)</mergeCells>', re.S)
+ILLEGAL_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _attribute(attrs: str, name: str) -> str | None:
+    match = re.search(rf'\b{name}="([^"]*)"', attrs)
+    return match.group(1) if match else None
+
+
+def _without(attrs: str, *names: str) -> str:
+    for name in names:
+        attrs = re.sub(rf'\s*\b{name}="[^"]*"', "", attrs)
+    return attrs.strip()
+
+
+def _split_ref(ref: str) -> tuple[str, int]:
+    letters = ref.rstrip("0123456789")
+    return letters, int(ref[len(letters):])
+
+
+class RowTemplate:
+    """Texto con números de fila reemplazables; las filas se guardan en base 1."""
+
+    def __init__(self):
+        self.parts: list[str] = [""]
+        self.rows: list[tuple[int, int]] = []
+
+    def text(self, value: str) -> None:
+        self.parts[-1] += value
+
+    def row(self, row: int, base: int = 1) -> None:
+        self.rows.append((row + 1 - base, base))
+        self.parts.append("")
+
+    def refs(self, value: str) -> None:
+        """Agrega un texto con referencias de celda cuyas filas se desplazan."""
+        position = 0
+        for match in REF_PATTERN.finditer(value):
+            self.text(value[position:match.start(2)])
+            self.row(int(match.group(2)))
+            position = match.end()
+        self.text(value[position:])
+
+    def max_row(self) -> int:
+        return max((row for row, _ in self.rows), default=0)
+
+    def render(self, shift) -> str:
+        out = [self.parts[0]]
+        for (row, base), part in zip(self.rows, self.parts[1:]):
+            out.append(str(shift(row) - 1 + base))
+            out.append(part)
+        return "".join(out)
+
+
+def _attribute_refs(text: str) -> RowTemplate:
+    template = RowTemplate()
+    position = 0
+    for match in ATTR_PATTERN.finditer(text):
+        template.text(text[position:match.start(2)])
+        template.refs(match.group(2))
+        position = match.end(2)
+    template.text(text[position:])
+    return template
+
+
+def _pattern_rows(text: str, pattern: re.Pattern, base: int) -> RowTemplate:
+    """Compila las filas capturadas por los grupos del patrón."""
+    template = RowTemplate()
+    position = 0
+    for match in pattern.finditer(text):
+        for group in range(1, (pattern.groups or 0) + 1):
+            if match.group(group) is None:
+                continue
+            template.text(text[position:match.start(group)])
+            template.row(int(match.group(group)), base)
+            position = match.end(group)
+    template.text(text[position:])
+    return template
+
+
+def _vml_rows(text: str) -> RowTemplate:
+    # Las anclas de VML son "col, dx, fila, dy, col, dx, fila, dy" en base 0
+    template = RowTemplate()
+    position = 0
+    for match in re.finditer(r"<x:Row>(\d+)</x:Row>|<x:Anchor>([^<]*)</x:Anchor>", text, re.S):
+        if match.group(1) is not None:
+            template.text(text[position:match.start(1)])
+            template.row(int(match.group(1)), base=0)
+            position = match.end(1)
+            continue
+        template.text(text[position:match.start(2)])
+        values = match.group(2).split(",")
+        for idx, value in enumerate(values):
+            if idx in (2, 6):
+                template.text(value[:len(value) - len(value.lstrip())])
+                template.row(int(value), base=0)
+            else:
+                template.text(value)
+            if idx < len(values) - 1:
+                template.text(",")
+        position = match.end(2)
+    template.text(text[position:])
+    return template
+
+
+class Cell:
+    """Celda de la plantilla: columna, estilo y el XML que sigue a su referencia."""
+    __slots__ = ("column", "letters", "style", "rest", "shared")
+
+    def __init__(self, attrs: str, body: str | None):
+        self.letters, _ = _split_ref(_attribute(attrs, "r"))
+        self.column = column_index_from_string(self.letters)
+        self.style = _attribute(attrs, "s")
+        self.shared = _attribute(attrs, "t") == "s" and body is not None
+        others = _without(attrs, "r")
+        self.rest = (f'" {others}' if others else '"') + (f">{body}</c>" if body else "/>")
+
+    def xml(self, row: int) -> str:
+        return f'<c r="{self.letters}{row}{self.rest}'
+
+
+def _value_xml(ref: str, style: str | None, value) -> str:
+    style = f' s="{style}"' if style is not None else ""
+    if value is None or value == "":
+        return f'<c r="{ref}"{style}/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"{style}><v>{value!r}</v></c>'
+    text = escape(ILLEGAL_CHARACTERS.sub("", str(value)))
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _column_letters(column: int) -> str:
+    letters = ""
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class SheetLayout:
+    """Plantilla de Excel compilada para renderizar la primera hoja sin openpyxl."""
+
+    def __init__(self, template_path: str, prototypes: tuple[int, ...] = ()):
+        self.prototypes = tuple(sorted(prototypes))
+        with zipfile.ZipFile(template_path) as archive:
+            infos = archive.infolist()
+            parts = {info.filename: archive.read(info) for info in infos}
+        self.infos = {info.filename: info for info in infos}
+
+        workbook_path = "xl/workbook.xml"
+        self.sheet_path = self._first_sheet(parts, workbook_path)
+        sheet_rels = self._relationships(parts, self.sheet_path)
+        self._compile_sheet(parts[self.sheet_path].decode("utf-8"))
+
+        # Partes con referencias a filas; las que no se desplazan se copian tal cual
+        self.templates: dict[str, RowTemplate] = {}
+        workbook = parts[workbook_path].decode("utf-8")
+        self._add_template(workbook_path, self._defined_names(workbook))
+        for kind, target in sheet_rels:
+            if kind == "comments":
+                self._add_template(target, _attribute_refs(parts[target].decode("utf-8")))
+            elif kind == "vmlDrawing":
+                self._add_template(target, _vml_rows(parts[target].decode("utf-8")))
+            elif kind == "drawing":
+                self._add_template(target, _pattern_rows(
+                    parts[target].decode("utf-8"), re.compile(r"<xdr:row>(\d+)</xdr:row>"), base=0
+                ))
+
+        # La cuenta de referencias a cadenas compartidas baja con cada celda reemplazada
+        self.shared_strings = None
+        shared_path = "xl/sharedStrings.xml"
+        if shared_path in parts:
+            text = parts[shared_path].decode("utf-8")
+            match = re.search(r'<sst [^>]*?\bcount="(\d+)"', text)
+            if match:
+                self.shared_strings = (text[:match.start(1)], int(match.group(1)),
+                                       text[match.end(1):])
+
+        dynamic = {self.sheet_path, *self.templates}
+        if self.shared_strings:
+            dynamic.add(shared_path)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info in infos:
+                if info.filename not in dynamic:
+                    archive.writestr(
+                        zipfile.ZipInfo(info.filename, date_time=info.date_time),
+                        parts[info.filename], compress_type=info.compress_type,
+                    )
+        self.base = buffer.getvalue()
+
+    @staticmethod
+    def _relationships(parts: dict[str, bytes], path: str) -> list[tuple[str, str]]:
+        """Retorna el tipo y la ruta de cada relación de una parte."""
+        folder, name = posixpath.split(path)
+        rels = parts.get(posixpath.join(folder, "_rels", f"{name}.rels"), b"").decode("utf-8")
+        relationships = []
+        for relationship in re.findall(r"<Relationship [^>]*>", rels):
+            kind = _attribute(relationship, "Type").rsplit("/", 1)[-1]
+            target = _attribute(relationship, "Target")
+            if _attribute(relationship, "TargetMode") == "External":
+                continue
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(
+                posixpath.join(folder, target)
+            )
+            relationships.append((kind, target))
+        return relationships
+
+    def _first_sheet(self, parts: dict[str, bytes], workbook_path: str) -> str:
+        workbook = parts[workbook_path].decode("utf-8")
+        sheet_id = re.search(r'<sheet [^>]*r:id="([^"]+)"', workbook).group(1)
+        folder, name = posixpath.split(workbook_path)
+        rels = parts[posixpath.join(folder, "_rels", f"{name}.rels")].decode("utf-8")
+        for relationship in re.findall(r"<Relationship [^>]*>", rels):
+            if _attribute(relationship, "Id") == sheet_id:
+                target = _attribute(relationship, "Target")
+                return posixpath.normpath(posixpath.join(folder, target))
+        raise ValueError("La plantilla no tiene hojas")
+
+    @staticmethod
+    def _defined_names(workbook: str) -> RowTemplate:
+        template = RowTemplate()
+        position = 0
+        for match in re.finditer(r"<definedName [^>]*>([^<]*)</definedName>", workbook):
+            template.text(workbook[position:match.start(1)])
+            template.refs(match.group(1))
+            position = match.end(1)
+        template.text(workbook[position:])
+        return template
+
+    def _add_template(self, path: str, template: RowTemplate) -> None:
+        if self.prototypes and template.max_row() > self.prototypes[0]:
+            self.templates[path] = template
+
+    def _compile_sheet(self, text: str) -> None:
+        start, end = text.index("<sheetData"), text.index("</sheetData>")
+        head = text[:start]
+        opening = text[start:text.index(">", start) + 1]
+        if opening.endswith("/>"):
+            body, end = "", start + len(opening)
+        else:
+            body = text[start + len(opening):end]
+            end += len("</sheetData>")
+        tail = text[end:]
+
+        self.head = _attribute_refs(head)
+        self.rows: dict[int, tuple[str, list[Cell]]] = {}
+        for match in ROW_PATTERN.finditer(body):
+            attrs, cells = match.groups()
+            row = int(_attribute(attrs, "r"))
+            # ``spans`` es opcional y deja de ser exacto cuando se agregan columnas
+            attrs = _without(attrs, "r", "spans")
+            self.rows[row] = (f" {attrs}" if attrs else "", [
+                Cell(*cell.groups()) for cell in CELL_PATTERN.finditer(cells or "")
+            ])
+
+        self.merges: list[tuple[str, int, str, int]] = []
+        merge = MERGE_PATTERN.search(tail)
+        if merge:
+            for ref in re.findall(r'<mergeCell ref="([^"]+)"', merge.group(1)):
+                first, last = ref.split(":")
+                self.merges.append((*_split_ref(first), *_split_ref(last)))
+            self.tail_before = _attribute_refs(tail[:merge.start()])
+            self.tail_after = _attribute_refs(tail[merge.end():])
+        else:
+            self.tail_before, self.tail_after = _attribute_refs(tail), RowTemplate()
+        self.opening = opening.replace("/>", ">")
+
+    def shifter(self, counts: dict[int, int]):
+        """Retorna la función que ubica una fila de la plantilla en la salida."""
+        offsets = [(row, max(counts.get(row, 0), 1) - 1) for row in self.prototypes]
+
+        def shift(row: int) -> int:
+            return row + sum(extra for prototype, extra in offsets if prototype < row)
+        return shift
+
+    def _row_xml(self, row: int, attrs: str, cells: list[Cell], values: dict) -> tuple[str, int]:
+        if not values:
+            return (
+                f'<row r="{row}"{attrs}>' + "".join(cell.xml(row) for cell in cells) + "</row>",
+                0,
+            )
+        out, replaced = [], 0
+        pending = dict(values)
+        for cell in cells:
+            for column in sorted(c for c in pending if c < cell.column):
+                out.append(_value_xml(f"{_column_letters(column)}{row}", None, pending.pop(column)))
+            if cell.column in pending:
+                out.append(_value_xml(f"{cell.letters}{row}", cell.style, pending.pop(cell.column)))
+                replaced += cell.shared
+            else:
+                out.append(cell.xml(row))
+        for column in sorted(pending):
+            out.append(_value_xml(f"{_column_letters(column)}{row}", None, pending[column]))
+        return f'<row r="{row}"{attrs}>' + "".join(out) + "</row>", replaced
+
+    def render(
+        self, output_path: str, cells: dict[tuple[int, int], object],
+        blocks: dict[int, list[dict[int, object]]],
+    ) -> None:
+        """Escribe el libro con los valores por (fila, columna) de la plantilla y los bloques.
+
+        ``blocks`` asocia cada fila prototipo a la lista de valores por columna de sus copias.
+        """
+        counts = {row: len(values) for row, values in blocks.items()}
+        shift = self.shifter(counts)
+        static: dict[int, dict[int, object]] = {}
+        for (row, column), value in cells.items():
+            static.setdefault(row, {})[column] = value
+
+        out, replaced = [self.head.render(shift), self.opening], 0
+        for row in sorted(self.rows.keys() | static.keys()):
+            attrs, template_cells = self.rows.get(row, ("", []))
+            if row in blocks:
+                first = shift(row)
+                for idx, values in enumerate(blocks[row] or [{}]):
+                    xml, count = self._row_xml(first + idx, attrs, template_cells, {
+                        **static.get(row, {}), **values
+                    } if idx == 0 else values)
+                    out.append(xml)
+                    replaced += count
+            else:
+                xml, count = self._row_xml(shift(row), attrs, template_cells, static.get(row, {}))
+                out.append(xml)
+                replaced += count
+        out.append("</sheetData>")
+        out.append(self.tail_before.render(shift))
+        if self.merges:
+            merges = []
+            for first_col, first_row, last_col, last_row in self.merges:
+                if first_row == last_row and first_row in blocks:
+                    start = shift(first_row)
+                    rows = range(start, start + max(len(blocks[first_row]), 1))
+                else:
+                    rows = [None]
+                for row in rows:
+                    top, bottom = (row, row) if row else (shift(first_row), shift(last_row))
+                    merges.append(f'<mergeCell ref="{first_col}{top}:{last_col}{bottom}"/>')
+            out.append(f'<mergeCells count="{len(merges)}">{"".join(merges)}</mergeCells>')
+        out.append(self.tail_after.render(shift))
+
+        dynamic = {self.sheet_path: "".join(out)}
+        for path, template in self.templates.items():
+            dynamic[path] = template.render(shift)
+        if self.shared_strings:
+            before, count, after = self.shared_strings
+            dynamic["xl/sharedStrings.xml"] = f"{before}{count - replaced}{after}"
+
+        with open(output_path, "w+b") as file:
+            file.write(self.base)
+            file.seek(0)
+            with zipfile.ZipFile(file, "a", zipfile.ZIP_DEFLATED) as archive:
+                for path, text in dynamic.items():
+                    info = self.infos[path]
+                    archive.writestr(
+                        zipfile.ZipInfo(path, date_time=info.date_time),
+                        text.encode("utf-8"), compress_type=zipfile.ZIP_DEFLATED,
+                    )
+
+
+@lru_cache(maxsize=8)
+def _load_layout(template_path: str, mtime: float, prototypes: tuple[int, ...]) -> SheetLayout:
+    return SheetLayout(template_path, prototypes)
+
+
+def get_layout(template_path: str, prototypes: tuple[int, ...]) -> SheetLayout:
+    """Retorna la plantilla compilada; se vuelve a compilar si el archivo cambia."""
+    return _load_layout(template_path, os.path.getmtime(template_path), prototypes)
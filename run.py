@@ -1,5 +1,5 @@
 """Punto de entrada para la aplicación FastAPI."""
-import uvicorn
+from app.server import main
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)  # nosec B104
+    main()